@@ -0,0 +1,196 @@
+import json
+
+from listings import REQUEST_STATUSES
+
+BULK_MAX_ITEMS = 500
+
+
+def bad_request(message: str) -> dict:
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': False, 'message': message}),
+        'isBase64Encoded': False
+    }
+
+
+def bulk_response(results: list) -> dict:
+    '''Итог по каждому id в порядке запроса; success — все id обработаны'''
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': all(r['ok'] for r in results), 'results': results}),
+        'isBase64Encoded': False
+    }
+
+
+def parse_ids(value) -> list:
+    '''Список id без повторов в исходном порядке; None, если это не список целых нужной длины'''
+    if not isinstance(value, list) or not value or len(value) > BULK_MAX_ITEMS:
+        return None
+    ids = []
+    for item in value:
+        if isinstance(item, bool) or not isinstance(item, int):
+            return None
+        if item not in ids:
+            ids.append(item)
+    return ids
+
+
+def results_for(ids: list, done: set, ok_status: str, missing_status: str = 'not_found') -> list:
+    return [
+        {'id': i, 'ok': i in done, 'status': ok_status if i in done else missing_status}
+        for i in ids
+    ]
+
+
+def handle_bulk_update_status(cur, conn, body: dict) -> dict:
+    '''Сменить статус списку заявок одним UPDATE ... WHERE id = ANY(...)'''
+    ids = parse_ids(body.get('request_ids'))
+    status = body.get('status')
+    if ids is None or not status:
+        return bad_request(f'request_ids (up to {BULK_MAX_ITEMS}) and status required')
+    if status not in REQUEST_STATUSES:
+        return bad_request(f"status must be one of: {', '.join(REQUEST_STATUSES)}")
+
+    cur.execute("""
+        UPDATE russification_requests
+        SET status = %s, updated_at = NOW()
+        WHERE id = ANY(%s)
+        RETURNING id
+    """, (status, ids))
+    done = {row['id'] for row in cur.fetchall()}
+
+    conn.commit()
+    return bulk_response(results_for(ids, done, 'updated'))
+
+
+def handle_bulk_pay_bonus(cur, conn, body: dict) -> dict:
+    '''Отметить бонусы выплаченными по списку работ'''
+    ids = parse_ids(body.get('work_ids'))
+    if ids is None:
+        return bad_request(f'work_ids (up to {BULK_MAX_ITEMS}) required')
+
+    cur.execute("""
+        UPDATE completed_works
+        SET is_bonus_paid = TRUE
+        WHERE id = ANY(%s)
+        RETURNING id
+    """, (ids,))
+    done = {row['id'] for row in cur.fetchall()}
+
+    conn.commit()
+    return bulk_response(results_for(ids, done, 'paid'))
+
+
+def handle_bulk_delete_requests(cur, conn, body: dict) -> dict:
+    '''Удалить заявки вместе с работами, бонусными транзакциями и перепиской'''
+    ids = parse_ids(body.get('request_ids'))
+    if ids is None:
+        return bad_request(f'request_ids (up to {BULK_MAX_ITEMS}) required')
+
+    cur.execute("DELETE FROM bonus_transactions WHERE work_id IN (SELECT id FROM completed_works WHERE request_id = ANY(%s))", (ids,))
+    cur.execute("DELETE FROM completed_works WHERE request_id = ANY(%s)", (ids,))
+    cur.execute("DELETE FROM request_messages WHERE request_id = ANY(%s)", (ids,))
+    cur.execute("DELETE FROM russification_requests WHERE id = ANY(%s) RETURNING id", (ids,))
+    done = {row['id'] for row in cur.fetchall()}
+
+    conn.commit()
+    return bulk_response(results_for(ids, done, 'deleted'))
+
+
+def handle_bulk_complete_work(cur, conn, body: dict) -> dict:
+    '''Завершить список заявок и начислить бонусы: items = [{request_id, work_cost, bonus_earned}]
+
+    Как complete_work: заявка с уже созданной работой пропускается (already_completed).
+    Работы, баланс партнёров и бонусные транзакции пишутся вставками из unnest.
+    '''
+    items = body.get('items')
+    if not isinstance(items, list) or not items or len(items) > BULK_MAX_ITEMS:
+        return bad_request(f'items (up to {BULK_MAX_ITEMS}) required')
+
+    works = {}
+    results = {}
+    order = []
+    for item in items:
+        request_id = item.get('request_id') if isinstance(item, dict) else None
+        if isinstance(request_id, bool) or not isinstance(request_id, int):
+            return bad_request('Each item needs an integer request_id')
+        if request_id in results or request_id in works:
+            continue
+        order.append(request_id)
+        try:
+            work_cost = float(item['work_cost'])
+            bonus_earned = int(item.get('bonus_earned', 0))
+        except (KeyError, TypeError, ValueError):
+            results[request_id] = 'invalid'
+            continue
+        works[request_id] = (work_cost, bonus_earned)
+
+    if works:
+        cur.execute("""
+            SELECT r.id, r.user_id, EXISTS (SELECT 1 FROM completed_works w WHERE w.request_id = r.id) AS completed
+            FROM russification_requests r
+            WHERE r.id = ANY(%s)
+            FOR UPDATE
+        """, (list(works),))
+        found = {row['id']: row for row in cur.fetchall()}
+
+        for request_id in list(works):
+            if request_id not in found:
+                results[request_id] = 'not_found'
+                del works[request_id]
+            elif found[request_id]['completed']:
+                results[request_id] = 'already_completed'
+                del works[request_id]
+
+    if works:
+        request_ids = list(works)
+        user_ids = [found[r]['user_id'] for r in request_ids]
+        costs = [works[r][0] for r in request_ids]
+        bonuses = [works[r][1] for r in request_ids]
+
+        cur.execute("""
+            UPDATE russification_requests
+            SET status = 'completed', updated_at = NOW()
+            WHERE id = ANY(%s)
+        """, (request_ids,))
+
+        cur.execute("""
+            INSERT INTO completed_works (request_id, user_id, work_cost, bonus_earned, is_bonus_paid)
+            SELECT w.request_id, w.user_id, w.work_cost, w.bonus_earned, FALSE
+            FROM unnest(%s::int[], %s::int[], %s::numeric[], %s::int[]) AS w(request_id, user_id, work_cost, bonus_earned)
+            RETURNING id, request_id, user_id, bonus_earned
+        """, (request_ids, user_ids, costs, bonuses))
+        created = cur.fetchall()
+
+        cur.execute("""
+            UPDATE users u
+            SET bonus_balance = u.bonus_balance + b.total
+            FROM (
+                SELECT user_id, SUM(bonus_earned) AS total
+                FROM unnest(%s::int[], %s::int[]) AS w(user_id, bonus_earned)
+                GROUP BY user_id
+            ) b
+            WHERE u.id = b.user_id
+        """, (user_ids, bonuses))
+
+        cur.execute("""
+            INSERT INTO bonus_transactions (user_id, work_id, amount, transaction_type, description)
+            SELECT t.user_id, t.work_id, t.amount, 'earned', 'Начисление за заявку #' || t.request_id
+            FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[]) AS t(user_id, work_id, amount, request_id)
+        """, (
+            [w['user_id'] for w in created],
+            [w['id'] for w in created],
+            [w['bonus_earned'] for w in created],
+            [w['request_id'] for w in created]
+        ))
+
+        for w in created:
+            results[w['request_id']] = 'completed'
+
+    conn.commit()
+    return bulk_response([
+        {'id': r, 'ok': results[r] == 'completed', 'status': results[r]}
+        for r in order
+    ])
@@ -7,6 +7,9 @@ from datetime import datetime
 import re
 import uuid
 
+from etag import data_version, make_etag, etag_matches, not_modified, cache_headers
+from uploads import get_confirmed_upload
+
 SUPPORTED_MIME = {
     'image/jpeg': '.jpg',
     'image/png': '.png',
@@ -59,8 +62,13 @@ def upload_image_to_s3(base64_data: str, filename: str) -> str:
         print(f"S3 upload error: {e}")
         return None
 
-def handle_get_content(cur, content_type: str) -> dict:
+def handle_get_content(cur, content_type: str, if_none_match: str = '') -> dict:
     try:
+        scope = 'content:' + (content_type if content_type in ('works', 'services') else 'products')
+        etag = make_etag(scope, data_version(cur, scope))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
         if content_type == 'works':
             cur.execute("""
                 SELECT id, title, description, category, image_url, gallery_urls, price, 
@@ -92,7 +100,7 @@ def handle_get_content(cur, content_type: str) -> dict:
         
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'headers': cache_headers(etag),
             'body': json.dumps({'items': items}),
             'isBase64Encoded': False
         }
@@ -105,12 +113,26 @@ def handle_get_content(cur, content_type: str) -> dict:
             'isBase64Encoded': False
         }
 
-def handle_create_content(cur, conn, body: dict) -> dict:
+def image_upload_missing() -> dict:
+    '''image_upload_id не найден у этого админа или файл ещё не подтверждён'''
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Изображение не загружено'}),
+        'isBase64Encoded': False
+    }
+
+def handle_create_content(cur, conn, body: dict, admin_id: int = None) -> dict:
     try:
         content_type = body.get('type', 'works')
         
         image_url = None
-        if body.get('image_base64'):
+        if body.get('image_upload_id'):
+            upload = get_confirmed_upload(cur, admin_id, body['image_upload_id'])
+            if not upload:
+                return image_upload_missing()
+            image_url = upload['file_url']
+        elif body.get('image_base64'):
             image_url = upload_image_to_s3(body['image_base64'], body.get('image_name', 'image.jpg'))
         
         if content_type == 'works':
@@ -177,7 +199,7 @@ def handle_create_content(cur, conn, body: dict) -> dict:
             'isBase64Encoded': False
         }
 
-def handle_update_content(cur, conn, body: dict) -> dict:
+def handle_update_content(cur, conn, body: dict, admin_id: int = None) -> dict:
     try:
         content_type = body.get('type', 'works')
         item_id = body.get('id')
@@ -191,7 +213,12 @@ def handle_update_content(cur, conn, body: dict) -> dict:
             }
         
         image_url = body.get('image_url')
-        if body.get('image_base64'):
+        if body.get('image_upload_id'):
+            upload = get_confirmed_upload(cur, admin_id, body['image_upload_id'])
+            if not upload:
+                return image_upload_missing()
+            image_url = upload['file_url']
+        elif body.get('image_base64'):
             image_url = upload_image_to_s3(body['image_base64'], body.get('image_name', 'image.jpg'))
         
         if content_type == 'works':
@@ -1,19 +1,27 @@
 import json
 import os
 from datetime import datetime
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from sessions import lookup_session
+from etag import header, make_etag, etag_matches, not_modified, cache_headers
+from pagination import InvalidCursor, encode_cursor, decode_sync_cursor
 
 def handler(event: dict, context) -> dict:
     '''API для администрирования системы
     
     Endpoints:
     - GET /admin - получить все данные (заявки, пользователи, работы)
+    - GET /admin?action=requests|users|works - постраничный список с фильтрами (limit, cursor, date_from, date_to, ...)
+    - GET /admin?action=stats - KPI из сводки admin_stats_rollup (date_from, date_to, user_id)
     - GET /admin?debug_secrets=1 - показать SMTP секреты для отладки
     - POST /admin - управление заявками и бонусами
       - action: update_status - изменить статус заявки
       - action: complete_work - завершить работу и начислить бонусы
       - action: pay_bonus - отметить бонус как выплаченный
+      - action: upload_url / confirm_upload - presigned PUT URL для вложения или картинки каталога
+      - action: bulk_update_status / bulk_complete_work / bulk_pay_bonus / bulk_delete_requests -
+        то же для списка id в одной транзакции, с результатом по каждому id
     '''
     
     method = event.get('httpMethod', 'GET')
@@ -47,7 +55,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -92,13 +100,13 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(dsn)
+        conn = get_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET' and action == 'content':
             from content import handle_get_content
             content_type = query_params.get('type', 'works')
-            return handle_get_content(cur, content_type)
+            return handle_get_content(cur, content_type, header(event, 'If-None-Match'))
         
         auth_header = event.get('headers', {}).get('X-Authorization', '')
         token = auth_header.replace('Bearer ', '')
@@ -111,14 +119,7 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        cur.execute("""
-            SELECT u.id, u.user_role
-            FROM user_sessions s
-            JOIN users u ON s.user_id = u.id
-            WHERE s.session_token = %s AND s.expires_at > NOW()
-        """, (token,))
-        
-        session = cur.fetchone()
+        session = lookup_session(cur, token)
         
         if not session or session['user_role'] != 'admin':
             return {
@@ -130,18 +131,36 @@ def handler(event: dict, context) -> dict:
         
         if method == 'GET' and action == 'messages' and request_id:
             from messages import handle_get_admin_messages
-            return handle_get_admin_messages(cur, int(request_id))
+            return handle_get_admin_messages(cur, conn, int(request_id), query_params)
+        elif method == 'GET' and action == 'stats':
+            from stats import handle_get_stats
+            return handle_get_stats(cur, query_params, header(event, 'If-None-Match'))
+        elif method == 'GET' and action in ('requests', 'users', 'works'):
+            import listings
+            handle_list = {
+                'requests': listings.handle_list_requests,
+                'users': listings.handle_list_users,
+                'works': listings.handle_list_works
+            }[action]
+            return handle_list(cur, query_params)
         elif method == 'GET':
-            return handle_get_all_data(cur)
+            return handle_get_all_data(cur, query_params, header(event, 'If-None-Match'))
         elif method == 'POST' and action == 'send_message' and request_id:
             from messages import handle_send_admin_message
             body = json.loads(event.get('body', '{}'))
-            return handle_send_admin_message(cur, conn, int(request_id), body)
+            return handle_send_admin_message(cur, conn, int(request_id), body, session['user_id'])
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
             action = body.get('action', '')
             
-            if action == 'update_status':
+            if action == 'upload_url':
+                from uploads import handle_upload_url
+                prefix = 'content' if body.get('purpose') == 'content' else 'requests'
+                return handle_upload_url(cur, conn, session['user_id'], body, prefix)
+            elif action == 'confirm_upload':
+                from uploads import handle_confirm_upload
+                return handle_confirm_upload(cur, conn, session['user_id'], body)
+            elif action == 'update_status':
                 return handle_update_status(cur, conn, body)
             elif action == 'complete_work':
                 return handle_complete_work(cur, conn, body)
@@ -149,12 +168,21 @@ def handler(event: dict, context) -> dict:
                 return handle_pay_bonus(cur, conn, body)
             elif action == 'delete_request':
                 return handle_delete_request(cur, conn, body)
+            elif action in ('bulk_update_status', 'bulk_complete_work', 'bulk_pay_bonus', 'bulk_delete_requests'):
+                import bulk
+                handle_bulk = {
+                    'bulk_update_status': bulk.handle_bulk_update_status,
+                    'bulk_complete_work': bulk.handle_bulk_complete_work,
+                    'bulk_pay_bonus': bulk.handle_bulk_pay_bonus,
+                    'bulk_delete_requests': bulk.handle_bulk_delete_requests
+                }[action]
+                return handle_bulk(cur, conn, body)
             elif action == 'create_content':
                 from content import handle_create_content
-                return handle_create_content(cur, conn, body)
+                return handle_create_content(cur, conn, body, session['user_id'])
             elif action == 'update_content':
                 from content import handle_update_content
-                return handle_update_content(cur, conn, body)
+                return handle_update_content(cur, conn, body, session['user_id'])
             elif action == 'delete_content':
                 from content import handle_delete_content
                 return handle_delete_content(cur, conn, body)
@@ -177,21 +205,54 @@ def handler(event: dict, context) -> dict:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            release_connection(conn)
 
 
-def handle_get_all_data(cur) -> dict:
+def handle_get_all_data(cur, query_params: dict, if_none_match: str = '') -> dict:
+    '''Заявки, пользователи и работы; с since — только изменённые после курсора и id удалённых'''
+    try:
+        since = decode_sync_cursor(query_params['since']) if query_params.get('since') else None
+    except InvalidCursor:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': 'Invalid cursor'}),
+            'isBase64Encoded': False
+        }
+    
     cur.execute("""
+        SELECT LOCALTIMESTAMP AS synced_at,
+               COALESCE((SELECT SUM(version) FROM data_versions WHERE scope = 'admin'), 0)::bigint AS version
+    """)
+    marker = cur.fetchone()
+    
+    etag = make_etag('admin', marker['version'], {'since': query_params.get('since')})
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    params = {'since': since}
+    requests_filter = ''
+    users_filter = ''
+    works_filter = ''
+    if since:
+        requests_filter = """
+            WHERE r.updated_at > %(since)s
+               OR r.id IN (SELECT request_id FROM request_unread_counts WHERE updated_at > %(since)s)
+        """
+        users_filter = 'WHERE updated_at > %(since)s'
+        works_filter = 'WHERE updated_at > %(since)s'
+    
+    cur.execute(f"""
         SELECT 
             r.id, r.user_id, r.client_name, r.client_phone, r.client_email,
             r.car_brand, r.car_model, r.car_year, r.service_type,
             r.description, r.status, r.created_at, r.updated_at,
-            COUNT(CASE WHEN m.is_read = FALSE AND m.sender_type = 'client' THEN 1 END) as unread_count
+            COALESCE(uc.unread_client_count, 0) as unread_count
         FROM russification_requests r
-        LEFT JOIN request_messages m ON r.id = m.request_id
-        GROUP BY r.id
+        LEFT JOIN request_unread_counts uc ON uc.request_id = r.id
+        {requests_filter}
         ORDER BY r.created_at DESC
-    """)
+    """, params)
     
     requests = [dict(row) for row in cur.fetchall()]
     
@@ -201,12 +262,13 @@ def handle_get_all_data(cur) -> dict:
         if req['updated_at']:
             req['updated_at'] = req['updated_at'].isoformat()
     
-    cur.execute("""
+    cur.execute(f"""
         SELECT 
             id, email, name, phone, company_name, user_type, user_role, bonus_balance, created_at
         FROM users
+        {users_filter}
         ORDER BY created_at DESC
-    """)
+    """, params)
     
     users = [dict(row) for row in cur.fetchall()]
     
@@ -214,12 +276,13 @@ def handle_get_all_data(cur) -> dict:
         if user['created_at']:
             user['created_at'] = user['created_at'].isoformat()
     
-    cur.execute("""
+    cur.execute(f"""
         SELECT 
             id, request_id, user_id, work_cost, bonus_earned, work_date, is_bonus_paid, notes
         FROM completed_works
+        {works_filter}
         ORDER BY work_date DESC
-    """)
+    """, params)
     
     works = [dict(row) for row in cur.fetchall()]
     
@@ -228,15 +291,31 @@ def handle_get_all_data(cur) -> dict:
             work['work_date'] = work['work_date'].isoformat()
         work['work_cost'] = float(work['work_cost'])
     
+    result = {
+        'success': True,
+        'requests': requests,
+        'users': users,
+        'works': works,
+        'syncCursor': encode_cursor(marker['synced_at'], 0)
+    }
+    
+    if since:
+        cur.execute("""
+            SELECT table_name, record_id
+            FROM sync_tombstones
+            WHERE deleted_at > %s AND table_name IN ('russification_requests', 'users', 'completed_works')
+        """, (since,))
+        
+        keys = {'russification_requests': 'requests', 'users': 'users', 'completed_works': 'works'}
+        deleted = {'requests': [], 'users': [], 'works': []}
+        for row in cur.fetchall():
+            deleted[keys[row['table_name']]].append(row['record_id'])
+        result['deleted'] = deleted
+    
     return {
         'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
-            'success': True,
-            'requests': requests,
-            'users': users,
-            'works': works
-        }),
+        'headers': cache_headers(etag),
+        'body': json.dumps(result),
         'isBase64Encoded': False
     }
 
@@ -0,0 +1,200 @@
+import json
+from datetime import date, datetime, timedelta
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, parse_limit
+
+REQUEST_STATUSES = ('pending', 'in_progress', 'completed', 'cancelled')
+SERVICE_TYPES = ('multimedia', 'dashboard', 'navigation', 'climate', 'full')
+USER_ROLES = ('partner', 'admin')
+
+
+class InvalidFilter(Exception):
+    pass
+
+
+def parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidFilter(value)
+
+
+def parse_choice(value: str, choices: tuple) -> str:
+    if value not in choices:
+        raise InvalidFilter(value)
+    return value
+
+
+def parse_id(value: str) -> int:
+    if not str(value).isdigit():
+        raise InvalidFilter(value)
+    return int(value)
+
+
+def parse_search(value: str) -> str:
+    '''Шаблон ILIKE для подстрочного поиска; %, _ и \\ в запросе ищутся буквально'''
+    value = value.strip()[:100]
+    if not value:
+        raise InvalidFilter(value)
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def keyset_filters(query_params: dict, column: str, conditions: list, params: dict, id_column: str = 'id'):
+    '''Диапазон дат (date_from/date_to включительно) и курсор следующей страницы по (column, id_column)'''
+    if query_params.get('date_from'):
+        conditions.append(f'{column} >= %(date_from)s')
+        params['date_from'] = parse_date(query_params['date_from'])
+    if query_params.get('date_to'):
+        conditions.append(f'{column} < %(date_to)s')
+        params['date_to'] = parse_date(query_params['date_to']) + timedelta(days=1)
+    if query_params.get('cursor'):
+        conditions.append(f'({column}, {id_column}) < (%(cursor_ts)s, %(cursor_id)s)')
+        params['cursor_ts'], params['cursor_id'] = decode_cursor(query_params['cursor'])
+
+
+def fetch_page(cur, sql: str, params: dict, sort_key: str, limit: int) -> tuple:
+    '''Строки страницы (даты в ISO) и курсор следующей; None, если страница последняя'''
+    params['limit'] = limit + 1
+    cur.execute(sql, params)
+    rows = [dict(row) for row in cur.fetchall()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][sort_key], rows[-1]['id'])
+
+    for row in rows:
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                row[key] = value.isoformat()
+    return rows, next_cursor
+
+
+def list_response(key: str, query_params: dict, build) -> dict:
+    '''Общая обвязка: разбор фильтров, 400 на некорректные, JSON со страницей и nextCursor'''
+    try:
+        rows, next_cursor = build(query_params, parse_limit(query_params.get('limit')))
+    except (InvalidCursor, InvalidFilter):
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': 'Invalid cursor or filter'}),
+            'isBase64Encoded': False
+        }
+
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, key: rows, 'nextCursor': next_cursor}),
+        'isBase64Encoded': False
+    }
+
+
+def handle_list_requests(cur, query_params: dict) -> dict:
+    '''Заявки по created_at DESC, id DESC; фильтры status, service_type, user_id (партнёр), q, date_from/date_to.
+
+    Строка сразу несёт имя партнёра и выполненную работу — вкладке не нужны полные
+    списки пользователей и работ. q ищет подстроку в данных клиента, авто и партнёра.
+    '''
+    def build(query_params: dict, limit: int):
+        conditions = []
+        params = {}
+        if query_params.get('status'):
+            conditions.append('r.status = %(status)s')
+            params['status'] = parse_choice(query_params['status'], REQUEST_STATUSES)
+        if query_params.get('service_type'):
+            conditions.append('r.service_type = %(service_type)s')
+            params['service_type'] = parse_choice(query_params['service_type'], SERVICE_TYPES)
+        if query_params.get('user_id'):
+            conditions.append('r.user_id = %(user_id)s')
+            params['user_id'] = parse_id(query_params['user_id'])
+        if (query_params.get('q') or '').strip():
+            conditions.append("""concat_ws(' ', r.client_name, r.client_phone, r.client_email,
+                r.car_brand, r.car_model, u.name, u.company_name) ILIKE %(q)s""")
+            params['q'] = parse_search(query_params['q'])
+        keyset_filters(query_params, 'r.created_at', conditions, params, 'r.id')
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return fetch_page(cur, f"""
+            SELECT
+                r.id, r.user_id, r.client_name, r.client_phone, r.client_email,
+                r.car_brand, r.car_model, r.car_year, r.service_type,
+                r.description, r.status, r.created_at, r.updated_at,
+                COALESCE(uc.unread_client_count, 0) AS unread_count,
+                u.name AS partner_name, u.company_name AS partner_company,
+                w.id AS work_id, w.is_bonus_paid AS work_is_bonus_paid
+            FROM russification_requests r
+            LEFT JOIN request_unread_counts uc ON uc.request_id = r.id
+            LEFT JOIN users u ON u.id = r.user_id
+            LEFT JOIN LATERAL (
+                SELECT id, is_bonus_paid FROM completed_works
+                WHERE request_id = r.id
+                ORDER BY id
+                LIMIT 1
+            ) w ON TRUE
+            {where}
+            ORDER BY r.created_at DESC, r.id DESC
+            LIMIT %(limit)s
+        """, params, 'created_at', limit)
+
+    return list_response('requests', query_params, build)
+
+
+def handle_list_users(cur, query_params: dict) -> dict:
+    '''Пользователи по created_at DESC, id DESC; фильтры user_role, date_from/date_to; с числом заявок и работ'''
+    def build(query_params: dict, limit: int):
+        conditions = []
+        params = {}
+        if query_params.get('user_role'):
+            conditions.append('user_role = %(user_role)s')
+            params['user_role'] = parse_choice(query_params['user_role'], USER_ROLES)
+        keyset_filters(query_params, 'created_at', conditions, params)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return fetch_page(cur, f"""
+            SELECT
+                id, email, name, phone, company_name, user_type, user_role, bonus_balance, created_at,
+                (SELECT COUNT(*) FROM russification_requests r WHERE r.user_id = users.id)::int AS request_count,
+                (SELECT COUNT(*) FROM completed_works w WHERE w.user_id = users.id)::int AS work_count
+            FROM users
+            {where}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %(limit)s
+        """, params, 'created_at', limit)
+
+    return list_response('users', query_params, build)
+
+
+def handle_list_works(cur, query_params: dict) -> dict:
+    '''Выполненные работы по work_date DESC, id DESC; фильтры user_id (партнёр), is_bonus_paid, date_from/date_to.
+
+    Вместе с авто из заявки и именем партнёра.
+    '''
+    def build(query_params: dict, limit: int):
+        conditions = []
+        params = {}
+        if query_params.get('user_id'):
+            conditions.append('w.user_id = %(user_id)s')
+            params['user_id'] = parse_id(query_params['user_id'])
+        if query_params.get('is_bonus_paid'):
+            conditions.append('w.is_bonus_paid = %(is_bonus_paid)s')
+            params['is_bonus_paid'] = parse_choice(query_params['is_bonus_paid'], ('true', 'false')) == 'true'
+        keyset_filters(query_params, 'w.work_date', conditions, params, 'w.id')
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return fetch_page(cur, f"""
+            SELECT
+                w.id, w.request_id, w.user_id, w.work_cost::float8 AS work_cost, w.bonus_earned,
+                w.work_date, w.is_bonus_paid, w.notes,
+                r.car_brand, r.car_model,
+                u.name AS partner_name, u.company_name AS partner_company
+            FROM completed_works w
+            LEFT JOIN russification_requests r ON r.id = w.request_id
+            LEFT JOIN users u ON u.id = w.user_id
+            {where}
+            ORDER BY w.work_date DESC, w.id DESC
+            LIMIT %(limit)s
+        """, params, 'work_date', limit)
+
+    return list_response('works', query_params, build)
@@ -2,12 +2,16 @@ import json
 import os
 import base64
 import boto3
-import urllib.request
 from datetime import datetime
 
+from longpoll import parse_wait, wait_for_messages
+from outbox import enqueue_telegram
+from pagination import parse_limit
+from uploads import get_confirmed_upload
 
-def handle_get_admin_messages(cur, request_id: int) -> dict:
-    '''Получить все сообщения по заявке (для админа)'''
+
+def handle_get_admin_messages(cur, conn, request_id: int, query_params: dict) -> dict:
+    '''Получить сообщения по заявке (для админа); с wait и after_id — дождаться новых (long-poll)'''
     
     cur.execute(
         "SELECT id FROM russification_requests WHERE id = %s",
@@ -22,13 +26,67 @@ def handle_get_admin_messages(cur, request_id: int) -> dict:
             'isBase64Encoded': False
         }
     
-    cur.execute("""
-        UPDATE request_messages 
-        SET is_read = TRUE 
-        WHERE request_id = %s AND sender_type = 'client' AND is_read = FALSE
-    """, (request_id,))
+    wait = parse_wait(query_params.get('wait'))
+    after_id = query_params.get('after_id', '')
+    if wait and after_id.isdigit() and not wait_for_messages(cur, conn, request_id, int(after_id), wait):
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': True, 'messages': [], 'has_more': False}),
+            'isBase64Encoded': False
+        }
+    
+    page = fetch_messages(cur, request_id, query_params)
+    if page is None:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': 'Invalid after_id or before_id'}),
+            'isBase64Encoded': False
+        }
     
+    messages, has_more = page
+    mark_read(cur, request_id, 'admin', messages)
+    conn.commit()
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, 'messages': messages, 'has_more': has_more}),
+        'isBase64Encoded': False
+    }
+
+
+def mark_read(cur, request_id: int, reader: str, messages: list):
+    '''Сдвинуть отметку прочитанного до последнего отданного сообщения; без новых сообщений — без записи'''
+    if not messages:
+        return
     cur.execute("""
+        INSERT INTO request_read_marks (request_id, reader, last_read_message_id, updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (request_id, reader) DO UPDATE
+        SET last_read_message_id = EXCLUDED.last_read_message_id, updated_at = NOW()
+        WHERE request_read_marks.last_read_message_id < EXCLUDED.last_read_message_id
+    """, (request_id, reader, messages[-1]['id']))
+
+
+def fetch_messages(cur, request_id: int, query_params: dict):
+    '''Сообщения заявки по возрастанию id.
+    
+    after_id — только новее указанного (обновление чата), before_id — страница истории
+    перед указанным (подгрузка при прокрутке вверх), limit без id — последние limit сообщений.
+    Без параметров — вся история. Возвращает (messages, has_more) или None при неверных параметрах.
+    '''
+    try:
+        after_id = int(query_params['after_id']) if query_params.get('after_id') else None
+        before_id = int(query_params['before_id']) if query_params.get('before_id') else None
+    except ValueError:
+        return None
+    
+    paginate = after_id is not None or before_id is not None or bool(query_params.get('limit'))
+    limit = parse_limit(query_params.get('limit'))
+    
+    sql = """
         SELECT 
             id, 
             sender_type, 
@@ -39,11 +97,31 @@ def handle_get_admin_messages(cur, request_id: int) -> dict:
             created_at
         FROM request_messages
         WHERE request_id = %s
-        ORDER BY created_at ASC
-    """, (request_id,))
+    """
+    params = [request_id]
+    
+    if after_id is not None:
+        sql += " AND id > %s ORDER BY id ASC LIMIT %s"
+        params.extend([after_id, limit + 1])
+    elif before_id is not None:
+        sql += " AND id < %s ORDER BY id DESC LIMIT %s"
+        params.extend([before_id, limit + 1])
+    elif paginate:
+        sql += " ORDER BY id DESC LIMIT %s"
+        params.append(limit + 1)
+    else:
+        sql += " ORDER BY id ASC"
+    
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    
+    has_more = paginate and len(rows) > limit
+    rows = rows[:limit] if paginate else rows
+    if paginate and after_id is None:
+        rows.reverse()
     
     messages = []
-    for row in cur.fetchall():
+    for row in rows:
         messages.append({
             'id': row['id'],
             'sender_type': row['sender_type'],
@@ -54,15 +132,9 @@ def handle_get_admin_messages(cur, request_id: int) -> dict:
             'created_at': row['created_at'].isoformat() if row['created_at'] else None
         })
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({'success': True, 'messages': messages}),
-        'isBase64Encoded': False
-    }
-
+    return messages, has_more
 
-def handle_send_admin_message(cur, conn, request_id: int, data: dict) -> dict:
+def handle_send_admin_message(cur, conn, request_id: int, data: dict, admin_id: int = None) -> dict:
     '''Отправить сообщение от администратора'''
     
     cur.execute(
@@ -86,7 +158,17 @@ def handle_send_admin_message(cur, conn, request_id: int, data: dict) -> dict:
     file_name = None
     file_type = None
     
-    if file_data:
+    if data.get('upload_id'):
+        upload = get_confirmed_upload(cur, admin_id, data['upload_id'])
+        if not upload:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': False, 'message': 'Файл не загружен'}),
+                'isBase64Encoded': False
+            }
+        file_url, file_name, file_type = upload['file_url'], upload['file_name'], upload['file_type']
+    elif file_data:
         try:
             file_url, file_name, file_type = upload_file_to_s3(
                 file_data.get('content'),
@@ -117,10 +199,9 @@ def handle_send_admin_message(cur, conn, request_id: int, data: dict) -> dict:
     """, (request_id, request['user_id'], message_text or None, file_url, file_name, file_type))
     
     result = cur.fetchone()
+    enqueue_client_notification(cur, request_id, message_text, file_name)
     conn.commit()
     
-    notify_client_telegram(cur, request_id, message_text, file_name)
-    
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -134,57 +215,37 @@ def handle_send_admin_message(cur, conn, request_id: int, data: dict) -> dict:
     }
 
 
-def notify_client_telegram(cur, request_id: int, message_text: str, file_name: str = None):
-    '''Уведомить клиента в Telegram о новом сообщении от компании'''
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    if not bot_token:
+def enqueue_client_notification(cur, request_id: int, message_text: str, file_name: str = None):
+    '''Поставить в outbox уведомление клиенту в Telegram о новом сообщении от компании'''
+    cur.execute("""
+        SELECT r.car_brand, r.car_model, r.car_year,
+               u.telegram_id
+        FROM russification_requests r
+        LEFT JOIN users u ON r.user_id = u.id
+        WHERE r.id = %s
+    """, (request_id,))
+
+    data = cur.fetchone()
+    if not data or not data.get('telegram_id'):
         return
 
-    try:
-        cur.execute("""
-            SELECT r.car_brand, r.car_model, r.car_year,
-                   u.telegram_id
-            FROM russification_requests r
-            LEFT JOIN users u ON r.user_id = u.id
-            WHERE r.id = %s
-        """, (request_id,))
-
-        data = cur.fetchone()
-        if not data or not data.get('telegram_id'):
-            return
-
-        telegram_id = data['telegram_id']
-        car_info = f"{data['car_brand']} {data['car_model']}"
-        if data.get('car_year'):
-            car_info += f" ({data['car_year']})"
-
-        text = f"💬 <b>Новое сообщение по заявке #{request_id}</b>\n"
-        text += f"🚗 {car_info}\n\n"
-        text += f"🏢 SmartLine:\n{message_text or '(файл)'}"
-        if file_name:
-            text += f"\n📎 {file_name}"
-
-        keyboard = {
-            'inline_keyboard': [
-                [{'text': '💬 Ответить', 'callback_data': f'reply_{request_id}'}]
-            ]
-        }
+    car_info = f"{data['car_brand']} {data['car_model']}"
+    if data.get('car_year'):
+        car_info += f" ({data['car_year']})"
+
+    text = f"💬 <b>Новое сообщение по заявке #{request_id}</b>\n"
+    text += f"🚗 {car_info}\n\n"
+    text += f"🏢 SmartLine:\n{message_text or '(файл)'}"
+    if file_name:
+        text += f"\n📎 {file_name}"
+
+    keyboard = {
+        'inline_keyboard': [
+            [{'text': '💬 Ответить', 'callback_data': f'reply_{request_id}'}]
+        ]
+    }
 
-        req_data = json.dumps({
-            'chat_id': telegram_id,
-            'text': text,
-            'parse_mode': 'HTML',
-            'reply_markup': keyboard
-        }).encode('utf-8')
-
-        req = urllib.request.Request(
-            f'https://api.telegram.org/bot{bot_token}/sendMessage',
-            data=req_data,
-            headers={'Content-Type': 'application/json'}
-        )
-        urllib.request.urlopen(req, timeout=5)
-    except Exception as e:
-        print(f"Notify client telegram error: {e}")
+    enqueue_telegram(cur, data['telegram_id'], text, keyboard)
 
 
 def upload_file_to_s3(base64_content: str, file_name: str, file_type: str) -> tuple:
@@ -0,0 +1,78 @@
+import json
+
+from etag import data_version, make_etag, etag_matches, not_modified, cache_headers
+from listings import InvalidFilter, parse_date, parse_id
+
+
+def handle_get_stats(cur, query_params: dict, if_none_match: str = '') -> dict:
+    '''KPI админки из admin_stats_rollup; необязательные фильтры date_from/date_to и user_id (партнёр).
+
+    totalPartners и unreadMessages — по всей базе, без фильтров.
+    '''
+    try:
+        conditions = []
+        params = {}
+        if query_params.get('date_from'):
+            conditions.append('day >= %(date_from)s')
+            params['date_from'] = parse_date(query_params['date_from'])
+        if query_params.get('date_to'):
+            conditions.append('day <= %(date_to)s')
+            params['date_to'] = parse_date(query_params['date_to'])
+        if query_params.get('user_id'):
+            conditions.append('partner_id = %(user_id)s')
+            params['user_id'] = parse_id(query_params['user_id'])
+    except InvalidFilter:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': 'Invalid filter'}),
+            'isBase64Encoded': False
+        }
+
+    etag = make_etag('admin', data_version(cur, 'admin'), {
+        'stats': 1, **{k: query_params.get(k) for k in ('date_from', 'date_to', 'user_id')}
+    })
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cur.execute(f"""
+        SELECT
+            COALESCE(SUM(request_count), 0)::int AS total_requests,
+            COALESCE(SUM(request_count) FILTER (WHERE status = 'pending'), 0)::int AS pending_requests,
+            COALESCE(SUM(request_count) FILTER (WHERE status = 'in_progress'), 0)::int AS in_progress_requests,
+            COALESCE(SUM(request_count) FILTER (WHERE status = 'completed'), 0)::int AS completed_requests,
+            COALESCE(SUM(request_count) FILTER (WHERE status = 'cancelled'), 0)::int AS cancelled_requests,
+            COALESCE(SUM(work_count), 0)::int AS completed_works,
+            COALESCE(SUM(revenue), 0)::float8 AS revenue,
+            COALESCE(SUM(bonus_earned), 0)::bigint AS bonus_earned,
+            COALESCE(SUM(unpaid_work_count), 0)::int AS unpaid_bonuses,
+            COALESCE(SUM(unpaid_bonus), 0)::bigint AS unpaid_bonus_amount,
+            (SELECT COUNT(*) FROM users WHERE user_role = 'partner')::int AS total_partners,
+            (SELECT COALESCE(SUM(unread_client_count), 0) FROM request_unread_counts)::int AS unread_messages
+        FROM admin_stats_rollup
+        {where}
+    """, params)
+    row = cur.fetchone()
+
+    stats = {
+        'totalRequests': row['total_requests'],
+        'pendingRequests': row['pending_requests'],
+        'inProgressRequests': row['in_progress_requests'],
+        'completedRequests': row['completed_requests'],
+        'cancelledRequests': row['cancelled_requests'],
+        'completedWorks': row['completed_works'],
+        'revenue': row['revenue'],
+        'bonusEarned': row['bonus_earned'],
+        'unpaidBonuses': row['unpaid_bonuses'],
+        'unpaidBonusAmount': row['unpaid_bonus_amount'],
+        'totalPartners': row['total_partners'],
+        'unreadMessages': row['unread_messages']
+    }
+
+    return {
+        'statusCode': 200,
+        'headers': cache_headers(etag),
+        'body': json.dumps({'success': True, 'stats': stats}),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))
+
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX_SIZE)
+_idle = []
+_meta = {}
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+def _open(dsn: str):
+    conn = psycopg2.connect(dsn)
+    _meta[id(conn)] = {'created': time.monotonic(), 'released': time.monotonic()}
+    return conn
+
+
+def _discard(conn):
+    _meta.pop(id(conn), None)
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_healthy(conn) -> bool:
+    '''Проверка соединения перед выдачей: закрыто, устарело или не отвечает — выбрасываем'''
+    if conn.closed:
+        return False
+    meta = _meta.get(id(conn), {})
+    now = time.monotonic()
+    if now - meta.get('created', now) > POOL_MAX_LIFETIME:
+        return False
+    if now - meta.get('released', now) < POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def get_connection(dsn: str = None):
+    '''Взять соединение из пула тёплого контейнера (или открыть новое, если свободных нет)'''
+    dsn = dsn or os.environ.get('DATABASE_URL')
+    if not _slots.acquire(timeout=POOL_ACQUIRE_TIMEOUT):
+        raise PoolExhausted(f'No free database connections (max {POOL_MAX_SIZE})')
+
+    try:
+        while True:
+            with _lock:
+                conn = _idle.pop() if _idle else None
+            if conn is None:
+                return _open(dsn)
+            if _is_healthy(conn):
+                return conn
+            _discard(conn)
+    except Exception:
+        _slots.release()
+        raise
+
+
+def release_connection(conn):
+    '''Вернуть соединение в пул, сбросив незавершённую транзакцию и настройки сессии'''
+    try:
+        if conn.closed:
+            _discard(conn)
+            return
+
+        status = conn.info.transaction_status
+        if status == TRANSACTION_STATUS_UNKNOWN:
+            _discard(conn)
+            return
+        if status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        if conn.autocommit:
+            conn.autocommit = False
+
+        _meta.setdefault(id(conn), {'created': time.monotonic()})['released'] = time.monotonic()
+        with _lock:
+            _idle.append(conn)
+    except Exception:
+        _discard(conn)
+    finally:
+        _slots.release()
+
+
+@contextmanager
+def pooled_connection(dsn: str = None):
+    '''Контекстный менеджер: соединение из пула, возвращается при выходе из блока'''
+    conn = get_connection(dsn)
+    try:
+        yield conn
+    finally:
+        release_connection(conn)
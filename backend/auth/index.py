@@ -3,8 +3,12 @@ import os
 import hashlib
 import secrets
 from datetime import datetime, timedelta
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from sessions import (
+    SIGNED_TOKEN_PREFIX, get_cached_session, cache_session, invalidate_token, lookup_session,
+    signed_tokens_enabled, issue_signed_token, decode_signed_token, revoke_signed_token, revoke_opaque_token
+)
 
 def handler(event: dict, context) -> dict:
     '''API для авторизации и регистрации по номеру телефона'''
@@ -29,7 +33,7 @@ def handler(event: dict, context) -> dict:
         return error_response('Database not configured', 500)
     
     try:
-        conn = psycopg2.connect(dsn)
+        conn = get_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'POST':
@@ -40,6 +44,10 @@ def handler(event: dict, context) -> dict:
                 return handle_register(cur, conn, body)
             elif action == 'login':
                 return handle_login(cur, conn, body)
+            elif action == 'logout':
+                auth_header = event.get('headers', {}).get('X-Authorization', '')
+                token = auth_header.replace('Bearer ', '')
+                return handle_logout(cur, conn, token)
         
         elif method == 'GET':
             query_params = event.get('queryStringParameters', {}) or {}
@@ -58,7 +66,7 @@ def handler(event: dict, context) -> dict:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            release_connection(conn)
 
 
 def normalize_phone(phone: str) -> str:
@@ -100,7 +108,10 @@ def user_dict(user: dict) -> dict:
     }
 
 
-def create_session(cur, conn, user_id: int) -> str:
+def create_session(cur, conn, user_id: int, user_role: str = 'partner') -> str:
+    if signed_tokens_enabled():
+        return issue_signed_token(user_id, user_role)
+    
     token = generate_token()
     expires_at = datetime.now() + timedelta(days=30)
     cur.execute("""
@@ -143,7 +154,7 @@ def handle_register(cur, conn, body: dict) -> dict:
     user = dict(cur.fetchone())
     conn.commit()
     
-    token = create_session(cur, conn, user['id'])
+    token = create_session(cur, conn, user['id'], user['user_role'])
     
     return {
         'statusCode': 200,
@@ -181,7 +192,7 @@ def handle_login(cur, conn, body: dict) -> dict:
         }
     
     user = dict(user)
-    token = create_session(cur, conn, user['id'])
+    token = create_session(cur, conn, user['id'], user['user_role'])
     
     return {
         'statusCode': 200,
@@ -195,21 +206,60 @@ def handle_verify(cur, token: str) -> dict:
     if not token:
         return error_response('Token not provided', 401)
     
-    cur.execute("""
-        SELECT u.id, u.email, u.name, u.phone, u.company_name, u.user_type, u.user_role, u.bonus_balance
-        FROM user_sessions s
-        JOIN users u ON s.user_id = u.id
-        WHERE s.session_token = %s AND s.expires_at > NOW()
-    """, (token,))
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        session = lookup_session(cur, token)
+        if not session:
+            return error_response('Invalid or expired token', 401)
+    else:
+        session = get_cached_session(cur, token)
+    
+    if session:
+        cur.execute("""
+            SELECT id, email, name, phone, company_name, user_type, user_role, bonus_balance
+            FROM users
+            WHERE id = %s
+        """, (session['user_id'],))
+    else:
+        cur.execute("""
+            SELECT u.id, u.email, u.name, u.phone, u.company_name, u.user_type, u.user_role, u.bonus_balance,
+                   s.expires_at
+            FROM user_sessions s
+            JOIN users u ON s.user_id = u.id
+            WHERE s.session_token = %s AND s.expires_at > NOW()
+        """, (token,))
     
     user = cur.fetchone()
     
     if not user:
         return error_response('Invalid or expired token', 401)
     
+    if not session:
+        cache_session(token, user['id'], user['user_role'], user['expires_at'])
+    
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'body': json.dumps({'success': True, 'user': user_dict(dict(user))}),
         'isBase64Encoded': False
     }
+
+
+def handle_logout(cur, conn, token: str) -> dict:
+    if not token:
+        return error_response('Token not provided', 401)
+    
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(token)
+        if claims:
+            revoke_signed_token(cur, claims)
+    else:
+        revoke_opaque_token(cur, token)
+    conn.commit()
+    invalidate_token(token)
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True}),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,383 @@
+import hmac
+import json
+import os
+import select
+import time
+from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+import telegram_api
+from scheduler import scheduler
+
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_LEASE = int(os.environ.get('OUTBOX_LEASE', '60'))
+OUTBOX_SENT_RETENTION_DAYS = int(os.environ.get('OUTBOX_SENT_RETENTION_DAYS', '7'))
+OUTBOX_FAILED_RETENTION_DAYS = int(os.environ.get('OUTBOX_FAILED_RETENTION_DAYS', '30'))
+OUTBOX_PURGE_BATCH = 1000
+DISPATCH_TIME_BUDGET = float(os.environ.get('DISPATCH_TIME_BUDGET', '80'))
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 3600
+BATCH_MIN_WINDOW = 5
+
+
+def handler(event: dict, context) -> dict:
+    '''Диспетчер уведомлений Telegram из notification_outbox
+    
+    Забирает пачки неотправленных сообщений по приоритету (FOR UPDATE SKIP LOCKED —
+    несколько экземпляров не отправят одно сообщение дважды), отправляет их в пределах
+    лимитов Telegram (scheduler.py), повторяет неудачные с
+    экспоненциальной задержкой и после OUTBOX_MAX_ATTEMPTS попыток помечает failed.
+    Разобрав очередь, ждёт новых строк через LISTEN до конца DISPATCH_TIME_BUDGET
+    (80 с при таймауте функции 90 с). Запуски раз в минуту перекрываются, и новая
+    строка уходит в пределах секунды; если бюджет короче интервала расписания,
+    строка может ждать до (интервал − DISPATCH_TIME_BUDGET) секунд.
+    
+    Функцию вызывает только планировщик (см. TELEGRAM_BOT_SETUP.md): запрос без
+    заголовка X-Dispatcher-Secret, равного DISPATCHER_SECRET, получает 403.
+    Отправленные строки старше OUTBOX_SENT_RETENTION_DAYS и failed старше
+    OUTBOX_FAILED_RETENTION_DAYS удаляются на каждом запуске.
+    '''
+    method = event.get('httpMethod', 'POST')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Dispatcher-Secret',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    dsn = os.environ.get('DATABASE_URL')
+    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
+    secret = os.environ.get('DISPATCHER_SECRET')
+    if not dsn or not bot_token or not secret:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': 'Database, Telegram or dispatcher secret not configured'}),
+            'isBase64Encoded': False
+        }
+    
+    if not hmac.compare_digest(header(event, 'X-Dispatcher-Secret').encode(), secret.encode()):
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': 'Forbidden'}),
+            'isBase64Encoded': False
+        }
+    
+    query_params = event.get('queryStringParameters') or {}
+    budget = DISPATCH_TIME_BUDGET if query_params.get('wait', '1') != '0' else 0
+    
+    try:
+        conn = get_connection(dsn)
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        stats = dispatch(cur, conn, bot_token, time.monotonic() + budget)
+        stats['purged'] = purge_outbox(cur, conn)
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': True, **stats, 'telegram': telegram_api.get_metrics()}),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': str(e)}),
+            'isBase64Encoded': False
+        }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_connection(conn)
+
+
+def header(event: dict, name: str) -> str:
+    '''Заголовок запроса без учёта регистра'''
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value or ''
+    return ''
+
+
+def purge_outbox(cur, conn) -> int:
+    '''Удалить давно отправленные и давно упавшие строки, не больше OUTBOX_PURGE_BATCH за запуск'''
+    cur.execute("""
+        DELETE FROM notification_outbox
+        WHERE id IN (
+            SELECT id FROM notification_outbox
+            WHERE (status = 'sent' AND sent_at < NOW() - make_interval(days => %s))
+               OR (status = 'failed' AND created_at < NOW() - make_interval(days => %s))
+            LIMIT %s
+        )
+    """, (OUTBOX_SENT_RETENTION_DAYS, OUTBOX_FAILED_RETENTION_DAYS, OUTBOX_PURGE_BATCH))
+    purged = cur.rowcount
+    conn.commit()
+    return purged
+
+
+def dispatch(cur, conn, bot_token: str, deadline: float) -> dict:
+    '''Отправлять пачками, пока очередь не пуста; затем ждать новых строк до deadline'''
+    stats = {'sent': 0, 'retried': 0, 'failed': 0}
+    
+    while True:
+        batch = claim_batch(cur, conn)
+        send_batch(cur, conn, bot_token, batch, deadline, stats)
+        
+        if len(batch) == OUTBOX_BATCH_SIZE:
+            if time.monotonic() >= deadline:
+                break
+            continue
+        if not wait_for_outbox(cur, conn, deadline):
+            break
+    
+    return stats
+
+
+def claim_batch(cur, conn) -> list:
+    '''Взять пачку в работу: попытка засчитывается сразу, next_attempt_at сдвигается на срок аренды.
+    
+    Вместе с созревшими строками забираются ожидающие строки их coalesce_key, для
+    которых ещё не истекло окно склейки (attempts = 0: строку ни разу не брали).
+    Строки, взятые другим экземпляром или ждущие повтора, уже имеют attempts > 0 и
+    next_attempt_at в будущем — их не трогаем, иначе одно сообщение уйдёт дважды.
+    Если экземпляр упадёт посреди пачки, строки снова станут доступны после OUTBOX_LEASE.
+    '''
+    cur.execute("""
+        WITH due AS (
+            SELECT id, coalesce_key FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ORDER BY priority, next_attempt_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ),
+        grouped AS (
+            SELECT id FROM notification_outbox
+            WHERE status = 'pending'
+              AND (attempts = 0 OR next_attempt_at <= NOW())
+              AND coalesce_key IN (SELECT coalesce_key FROM due WHERE coalesce_key IS NOT NULL)
+              AND id NOT IN (SELECT id FROM due)
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE notification_outbox
+        SET attempts = attempts + 1,
+            next_attempt_at = NOW() + make_interval(secs => %s)
+        WHERE id IN (SELECT id FROM due UNION ALL SELECT id FROM grouped)
+        RETURNING id, chat_id, method, payload, attempts, priority, coalesce_key
+    """, (OUTBOX_BATCH_SIZE, OUTBOX_LEASE))
+    rows = cur.fetchall()
+    conn.commit()
+    return group_units(rows)
+
+
+def group_units(rows: list) -> list:
+    '''Единицы отправки: строка без coalesce_key или все строки одного ключа, по приоритету'''
+    units = {}
+    for row in sorted(rows, key=lambda r: r['id']):
+        key = row['coalesce_key'] or f"id:{row['id']}"
+        unit = units.get(key)
+        if unit is None:
+            unit = units[key] = {
+                'id': row['id'],
+                'chat_id': row['chat_id'],
+                'method': row['method'],
+                'priority': row['priority'],
+                'attempts': 0,
+                'rows': []
+            }
+        unit['priority'] = min(unit['priority'], row['priority'])
+        unit['attempts'] = max(unit['attempts'], row['attempts'])
+        unit['rows'].append(row)
+    return sorted(units.values(), key=lambda u: (u['priority'], u['id']))
+
+
+def render_unit(cur, unit: dict):
+    '''Метод и payload для Bot API; None — отправлять нечего (заявка удалена)'''
+    if unit['method'] != 'requestMessages':
+        return unit['method'], unit['rows'][0]['payload']
+    
+    request_id = unit['rows'][0]['payload']['request_id']
+    cur.execute("""
+        SELECT u.name, u.phone, u.company_name,
+               r.car_brand, r.car_model, r.car_year, r.client_name
+        FROM russification_requests r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.id = %s
+    """, (request_id,))
+    data = cur.fetchone()
+    if not data:
+        return None
+    
+    company_name = data['company_name'] or ''
+    car_info = f"{data['car_brand']} {data['car_model']} ({data['car_year']})"
+    
+    items = []
+    for row in unit['rows']:
+        item = row['payload'].get('message_text') or '(файл без текста)'
+        if row['payload'].get('file_name'):
+            item += f"\n📎 Файл: {row['payload']['file_name']}"
+        items.append(item)
+    
+    if len(items) == 1:
+        title = '💬 <b>Новое сообщение от клиента</b>'
+        body = f'💭 Сообщение: {items[0]}'
+    else:
+        title = f'💬 <b>Новые сообщения от клиента ({len(items)})</b>'
+        body = '💭 Сообщения:\n' + '\n'.join(f'• {item}' for item in items)
+    
+    text = f"""{title}
+
+📝 Заявка #{request_id}
+🚗 Автомобиль: {car_info}
+👤 Клиент: {data['client_name']}
+
+👨‍💼 Партнёр: {data['name']}
+{f'🏢 {company_name}' if company_name else ''}
+📞 {data['phone']}
+
+{body}"""
+    
+    return 'sendMessage', {
+        'chat_id': unit['chat_id'],
+        'text': text,
+        'parse_mode': 'HTML',
+        'reply_markup': {
+            'inline_keyboard': [
+                [{'text': '💬 Ответить', 'callback_data': f'admin_reply_{request_id}'}]
+            ]
+        }
+    }
+
+
+def send_batch(cur, conn, bot_token: str, batch: list, deadline: float, stats: dict):
+    '''Отправить пачку в темпе лимитов Telegram.
+
+    Каждый раз берётся самая приоритетная единица, чей чат уже можно писать; если
+    таких нет — ждём ближайший освобождающийся чат, а не спим на занятом. Строки,
+    которые не успеть отправить в пределах аренды, возвращаются в очередь без
+    списания попытки с next_attempt_at на момент освобождения их чата.
+    '''
+    started = time.monotonic()
+    batch_deadline = min(max(deadline, started + BATCH_MIN_WINDOW), started + OUTBOX_LEASE * 0.8)
+    pending = list(batch)
+    
+    while pending:
+        now = time.monotonic()
+        waits = [(scheduler.wait_time(unit['chat_id'], now), unit) for unit in pending]
+        ready = [unit for wait, unit in waits if wait <= 0]
+        if not ready:
+            wait = min(w for w, _ in waits)
+            if now + wait > batch_deadline:
+                release_rows(cur, conn, waits)
+                return
+            time.sleep(wait)
+            continue
+        
+        unit = ready[0]
+        pending.remove(unit)
+        rendered = render_unit(cur, unit)
+        if rendered is None:
+            result = {'ok': False, 'retry': False, 'retry_after': None, 'error': 'request not found'}
+        else:
+            scheduler.acquire(unit['chat_id'])
+            result = send_telegram(bot_token, *rendered)
+            if result['retry_after']:
+                scheduler.block(unit['chat_id'], float(result['retry_after']))
+        record_result(cur, unit, result, stats)
+        conn.commit()
+
+
+def release_rows(cur, conn, waits: list):
+    for wait, unit in waits:
+        cur.execute("""
+            UPDATE notification_outbox
+            SET attempts = attempts - 1, next_attempt_at = NOW() + make_interval(secs => %s)
+            WHERE id = ANY(%s)
+        """, (wait, unit_ids(unit)))
+    conn.commit()
+
+
+def unit_ids(unit: dict) -> list:
+    return [row['id'] for row in unit['rows']]
+
+
+def send_telegram(bot_token: str, method: str, payload: dict) -> dict:
+    '''Вызов Bot API без встроенных повторов — их расписание ведёт outbox'''
+    try:
+        telegram_api.call(method, payload, token=bot_token, retries=0)
+        return {'ok': True, 'retry': False, 'retry_after': None, 'error': None}
+    except telegram_api.TelegramError as e:
+        return {'ok': False, 'retry': e.retryable, 'retry_after': e.retry_after, 'error': str(e)}
+
+
+def retry_delay(attempts: int, retry_after=None) -> int:
+    if retry_after:
+        return int(retry_after)
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def record_result(cur, unit: dict, result: dict, stats: dict):
+    '''Итог отправки применяется ко всем строкам единицы; в stats — число сообщений Telegram'''
+    ids = unit_ids(unit)
+    if result['ok']:
+        cur.execute("""
+            UPDATE notification_outbox
+            SET status = 'sent', sent_at = NOW(), last_error = NULL
+            WHERE id = ANY(%s)
+        """, (ids,))
+        stats['sent'] += 1
+    elif result['retry'] and unit['attempts'] < OUTBOX_MAX_ATTEMPTS:
+        cur.execute("""
+            UPDATE notification_outbox
+            SET next_attempt_at = NOW() + make_interval(secs => %s), last_error = %s
+            WHERE id = ANY(%s)
+        """, (retry_delay(unit['attempts'], result['retry_after']), result['error'], ids))
+        stats['retried'] += 1
+    else:
+        cur.execute("""
+            UPDATE notification_outbox
+            SET status = 'failed', last_error = %s
+            WHERE id = ANY(%s)
+        """, (result['error'], ids))
+        stats['failed'] += 1
+        print(f"Outbox {ids} failed after {unit['attempts']} attempts: {result['error']}")
+
+
+def wait_for_outbox(cur, conn, deadline: float) -> bool:
+    '''Ждать новой строки или ближайшего повтора, не дольше deadline. True — есть что отправлять'''
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return False
+    
+    conn.autocommit = True
+    try:
+        cur.execute("LISTEN notification_outbox")
+        cur.execute("""
+            SELECT EXTRACT(EPOCH FROM MIN(next_attempt_at) - NOW()) AS due_in
+            FROM notification_outbox
+            WHERE status = 'pending'
+        """)
+        due_in = cur.fetchone()['due_in']
+        if due_in is not None and due_in <= 0:
+            return True
+        
+        timeout = remaining if due_in is None else min(remaining, float(due_in))
+        if select.select([conn], [], [], timeout) == ([], [], []):
+            return due_in is not None and float(due_in) <= remaining
+        conn.poll()
+        return True
+    finally:
+        cur.execute("UNLISTEN notification_outbox")
+        conn.notifies.clear()
+        conn.autocommit = False
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+
+# Лимиты Bot API: ~30 сообщений в секунду всего, ~1 в секунду в личный чат, ~20 в минуту в группу
+TELEGRAM_GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_GROUP_RATE = float(os.environ.get('TELEGRAM_GROUP_RATE', str(20 / 60)))
+TELEGRAM_GROUP_BURST = float(os.environ.get('TELEGRAM_GROUP_BURST', '3'))
+CHAT_BUCKETS_MAX = 1000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        '''Через сколько секунд будет доступен токен'''
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float, now: float):
+        '''Telegram вернул 429 с retry_after: не отправлять до его истечения'''
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class SendScheduler:
+    '''Общий token bucket на бота и отдельный на каждый чат.
+
+    Состояние живёт в тёплом контейнере между вызовами диспетчера.
+    '''
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self.chat_buckets = {}
+        self.lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= CHAT_BUCKETS_MAX:
+                now = time.monotonic()
+                for key in [k for k, b in self.chat_buckets.items() if b.idle(now)]:
+                    del self.chat_buckets[key]
+            if str(chat_id).startswith('-'):
+                bucket = TokenBucket(TELEGRAM_GROUP_RATE, TELEGRAM_GROUP_BURST)
+            else:
+                bucket = TokenBucket(TELEGRAM_CHAT_RATE, 1)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def wait_time(self, chat_id: str, now: float = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return max(self.global_bucket.wait_time(now), self._chat_bucket(chat_id).wait_time(now))
+
+    def acquire(self, chat_id: str, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.global_bucket.take(now)
+            self._chat_bucket(chat_id).take(now)
+
+    def block(self, chat_id: str, seconds: float, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self._chat_bucket(chat_id).block(seconds, now)
+
+
+scheduler = SendScheduler()
@@ -1,10 +1,10 @@
 import json
 import os
 import secrets
-import requests
 from datetime import datetime, timedelta
 import hashlib
-import psycopg2
+from db import get_connection, release_connection
+from outbox import PRIORITY_URGENT, admin_chat_id, enqueue_telegram
 
 def handler(event: dict, context) -> dict:
     '''Восстановление пароля по номеру телефона'''
@@ -43,17 +43,20 @@ def handler(event: dict, context) -> dict:
             
         action = data.get('action', 'request')
         
-        if action == 'request':
-            return handle_request(data)
-        elif action == 'confirm':
-            return handle_confirm(data)
-        else:
+        if action not in ('request', 'confirm'):
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps({'error': 'Неверное действие'}),
                 'isBase64Encoded': False
             }
+        
+        conn = get_connection(os.environ.get('DATABASE_URL'))
+        cur = conn.cursor()
+        
+        if action == 'request':
+            return handle_request(cur, conn, data)
+        return handle_confirm(cur, conn, data)
             
     except Exception as e:
         return {
@@ -62,6 +65,11 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
+    finally:
+        if 'cur' in locals():
+            cur.close()
+        if 'conn' in locals():
+            release_connection(conn)
 
 
 def normalize_phone(phone: str) -> str:
@@ -73,7 +81,7 @@ def normalize_phone(phone: str) -> str:
     return digits
 
 
-def handle_request(data: dict) -> dict:
+def handle_request(cur, conn, data: dict) -> dict:
     '''Отправка кода восстановления через Telegram'''
     
     phone_raw = data.get('phone', '').strip()
@@ -87,17 +95,11 @@ def handle_request(data: dict) -> dict:
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
-    
     phone_escaped = phone.replace("'", "''")
     cur.execute(f"SELECT id, phone, name FROM users WHERE phone = '{phone_escaped}'")
     user = cur.fetchone()
     
     if not user:
-        cur.close()
-        conn.close()
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -113,15 +115,10 @@ def handle_request(data: dict) -> dict:
     cur.execute(
         f"INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES ({user_id}, '{code}', '{expires_at.isoformat()}')"
     )
-    conn.commit()
-    
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    chat_id = os.environ.get('TELEGRAM_CHAT_ID')
     
     formatted = f"+7 ({phone[1:4]}) {phone[4:7]}-{phone[7:9]}-{phone[9:11]}"
     
-    if bot_token and chat_id:
-        message = f"""🔐 <b>Восстановление пароля</b>
+    message = f"""🔐 <b>Восстановление пароля</b>
 
 👤 Пользователь: {user_name}
 📱 Телефон: {formatted}
@@ -130,22 +127,9 @@ def handle_request(data: dict) -> dict:
 
 ⏰ Действителен 15 минут
 🔒 Если это не вы, проигнорируйте сообщение"""
-        
-        try:
-            requests.post(
-                f'https://api.telegram.org/bot{bot_token}/sendMessage',
-                json={
-                    'chat_id': chat_id,
-                    'text': message,
-                    'parse_mode': 'HTML'
-                },
-                timeout=5
-            )
-        except:
-            pass
-    
-    cur.close()
-    conn.close()
+    
+    enqueue_telegram(cur, admin_chat_id(), message, priority=PRIORITY_URGENT)
+    conn.commit()
     
     return {
         'statusCode': 200,
@@ -155,7 +139,7 @@ def handle_request(data: dict) -> dict:
     }
 
 
-def handle_confirm(data: dict) -> dict:
+def handle_confirm(cur, conn, data: dict) -> dict:
     '''Установка нового пароля по коду'''
     
     code = data.get('code', '').strip()
@@ -177,10 +161,6 @@ def handle_confirm(data: dict) -> dict:
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
-    
     code_escaped = code.replace("'", "''")
     cur.execute(
         f"SELECT user_id, expires_at, used FROM password_reset_tokens WHERE token = '{code_escaped}'"
@@ -188,8 +168,6 @@ def handle_confirm(data: dict) -> dict:
     token_data = cur.fetchone()
     
     if not token_data:
-        cur.close()
-        conn.close()
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -200,8 +178,6 @@ def handle_confirm(data: dict) -> dict:
     user_id, expires_at, used = token_data
     
     if used:
-        cur.close()
-        conn.close()
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -210,8 +186,6 @@ def handle_confirm(data: dict) -> dict:
         }
     
     if datetime.now() > expires_at:
-        cur.close()
-        conn.close()
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -230,10 +204,13 @@ def handle_confirm(data: dict) -> dict:
         f"UPDATE password_reset_tokens SET used = TRUE WHERE token = '{code_escaped}'"
     )
     
-    conn.commit()
-    cur.close()
-    conn.close()
+    cur.execute("DELETE FROM user_sessions WHERE user_id = %s", (user_id,))
+    cur.execute("""
+        INSERT INTO session_revocations (user_id, revoked_before, expires_at)
+        VALUES (%s, NOW(), NOW() + INTERVAL '30 days')
+    """, (user_id,))
     
+    conn.commit()
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -0,0 +1,53 @@
+import json
+import os
+
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 10
+NOTIFY_COALESCE_WINDOW = int(os.environ.get('NOTIFY_COALESCE_WINDOW', '10'))
+
+
+def admin_chat_id():
+    '''Чат администраторов для уведомлений о новых сообщениях и заявках'''
+    return os.environ.get('TELEGRAM_CHAT_ID')
+
+
+def enqueue_telegram(cur, chat_id, text: str, keyboard: dict = None, parse_mode: str = 'HTML',
+                     priority: int = PRIORITY_NORMAL):
+    '''Поставить сообщение Telegram в notification_outbox в текущей транзакции.
+    
+    Отправляет notification-dispatcher: если транзакция откатится, уведомления не будет,
+    а после коммита оно не потеряется при недоступности Telegram. PRIORITY_URGENT
+    (коды восстановления) диспетчер отправляет раньше обычных уведомлений.
+    '''
+    if not chat_id:
+        return
+    
+    payload = {'chat_id': chat_id, 'text': text}
+    if parse_mode:
+        payload['parse_mode'] = parse_mode
+    if keyboard:
+        payload['reply_markup'] = keyboard
+    
+    cur.execute("""
+        INSERT INTO notification_outbox (chat_id, method, payload, priority)
+        VALUES (%s, 'sendMessage', %s, %s)
+    """, (str(chat_id), json.dumps(payload, ensure_ascii=False), priority))
+
+
+def enqueue_request_message(cur, request_id: int, message_text: str, file_name: str = None):
+    '''Уведомление админам о сообщении клиента по заявке.
+    
+    Отправка откладывается на NOTIFY_COALESCE_WINDOW секунд: всё, что клиент напишет
+    по заявке за это время, диспетчер склеит в одно сообщение и один раз подтянет
+    данные заявки и партнёра.
+    '''
+    chat_id = admin_chat_id()
+    if not chat_id:
+        return
+    
+    payload = {'request_id': request_id, 'message_text': message_text, 'file_name': file_name}
+    cur.execute("""
+        INSERT INTO notification_outbox (chat_id, method, payload, priority, coalesce_key, next_attempt_at)
+        VALUES (%s, 'requestMessages', %s, %s, %s, NOW() + make_interval(secs => %s))
+    """, (str(chat_id), json.dumps(payload, ensure_ascii=False), PRIORITY_NORMAL,
+          f'request_messages:{request_id}:{chat_id}', NOTIFY_COALESCE_WINDOW))
@@ -0,0 +1,55 @@
+import hashlib
+import json
+
+ETAG_FORMAT_VERSION = 'v1'
+
+
+def header(event: dict, name: str) -> str:
+    '''Заголовок запроса без учёта регистра'''
+    name = name.lower()
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name:
+            return value or ''
+    return ''
+
+
+def data_version(cur, scope: str) -> int:
+    '''Счётчик версии данных, который триггеры увеличивают при каждой записи (сумма по шардам)'''
+    cur.execute("SELECT COALESCE(SUM(version), 0)::bigint AS version FROM data_versions WHERE scope = %s", (scope,))
+    return cur.fetchone()['version']
+
+
+def make_etag(scope: str, version: int, params: dict = None) -> str:
+    variant = hashlib.md5(json.dumps(params or {}, sort_keys=True).encode()).hexdigest()[:8]
+    return f'W/"{ETAG_FORMAT_VERSION}-{scope}-{version}-{variant}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or etag in tags or etag[2:] in tags
+
+
+def not_modified(etag: str) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'ETag': etag,
+            'Cache-Control': 'no-cache',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag'
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+
+def cache_headers(etag: str) -> dict:
+    return {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
@@ -1,8 +1,11 @@
 import json
 import os
 from datetime import datetime
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection
+from sessions import lookup_session
+from pagination import CURSOR_SQL, SYNC_CURSOR_SQL, InvalidCursor, decode_cursor, decode_sync_cursor, parse_limit
+from etag import header, data_version, make_etag, etag_matches, not_modified, cache_headers
 
 def handler(event: dict, context) -> dict:
     '''API для управления заявками на русификацию
@@ -10,8 +13,10 @@ def handler(event: dict, context) -> dict:
     Endpoints:
     - GET /requests - получить все заявки, работы и историю бонусов пользователя
     - GET /requests/:id/messages - получить сообщения по заявке
+    - GET /requests/:id/messages?after_id=N&wait=20 - дождаться новых сообщений (long-poll)
     - POST /requests - создать новую заявку
-    - POST /requests/:id/messages - отправить сообщение в чат
+    - POST /requests/:id/messages - отправить сообщение в чат (файл — base64 или upload_id)
+    - POST ?action=upload_url / confirm_upload - presigned PUT URL для файла и проверка загрузки
     '''
     
     method = event.get('httpMethod', 'GET')
@@ -24,7 +29,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+                'Access-Control-Allow-Headers': 'Content-Type, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -52,15 +57,10 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(dsn)
+        conn = get_connection(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        cur.execute("""
-            SELECT user_id FROM user_sessions
-            WHERE session_token = %s AND expires_at > NOW()
-        """, (token,))
-        
-        session = cur.fetchone()
+        session = lookup_session(cur, token)
         
         if not session:
             return {
@@ -77,9 +77,15 @@ def handler(event: dict, context) -> dict:
         
         if method == 'GET' and action == 'messages' and request_id:
             from messages import handle_get_messages
-            return handle_get_messages(cur, int(request_id), user_id)
+            return handle_get_messages(cur, conn, int(request_id), user_id, query_params)
         elif method == 'GET':
-            return handle_get_requests(cur, user_id)
+            return handle_get_requests(cur, user_id, query_params, header(event, 'If-None-Match'))
+        elif method == 'POST' and action in ('upload_url', 'confirm_upload'):
+            from uploads import handle_upload_url, handle_confirm_upload
+            body = json.loads(event.get('body', '{}'))
+            if action == 'upload_url':
+                return handle_upload_url(cur, conn, user_id, body, 'requests')
+            return handle_confirm_upload(cur, conn, user_id, body)
         elif method == 'POST' and action == 'send_message' and request_id:
             from messages import handle_send_message
             body = json.loads(event.get('body', '{}'))
@@ -106,67 +112,175 @@ def handler(event: dict, context) -> dict:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            release_connection(conn)
 
 
-def handle_get_requests(cur, user_id: int) -> dict:
-    cur.execute("""
-        SELECT 
-            id, client_name, client_phone, client_email,
-            car_brand, car_model, car_year, service_type,
-            description, status, created_at, updated_at
-        FROM russification_requests
-        WHERE user_id = %s
-        ORDER BY created_at DESC
-    """, (user_id,))
-    
-    requests = [dict(row) for row in cur.fetchall()]
-    
-    for req in requests:
-        if req['created_at']:
-            req['created_at'] = req['created_at'].isoformat()
-        if req['updated_at']:
-            req['updated_at'] = req['updated_at'].isoformat()
+def handle_get_requests(cur, user_id: int, query_params: dict, if_none_match: str = '') -> dict:
+    '''Заявки, работы и история бонусов партнёра одним запросом.
     
-    cur.execute("""
-        SELECT 
-            id, request_id, work_cost, bonus_earned, work_date, notes
-        FROM completed_works
-        WHERE user_id = %s
-        ORDER BY work_date DESC
-    """, (user_id,))
+    С параметрами limit / requests_cursor / works_cursor заявки и работы отдаются
+    страницами по ключу (created_at, id) и (work_date, id); без них — целиком.
+    Документ целиком собирается в Postgres и передаётся клиенту как есть.
+    ETag строится по счётчику data_versions партнёра: совпал — 304 без выборки.
+    С параметром since отдаются только изменения после курсора синхронизации.
+    '''
+    scope = f'user:{user_id}'
+    etag_params = {k: query_params.get(k) for k in ('limit', 'requests_cursor', 'works_cursor', 'since')}
     
-    works = [dict(row) for row in cur.fetchall()]
+    if if_none_match:
+        etag = make_etag(scope, data_version(cur, scope), etag_params)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
     
-    for work in works:
-        if work['work_date']:
-            work['work_date'] = work['work_date'].isoformat()
-        work['work_cost'] = float(work['work_cost'])
+    paginate = any(query_params.get(k) for k in ('limit', 'requests_cursor', 'works_cursor'))
     
-    cur.execute("""
-        SELECT 
-            id, amount, transaction_type, description, created_at
-        FROM bonus_transactions
-        WHERE user_id = %s
-        ORDER BY created_at DESC
-        LIMIT 50
-    """, (user_id,))
+    try:
+        since = decode_sync_cursor(query_params['since']) if query_params.get('since') else None
+        requests_after = decode_cursor(query_params['requests_cursor']) if query_params.get('requests_cursor') else None
+        works_after = decode_cursor(query_params['works_cursor']) if query_params.get('works_cursor') else None
+    except InvalidCursor:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': False, 'message': 'Invalid cursor'}),
+            'isBase64Encoded': False
+        }
+    
+    if since:
+        return handle_sync_requests(cur, user_id, since, etag_params)
+    
+    params = {'user_id': user_id, 'scope': scope, 'limit': parse_limit(query_params.get('limit'))}
+    requests_filter = ''
+    works_filter = ''
+    fetch_limit = ''
+    page_limit = ''
+    cursor_fields = ''
     
-    bonus_history = [dict(row) for row in cur.fetchall()]
+    if requests_after:
+        requests_filter = 'AND (created_at, id) < (%(requests_ts)s, %(requests_id)s)'
+        params['requests_ts'], params['requests_id'] = requests_after
+    if works_after:
+        works_filter = 'AND (work_date, id) < (%(works_ts)s, %(works_id)s)'
+        params['works_ts'], params['works_id'] = works_after
+    if paginate:
+        fetch_limit = 'LIMIT %(limit)s + 1'
+        page_limit = 'LIMIT %(limit)s'
+        cursor_fields = f""",
+            'requestsCursor', CASE WHEN (SELECT COUNT(*) FROM req) > (SELECT COUNT(*) FROM req_page) THEN (
+                SELECT {CURSOR_SQL.format(sort='created_at', id='id')} FROM req_page ORDER BY created_at, id LIMIT 1
+            ) END,
+            'worksCursor', CASE WHEN (SELECT COUNT(*) FROM wrk) > (SELECT COUNT(*) FROM wrk_page) THEN (
+                SELECT {CURSOR_SQL.format(sort='work_date', id='id')} FROM wrk_page ORDER BY work_date, id LIMIT 1
+            ) END"""
     
-    for bonus in bonus_history:
-        if bonus['created_at']:
-            bonus['created_at'] = bonus['created_at'].isoformat()
+    cur.execute(f"""
+        WITH req AS (
+            SELECT 
+                id, client_name, client_phone, client_email,
+                car_brand, car_model, car_year, service_type,
+                description, status, created_at, updated_at,
+                COALESCE((SELECT unread_company_count FROM request_unread_counts WHERE request_id = russification_requests.id), 0) AS unread_count
+            FROM russification_requests
+            WHERE user_id = %(user_id)s {requests_filter}
+            ORDER BY created_at DESC, id DESC
+            {fetch_limit}
+        ),
+        req_page AS (
+            SELECT * FROM req ORDER BY created_at DESC, id DESC {page_limit}
+        ),
+        wrk AS (
+            SELECT 
+                id, request_id, work_cost::float8 AS work_cost, bonus_earned, work_date, notes
+            FROM completed_works
+            WHERE user_id = %(user_id)s {works_filter}
+            ORDER BY work_date DESC, id DESC
+            {fetch_limit}
+        ),
+        wrk_page AS (
+            SELECT * FROM wrk ORDER BY work_date DESC, id DESC {page_limit}
+        ),
+        bonus AS (
+            SELECT 
+                id, amount, transaction_type, description, created_at
+            FROM bonus_transactions
+            WHERE user_id = %(user_id)s
+            ORDER BY created_at DESC
+            LIMIT 50
+        )
+        SELECT json_build_object(
+            'success', TRUE,
+            'requests', COALESCE((SELECT json_agg(r ORDER BY r.created_at DESC, r.id DESC) FROM req_page r), '[]'),
+            'works', COALESCE((SELECT json_agg(w ORDER BY w.work_date DESC, w.id DESC) FROM wrk_page w), '[]'),
+            'bonusHistory', COALESCE((SELECT json_agg(b ORDER BY b.created_at DESC) FROM bonus b), '[]'),
+            'syncCursor', {SYNC_CURSOR_SQL}{cursor_fields}
+        )::text AS document,
+        COALESCE((SELECT SUM(version) FROM data_versions WHERE scope = %(scope)s), 0)::bigint AS version
+    """, params)
+    
+    row = cur.fetchone()
     
     return {
         'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'body': json.dumps({
-            'success': True,
-            'requests': requests,
-            'works': works,
-            'bonusHistory': bonus_history
-        }),
+        'headers': cache_headers(make_etag(scope, row['version'], etag_params)),
+        'body': row['document'],
+        'isBase64Encoded': False
+    }
+
+
+def handle_sync_requests(cur, user_id: int, since, etag_params: dict) -> dict:
+    '''Изменения кабинета партнёра после курсора: новые и изменённые строки плюс id удалённых'''
+    scope = f'user:{user_id}'
+    
+    cur.execute(f"""
+        WITH req AS (
+            SELECT 
+                id, client_name, client_phone, client_email,
+                car_brand, car_model, car_year, service_type,
+                description, status, created_at, updated_at,
+                COALESCE((SELECT unread_company_count FROM request_unread_counts WHERE request_id = russification_requests.id), 0) AS unread_count
+            FROM russification_requests
+            WHERE user_id = %(user_id)s
+              AND (updated_at > %(since)s
+                   OR id IN (SELECT request_id FROM request_unread_counts WHERE updated_at > %(since)s))
+        ),
+        wrk AS (
+            SELECT 
+                id, request_id, work_cost::float8 AS work_cost, bonus_earned, work_date, notes, updated_at
+            FROM completed_works
+            WHERE user_id = %(user_id)s AND updated_at > %(since)s
+        ),
+        bonus AS (
+            SELECT 
+                id, amount, transaction_type, description, created_at
+            FROM bonus_transactions
+            WHERE user_id = %(user_id)s AND created_at > %(since)s
+        ),
+        gone AS (
+            SELECT table_name, record_id
+            FROM sync_tombstones
+            WHERE owner_user_id = %(user_id)s AND deleted_at > %(since)s
+        )
+        SELECT json_build_object(
+            'success', TRUE,
+            'requests', COALESCE((SELECT json_agg(r ORDER BY r.updated_at, r.id) FROM req r), '[]'),
+            'works', COALESCE((SELECT json_agg(w ORDER BY w.updated_at, w.id) FROM wrk w), '[]'),
+            'bonusHistory', COALESCE((SELECT json_agg(b ORDER BY b.created_at, b.id) FROM bonus b), '[]'),
+            'deleted', json_build_object(
+                'requests', COALESCE((SELECT json_agg(record_id) FROM gone WHERE table_name = 'russification_requests'), '[]'),
+                'works', COALESCE((SELECT json_agg(record_id) FROM gone WHERE table_name = 'completed_works'), '[]'),
+                'bonusHistory', COALESCE((SELECT json_agg(record_id) FROM gone WHERE table_name = 'bonus_transactions'), '[]')
+            ),
+            'syncCursor', {SYNC_CURSOR_SQL}
+        )::text AS document,
+        COALESCE((SELECT SUM(version) FROM data_versions WHERE scope = %(scope)s), 0)::bigint AS version
+    """, {'user_id': user_id, 'since': since, 'scope': scope})
+    
+    row = cur.fetchone()
+    
+    return {
+        'statusCode': 200,
+        'headers': cache_headers(make_etag(scope, row['version'], etag_params)),
+        'body': row['document'],
         'isBase64Encoded': False
     }
 
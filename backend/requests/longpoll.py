@@ -0,0 +1,56 @@
+import os
+import select
+import time
+
+LONG_POLL_TIMEOUT = float(os.environ.get('LONG_POLL_TIMEOUT', '20'))
+
+
+def message_channel(request_id: int) -> str:
+    '''Канал LISTEN/NOTIFY, в который триггер V0024 пишет id новых сообщений заявки'''
+    return f'request_messages_{int(request_id)}'
+
+
+def parse_wait(value) -> float:
+    '''Сколько секунд держать запрос: не больше LONG_POLL_TIMEOUT (запас до таймаута функции)'''
+    try:
+        wait = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return max(0.0, min(wait, LONG_POLL_TIMEOUT))
+
+
+def wait_for_messages(cur, conn, request_id: int, after_id: int, timeout: float) -> bool:
+    '''Ждать сообщение заявки с id > after_id не дольше timeout секунд.
+    
+    LISTEN выполняется до проверки таблицы, поэтому сообщение, вставленное между
+    проверкой и ожиданием, не теряется. Возвращает True, если новые сообщения есть.
+    '''
+    channel = message_channel(request_id)
+    conn.commit()
+    conn.autocommit = True
+    try:
+        cur.execute(f'LISTEN {channel}')
+        cur.execute(
+            "SELECT EXISTS (SELECT 1 FROM request_messages WHERE request_id = %s AND id > %s) AS found",
+            (request_id, after_id)
+        )
+        if cur.fetchone()['found']:
+            return True
+        
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if select.select([conn], [], [], remaining) == ([], [], []):
+                return False
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                if notify.channel == channel and int(notify.payload) > after_id:
+                    conn.notifies.clear()
+                    return True
+    finally:
+        cur.execute(f'UNLISTEN {channel}')
+        conn.notifies.clear()
+        conn.autocommit = False
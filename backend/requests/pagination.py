@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+SYNC_OVERLAP = timedelta(seconds=10)
+
+# Тот же формат, что у encode_cursor, но собранный в SQL: base64url от [дата, id] без '='
+CURSOR_SQL = "rtrim(translate(encode(convert_to(json_build_array({sort}, {id})::text, 'UTF8'), 'base64'), E'+/\\n', '-_'), '=')"
+SYNC_CURSOR_SQL = CURSOR_SQL.format(sort='LOCALTIMESTAMP', id=0)
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(sort_value, row_id: int) -> str:
+    '''Непрозрачный курсор из ключа сортировки (дата, id) последней строки страницы'''
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise InvalidCursor(cursor)
+
+
+def parse_limit(value) -> int:
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return PAGE_SIZE_DEFAULT
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def decode_sync_cursor(cursor: str) -> datetime:
+    '''Момент, с которого отдавать изменения: время курсора минус запас на ещё не закоммиченные транзакции'''
+    changed_at, _ = decode_cursor(cursor)
+    return changed_at - SYNC_OVERLAP
@@ -0,0 +1,240 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', '1024'))
+SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', '60'))
+SESSION_SIGNING_SECRET = os.environ.get('SESSION_SIGNING_SECRET', '')
+SESSION_LIFETIME = timedelta(days=30)
+REVOCATION_REFRESH_INTERVAL = float(os.environ.get('REVOCATION_REFRESH_INTERVAL', '30'))
+REVOCATION_OVERLAP = timedelta(seconds=10)
+
+SIGNED_TOKEN_PREFIX = 'st1.'
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+_revoked_sessions = {}
+_revoked_users = {}
+_revocations = {'synced_at': 0.0, 'last_created_at': None}
+
+
+def opaque_session_id(token: str) -> str:
+    '''Идентификатор непрозрачного токена в session_revocations: сам токен в таблицу отзыва не пишется'''
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_cached_session(cur, token: str):
+    '''Сессия из кэша тёплого контейнера: dict(user_id, user_role, expires_at) или None.
+
+    Запись отбрасывается, если после её проверки в user_sessions токен или все сессии
+    пользователя отозваны в session_revocations (выход в другом контейнере, сброс пароля).
+    '''
+    with _lock:
+        entry = _cache.get(token)
+    if entry is None:
+        return None
+    session, cached_until, verified_at = entry
+    if time.monotonic() > cached_until or session['expires_at'] <= datetime.now():
+        invalidate_token(token)
+        return None
+
+    refresh_revocations(cur)
+    with _lock:
+        revoked_token = opaque_session_id(token) in _revoked_sessions
+        revoked_user = _revoked_users.get(session['user_id'])
+    # Запас на расхождение часов контейнера и БД: сессия, проверенная около момента отзыва, проверяется заново
+    if revoked_token or (revoked_user and verified_at <= revoked_user[0] + REVOCATION_OVERLAP.total_seconds()):
+        invalidate_token(token)
+        return None
+
+    with _lock:
+        if token in _cache:
+            _cache.move_to_end(token)
+    return session
+
+
+def cache_session(token: str, user_id: int, user_role: str, expires_at: datetime):
+    session = {'user_id': user_id, 'user_role': user_role, 'expires_at': expires_at}
+    with _lock:
+        _cache[token] = (session, time.monotonic() + SESSION_CACHE_TTL, time.time())
+        _cache.move_to_end(token)
+        while len(_cache) > SESSION_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return session
+
+
+def invalidate_token(token: str):
+    '''Сбросить сессию из кэша (выход из аккаунта)'''
+    with _lock:
+        _cache.pop(token, None)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(SESSION_SIGNING_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def signed_tokens_enabled() -> bool:
+    return bool(SESSION_SIGNING_SECRET)
+
+
+def issue_signed_token(user_id: int, user_role: str) -> str:
+    '''Подписанный токен: user_id, роль и срок действия проверяются без обращения к БД.
+
+    iat — Unix time с долями секунды: иначе токен, выданный в ту же секунду сразу после
+    смены пароля, попадал бы под revoked_before.
+    '''
+    now = time.time()
+    claims = {
+        'uid': user_id,
+        'role': user_role,
+        'iat': now,
+        'exp': int(now) + int(SESSION_LIFETIME.total_seconds()),
+        'jti': secrets.token_hex(8)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f'{SIGNED_TOKEN_PREFIX}{payload}.{_sign(payload)}'
+
+
+def decode_signed_token(token: str):
+    '''Проверить подпись и срок действия, вернуть claims или None'''
+    if not signed_tokens_enabled() or not token.startswith(SIGNED_TOKEN_PREFIX):
+        return None
+    try:
+        payload, signature = token[len(SIGNED_TOKEN_PREFIX):].split('.')
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except Exception:
+        return None
+    if claims.get('exp', 0) <= time.time():
+        return None
+    return claims
+
+
+def refresh_revocations(cur, force: bool = False):
+    '''Подтянуть новые записи session_revocations (не чаще раза в REVOCATION_REFRESH_INTERVAL)'''
+    if not force and time.monotonic() - _revocations['synced_at'] < REVOCATION_REFRESH_INTERVAL:
+        return
+
+    since = _revocations['last_created_at']
+    # revoked_before записан как NOW() в часовом поясе сессии БД; epoch сравнивается с iat без учёта пояса контейнера
+    if since is None:
+        cur.execute("""
+            SELECT session_id, user_id, expires_at, created_at,
+                   EXTRACT(EPOCH FROM revoked_before::timestamptz)::float8 AS revoked_before
+            FROM session_revocations
+            WHERE expires_at > NOW()
+        """)
+    else:
+        cur.execute("""
+            SELECT session_id, user_id, expires_at, created_at,
+                   EXTRACT(EPOCH FROM revoked_before::timestamptz)::float8 AS revoked_before
+            FROM session_revocations
+            WHERE created_at > %s AND expires_at > NOW()
+        """, (since - REVOCATION_OVERLAP,))
+
+    rows = cur.fetchall()
+    now = datetime.now()
+    with _lock:
+        for row in rows:
+            if row['session_id']:
+                _revoked_sessions[row['session_id']] = row['expires_at']
+            if row['user_id'] and row['revoked_before']:
+                current = _revoked_users.get(row['user_id'])
+                if current is None or row['revoked_before'] > current[0]:
+                    _revoked_users[row['user_id']] = (row['revoked_before'], row['expires_at'])
+            if since is None or row['created_at'] > since:
+                since = row['created_at']
+        for jti in [j for j, exp in _revoked_sessions.items() if exp <= now]:
+            del _revoked_sessions[jti]
+        for uid in [u for u, (_, exp) in _revoked_users.items() if exp <= now]:
+            del _revoked_users[uid]
+        _revocations['last_created_at'] = since or datetime(1970, 1, 1)
+        _revocations['synced_at'] = time.monotonic()
+
+
+def is_revoked(claims: dict) -> bool:
+    with _lock:
+        if claims['jti'] in _revoked_sessions:
+            return True
+        revoked = _revoked_users.get(claims['uid'])
+    return bool(revoked) and claims['iat'] <= revoked[0]
+
+
+def revoke_signed_token(cur, claims: dict):
+    '''Отозвать подписанный токен (выход из аккаунта)'''
+    expires_at = datetime.fromtimestamp(claims['exp'])
+    cur.execute("""
+        INSERT INTO session_revocations (session_id, user_id, expires_at)
+        VALUES (%s, %s, %s)
+    """, (claims['jti'], claims['uid'], expires_at))
+    with _lock:
+        _revoked_sessions[claims['jti']] = expires_at
+
+
+def revoke_opaque_token(cur, token: str):
+    '''Удалить непрозрачную сессию и записать отзыв: кэши других контейнеров увидят его при refresh_revocations'''
+    cur.execute("DELETE FROM user_sessions WHERE session_token = %s RETURNING user_id, expires_at", (token,))
+    row = cur.fetchone()
+    if not row:
+        return
+    session_id = opaque_session_id(token)
+    cur.execute("""
+        INSERT INTO session_revocations (session_id, user_id, expires_at)
+        VALUES (%s, %s, %s)
+    """, (session_id, row['user_id'], row['expires_at']))
+    with _lock:
+        _revoked_sessions[session_id] = row['expires_at']
+
+
+def lookup_session(cur, token: str):
+    '''Проверить токен: подписанный — по подписи и списку отзыва, непрозрачный — кэш, затем user_sessions'''
+    if not token:
+        return None
+
+    if token.startswith(SIGNED_TOKEN_PREFIX):
+        claims = decode_signed_token(token)
+        if not claims:
+            return None
+        refresh_revocations(cur)
+        if is_revoked(claims):
+            return None
+        return {
+            'user_id': claims['uid'],
+            'user_role': claims['role'],
+            'expires_at': datetime.fromtimestamp(claims['exp'])
+        }
+
+    session = get_cached_session(cur, token)
+    if session:
+        return session
+
+    cur.execute("""
+        SELECT s.user_id, u.user_role, s.expires_at
+        FROM user_sessions s
+        JOIN users u ON s.user_id = u.id
+        WHERE s.session_token = %s AND s.expires_at > NOW()
+    """, (token,))
+
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    return cache_session(token, row['user_id'], row['user_role'], row['expires_at'])
@@ -0,0 +1,209 @@
+import json
+import os
+import random
+import re
+import uuid
+from datetime import datetime
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+UPLOAD_BUCKET = 'files'
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', str(50 * 1024 * 1024)))
+UPLOAD_URL_TTL = int(os.environ.get('UPLOAD_URL_TTL', '900'))
+# Неподтверждённые загрузки старше этого срока удаляются вместе с объектом; срок больше UPLOAD_URL_TTL
+UPLOAD_PENDING_TTL = int(os.environ.get('UPLOAD_PENDING_TTL', '3600'))
+UPLOAD_PURGE_BATCH = 100
+UPLOAD_PURGE_PROBABILITY = 0.05
+
+_s3 = None
+
+
+class UploadError(Exception):
+    pass
+
+
+def s3_client():
+    '''Клиент S3 на всё время жизни тёплого контейнера'''
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client('s3',
+            endpoint_url='https://bucket.poehali.dev',
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY'],
+            # SigV4: заголовки из Params, включая Content-Length, входят в подпись presigned URL
+            config=Config(signature_version='s3v4')
+        )
+    return _s3
+
+
+def cdn_url(key: str) -> str:
+    return f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{key}"
+
+
+def upload_info(row: dict) -> dict:
+    return {
+        'upload_id': row['id'],
+        'file_url': cdn_url(row['object_key']),
+        'file_name': row['file_name'],
+        'file_type': row['content_type'],
+        'size': row['size']
+    }
+
+
+def create_upload(cur, conn, user_id: int, prefix: str, file_name: str, content_type: str, size) -> dict:
+    '''Выдать presigned PUT URL: файл идёт из браузера прямо в S3, минуя функцию.
+
+    Content-Length входит в подпись: S3 примет объект только заявленного размера.
+    '''
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('Не указан размер файла')
+    if size <= 0 or size > UPLOAD_MAX_SIZE:
+        raise UploadError(f'Файл слишком большой (максимум {UPLOAD_MAX_SIZE // (1024 * 1024)} МБ)')
+    
+    content_type = content_type or 'application/octet-stream'
+    safe_name = re.sub(r'[^a-zA-Z0-9._-]', '_', file_name or 'file')
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    key = f'{prefix}/{timestamp}_{uuid.uuid4().hex[:8]}_{safe_name}'
+    
+    upload_url = s3_client().generate_presigned_url(
+        'put_object',
+        Params={'Bucket': UPLOAD_BUCKET, 'Key': key, 'ContentType': content_type, 'ContentLength': size},
+        ExpiresIn=UPLOAD_URL_TTL
+    )
+    
+    cur.execute("""
+        INSERT INTO file_uploads (user_id, object_key, file_name, content_type, declared_size)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id
+    """, (user_id, key, file_name, content_type, size))
+    upload_id = cur.fetchone()['id']
+    conn.commit()
+    
+    if random.random() < UPLOAD_PURGE_PROBABILITY:
+        try:
+            purge_stale_uploads(cur, conn)
+        except Exception as e:
+            conn.rollback()
+            print(f"Stale uploads purge failed: {e}")
+    
+    return {
+        'upload_id': upload_id,
+        'upload_url': upload_url,
+        'method': 'PUT',
+        'headers': {'Content-Type': content_type},
+        'expires_in': UPLOAD_URL_TTL
+    }
+
+
+def purge_stale_uploads(cur, conn) -> int:
+    '''Удалить загрузки, не подтверждённые за UPLOAD_PENDING_TTL, и их объекты в S3'''
+    cur.execute("""
+        DELETE FROM file_uploads
+        WHERE id IN (
+            SELECT id FROM file_uploads
+            WHERE status = 'pending' AND created_at < NOW() - make_interval(secs => %s)
+            ORDER BY created_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING object_key
+    """, (UPLOAD_PENDING_TTL, UPLOAD_PURGE_BATCH))
+    keys = [row['object_key'] for row in cur.fetchall()]
+    if keys:
+        # Строки удаляются только вместе с объектами: если S3 недоступен, транзакция откатится
+        s3_client().delete_objects(
+            Bucket=UPLOAD_BUCKET,
+            Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+        )
+    conn.commit()
+    return len(keys)
+
+
+def confirm_upload(cur, conn, user_id: int, upload_id) -> dict:
+    '''Проверить загруженный объект через HEAD и записать его фактический размер и тип'''
+    cur.execute(
+        "SELECT * FROM file_uploads WHERE id = %s AND user_id = %s",
+        (upload_id, user_id)
+    )
+    row = cur.fetchone()
+    if not row:
+        raise UploadError('Загрузка не найдена')
+    if row['status'] == 'uploaded':
+        return upload_info(row)
+    if row['status'] == 'rejected':
+        raise UploadError('Файл отклонён')
+    
+    try:
+        head = s3_client().head_object(Bucket=UPLOAD_BUCKET, Key=row['object_key'])
+    except ClientError:
+        raise UploadError('Файл ещё не загружен в хранилище')
+    
+    if head['ContentLength'] > UPLOAD_MAX_SIZE:
+        s3_client().delete_object(Bucket=UPLOAD_BUCKET, Key=row['object_key'])
+        cur.execute("UPDATE file_uploads SET status = 'rejected' WHERE id = %s", (row['id'],))
+        conn.commit()
+        raise UploadError(f'Файл слишком большой (максимум {UPLOAD_MAX_SIZE // (1024 * 1024)} МБ)')
+    
+    cur.execute("""
+        UPDATE file_uploads
+        SET status = 'uploaded', size = %s, content_type = %s, confirmed_at = NOW()
+        WHERE id = %s
+        RETURNING *
+    """, (head['ContentLength'], head.get('ContentType') or row['content_type'], row['id']))
+    row = cur.fetchone()
+    conn.commit()
+    
+    return upload_info(row)
+
+
+def get_confirmed_upload(cur, user_id: int, upload_id):
+    '''Подтверждённая загрузка пользователя для вложения в сообщение или карточку каталога'''
+    cur.execute(
+        "SELECT * FROM file_uploads WHERE id = %s AND user_id = %s AND status = 'uploaded'",
+        (upload_id, user_id)
+    )
+    row = cur.fetchone()
+    return upload_info(row) if row else None
+
+
+def upload_error(message: str) -> dict:
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': False, 'message': message}),
+        'isBase64Encoded': False
+    }
+
+
+def handle_upload_url(cur, conn, user_id: int, data: dict, prefix: str) -> dict:
+    '''POST action=upload_url: {file_name, content_type, size} -> {upload_id, upload_url, headers}'''
+    try:
+        upload = create_upload(cur, conn, user_id, prefix, data.get('file_name'), data.get('content_type'), data.get('size'))
+    except UploadError as e:
+        return upload_error(str(e))
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, **upload}),
+        'isBase64Encoded': False
+    }
+
+
+def handle_confirm_upload(cur, conn, user_id: int, data: dict) -> dict:
+    '''POST action=confirm_upload: {upload_id} -> {file_url, file_name, file_type, size}'''
+    try:
+        upload = confirm_upload(cur, conn, user_id, data.get('upload_id'))
+    except UploadError as e:
+        return upload_error(str(e))
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'success': True, **upload}),
+        'isBase64Encoded': False
+    }
@@ -1,7 +1,6 @@
 import json
 import os
-import urllib.request
-import urllib.parse
+import telegram_api
 
 def handler(event: dict, context) -> dict:
     '''Отправка уведомлений о заявках в Telegram
@@ -71,42 +70,28 @@ def handler(event: dict, context) -> dict:
 🚗 <b>Автомобиль:</b> {car}
 💬 <b>Сообщение:</b> {message_text}"""
         
-        url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-        data = {
-            'chat_id': chat_id,
-            'text': telegram_message,
-            'parse_mode': 'HTML'
-        }
-        
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
+        try:
+            telegram_api.send_message(chat_id, telegram_message, parse_mode='HTML', token=bot_token)
+        except telegram_api.TelegramError:
+            return {
+                'statusCode': 500,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Failed to send telegram message'}),
+                'isBase64Encoded': False
+            }
         
-        with urllib.request.urlopen(req) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            
-            if result.get('ok'):
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'success': True, 'message': 'Заявка отправлена'}),
-                    'isBase64Encoded': False
-                }
-            else:
-                return {
-                    'statusCode': 500,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Failed to send telegram message'}),
-                    'isBase64Encoded': False
-                }
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'success': True, 'message': 'Заявка отправлена'}),
+            'isBase64Encoded': False
+        }
                 
     except Exception as e:
         return {
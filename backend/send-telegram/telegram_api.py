@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+TELEGRAM_API_URL = 'https://api.telegram.org'
+TELEGRAM_TIMEOUT = float(os.environ.get('TELEGRAM_TIMEOUT', '10'))
+TELEGRAM_MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', '2'))
+TELEGRAM_MAX_RETRY_AFTER = float(os.environ.get('TELEGRAM_MAX_RETRY_AFTER', '5'))
+TELEGRAM_POOL_SIZE = int(os.environ.get('TELEGRAM_POOL_SIZE', '4'))
+RETRY_BASE_DELAY = 0.5
+# Повтор после обрыва или таймаута отправки может продублировать сообщение у получателя
+NON_IDEMPOTENT_PREFIXES = ('send', 'forward', 'copy')
+
+_session = None
+_lock = threading.Lock()
+_metrics = {}
+
+
+class TelegramError(Exception):
+    def __init__(self, method: str, status, description: str, retry_after=None, maybe_delivered: bool = False):
+        super().__init__(f'{method}: {status} {description}')
+        self.method = method
+        self.status = status
+        self.description = description
+        self.retry_after = retry_after
+        self.maybe_delivered = maybe_delivered
+
+    @property
+    def retryable(self) -> bool:
+        '''429 или 5xx — есть смысл повторить позже. Сетевая ошибка — только если запрос
+        точно не дошёл до Telegram или метод можно безопасно вызвать повторно'''
+        if self.status is None:
+            return not self.maybe_delivered or not self.method.startswith(NON_IDEMPOTENT_PREFIXES)
+        return self.status == 429 or self.status >= 500
+
+
+def _maybe_delivered(e: requests.RequestException) -> bool:
+    '''False — соединение не было установлено, запрос не отправлялся'''
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return False
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        return not isinstance(getattr(e.args[0], 'reason', None), NewConnectionError)
+    return True
+
+
+def get_session() -> requests.Session:
+    '''Одна keep-alive сессия на тёплый контейнер: TLS-соединение с api.telegram.org переиспользуется'''
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=TELEGRAM_POOL_SIZE))
+            _session = session
+        return _session
+
+
+def _record(method: str, elapsed: float, error: bool = False, retry: bool = False):
+    with _lock:
+        stats = _metrics.setdefault(method, {'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['errors'] += int(error)
+        stats['retries'] += int(retry)
+        stats['total_ms'] += elapsed * 1000
+        stats['max_ms'] = max(stats['max_ms'], elapsed * 1000)
+
+
+def get_metrics() -> dict:
+    '''Число вызовов, ошибок, повторов и задержка по методам Bot API с момента старта контейнера'''
+    with _lock:
+        return {
+            method: {**stats, 'avg_ms': round(stats['total_ms'] / stats['calls'], 1) if stats['calls'] else 0.0}
+            for method, stats in _metrics.items()
+        }
+
+
+def call(method: str, payload: dict = None, token: str = None, timeout: float = None, retries: int = None):
+    '''Вызвать метод Bot API и вернуть result.
+
+    429 повторяется после retry_after, если он не длиннее TELEGRAM_MAX_RETRY_AFTER,
+    5xx и сетевые ошибки — с экспоненциальной задержкой. Для sendMessage и других
+    отправок сетевая ошибка повторяется, только если соединение не установилось:
+    после таймаута ответа сообщение могло уже дойти. retries=0 — без повторов
+    (для вызывающих со своей очередью повторов). Иначе поднимает TelegramError.
+    '''
+    token = token or os.environ.get('TELEGRAM_BOT_TOKEN')
+    timeout = TELEGRAM_TIMEOUT if timeout is None else timeout
+    retries = TELEGRAM_MAX_RETRIES if retries is None else retries
+    url = f'{TELEGRAM_API_URL}/bot{token}/{method}'
+
+    attempt = 0
+    while True:
+        started = time.monotonic()
+        try:
+            response = get_session().post(url, json=payload or {}, timeout=timeout)
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            if response.ok and data.get('ok'):
+                _record(method, time.monotonic() - started, retry=attempt > 0)
+                return data.get('result')
+            error = TelegramError(
+                method,
+                response.status_code,
+                data.get('description', response.reason),
+                (data.get('parameters') or {}).get('retry_after')
+            )
+        except requests.RequestException as e:
+            error = TelegramError(method, None, str(e), maybe_delivered=_maybe_delivered(e))
+
+        _record(method, time.monotonic() - started, error=True, retry=attempt > 0)
+
+        if not error.retryable or attempt >= retries:
+            raise error
+        if error.retry_after is not None:
+            if error.retry_after > TELEGRAM_MAX_RETRY_AFTER:
+                raise error
+            delay = error.retry_after
+        else:
+            delay = RETRY_BASE_DELAY * 2 ** attempt
+        time.sleep(delay)
+        attempt += 1
+
+
+def send_message(chat_id, text: str, keyboard=None, parse_mode: str = None, **kwargs):
+    payload = {'chat_id': chat_id, 'text': text}
+    if parse_mode:
+        payload['parse_mode'] = parse_mode
+    if keyboard:
+        payload['reply_markup'] = keyboard
+    return call('sendMessage', payload, **kwargs)
@@ -0,0 +1,48 @@
+import os
+import threading
+from contextlib import contextmanager
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from db import pooled_connection
+
+_scope = threading.local()
+
+
+@contextmanager
+def update_connection():
+    '''Одно соединение из пула на весь апдейт: get_db() внутри блока отдаёт его же.
+
+    Вложенный вызов переиспользует уже открытое соединение. Область привязана к
+    потоку, поэтому воркеры polling.py не делят соединения между собой.
+    '''
+    if getattr(_scope, 'conn', None) is not None:
+        yield _scope.conn
+        return
+
+    with pooled_connection(os.environ.get('DATABASE_URL')) as conn:
+        _scope.conn = conn
+        try:
+            yield conn
+        finally:
+            _scope.conn = None
+
+
+@contextmanager
+def get_db():
+    '''Соединение апдейта, если оно открыто, иначе отдельное из пула.
+
+    Блок ведёт себя как раньше с собственным соединением: незакоммиченная транзакция
+    на выходе откатывается, как при возврате в пул, — соединение не висит idle in
+    transaction на время вызовов Telegram API.
+    '''
+    conn = getattr(_scope, 'conn', None)
+    if conn is None:
+        with pooled_connection(os.environ.get('DATABASE_URL')) as conn:
+            yield conn
+        return
+
+    try:
+        yield conn
+    finally:
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
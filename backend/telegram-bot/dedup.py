@@ -0,0 +1,59 @@
+import os
+import random
+import threading
+from collections import deque
+from db import pooled_connection
+
+# Telegram хранит недоставленные апдейты до суток — дольше помнить update_id незачем
+UPDATE_DEDUP_TTL = int(os.environ.get('UPDATE_DEDUP_TTL', '86400'))
+UPDATE_DEDUP_MEMORY = int(os.environ.get('UPDATE_DEDUP_MEMORY', '2048'))
+UPDATE_DEDUP_PURGE_PROBABILITY = 0.01
+
+_recent = deque()
+_recent_set = set()
+_lock = threading.Lock()
+
+
+def _remember(update_id: int):
+    with _lock:
+        if update_id in _recent_set:
+            return
+        _recent.append(update_id)
+        _recent_set.add(update_id)
+        while len(_recent) > UPDATE_DEDUP_MEMORY:
+            _recent_set.discard(_recent.popleft())
+
+
+def claim_update(update_id) -> bool:
+    '''Отметить update_id как принятый. False — Telegram прислал его повторно.
+
+    Сначала кольцевой буфер тёплого контейнера, затем bot_processed_updates
+    (INSERT ... ON CONFLICT DO NOTHING), общая для всех экземпляров. Если база
+    недоступна, апдейт пропускается дальше: лучше редкий дубль, чем потерянное сообщение.
+    '''
+    if update_id is None:
+        return True
+    with _lock:
+        if update_id in _recent_set:
+            return False
+
+    try:
+        with pooled_connection(os.environ.get('DATABASE_URL')) as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO bot_processed_updates (update_id)
+                VALUES (%s)
+                ON CONFLICT (update_id) DO NOTHING
+            """, (update_id,))
+            is_new = cur.rowcount == 1
+            if is_new and random.random() < UPDATE_DEDUP_PURGE_PROBABILITY:
+                cur.execute(
+                    "DELETE FROM bot_processed_updates WHERE created_at < NOW() - make_interval(secs => %s)",
+                    (UPDATE_DEDUP_TTL,)
+                )
+            conn.commit()
+    except Exception as e:
+        print(f"Update dedup unavailable: {e}")
+        return True
+
+    _remember(update_id)
+    return is_new
@@ -0,0 +1,198 @@
+import json
+import os
+import select
+import time
+from psycopg2.extras import RealDictCursor
+from db import pooled_connection
+
+BOT_UPDATE_MODE = os.environ.get('BOT_UPDATE_MODE', 'sync')
+INBOX_CHATS_BATCH = int(os.environ.get('INBOX_CHATS_BATCH', '20'))
+INBOX_MAX_ATTEMPTS = int(os.environ.get('INBOX_MAX_ATTEMPTS', '5'))
+INBOX_TIME_BUDGET = float(os.environ.get('INBOX_TIME_BUDGET', '80'))
+INBOX_DONE_RETENTION_HOURS = int(os.environ.get('INBOX_DONE_RETENTION_HOURS', '24'))
+INBOX_FAILED_RETENTION_DAYS = int(os.environ.get('INBOX_FAILED_RETENTION_DAYS', '30'))
+INBOX_PURGE_BATCH = 1000
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 300
+
+
+def is_async() -> bool:
+    '''Режим быстрого ответа вебхуку: апдейт сохраняется, обрабатывает его воркер.
+
+    Без BOT_WORKER_SECRET воркер не запустить, поэтому апдейты обрабатываются сразу.
+    '''
+    return BOT_UPDATE_MODE == 'async' and bool(os.environ.get('BOT_WORKER_SECRET'))
+
+
+def update_chat_id(update: dict):
+    '''Чат апдейта — ключ порядка обработки'''
+    message = update.get('message') or (update.get('callback_query') or {}).get('message') or {}
+    chat_id = (message.get('chat') or {}).get('id')
+    if chat_id is None:
+        chat_id = ((update.get('callback_query') or {}).get('from') or {}).get('id')
+    return chat_id
+
+
+def store_update(update: dict):
+    '''Сохранить сырой апдейт; ответ вебхуку не ждёт ни Telegram API, ни логики бота'''
+    with pooled_connection(os.environ.get('DATABASE_URL')) as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO bot_update_inbox (update_id, chat_id, payload)
+            VALUES (%s, %s, %s)
+        """, (update.get('update_id'), update_chat_id(update), json.dumps(update, ensure_ascii=False)))
+        conn.commit()
+
+
+def purge_inbox() -> int:
+    '''Удалить обработанные апдейты старше INBOX_DONE_RETENTION_HOURS и failed старше INBOX_FAILED_RETENTION_DAYS'''
+    with pooled_connection(os.environ.get('DATABASE_URL')) as conn, conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM bot_update_inbox
+            WHERE id IN (
+                SELECT id FROM bot_update_inbox
+                WHERE (status = 'done' AND processed_at < NOW() - make_interval(hours => %s))
+                   OR (status = 'failed' AND processed_at < NOW() - make_interval(days => %s))
+                LIMIT %s
+            )
+        """, (INBOX_DONE_RETENTION_HOURS, INBOX_FAILED_RETENTION_DAYS, INBOX_PURGE_BATCH))
+        purged = cur.rowcount
+        conn.commit()
+    return purged
+
+
+def retry_delay(attempts: int) -> int:
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def process_inbox(process_update, deadline: float) -> dict:
+    '''Разбирать bot_update_inbox до deadline, по одному воркеру на чат.
+
+    Чат берётся под advisory lock сессии: параллельные вызовы обрабатывают разные
+    чаты, а апдейты одного чата идут строго по id. Упавший апдейт откладывается с
+    backoff и задерживает следующие апдейты своего чата; после INBOX_MAX_ATTEMPTS
+    он помечается failed, и очередь чата идёт дальше. Если экземпляр упадёт посреди
+    апдейта, блокировка снимется вместе с соединением и апдейт обработается повторно.
+    При бюджете 80 с и запуске раз в минуту вызовы перекрываются; при бюджете короче
+    интервала апдейт ждёт ответа до (интервал − бюджет) секунд.
+    '''
+    stats = {'processed': 0, 'retried': 0, 'failed': 0}
+
+    with pooled_connection(os.environ.get('DATABASE_URL')) as conn:
+        conn.autocommit = True
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            while time.monotonic() < deadline:
+                # Только чаты, у которых созрел первый pending-апдейт: чат, чья голова ждёт
+                # backoff, обработать всё равно нельзя, и выбирать его — крутиться вхолостую
+                cur.execute("""
+                    SELECT chat_id FROM (
+                        SELECT DISTINCT ON (chat_id) chat_id, id, next_attempt_at
+                        FROM bot_update_inbox
+                        WHERE status = 'pending'
+                        ORDER BY chat_id, id
+                    ) head
+                    WHERE next_attempt_at <= NOW()
+                    ORDER BY id
+                    LIMIT %s
+                """, (INBOX_CHATS_BATCH,))
+                chats = [row['chat_id'] for row in cur.fetchall()]
+
+                progressed = False
+                for chat_id in chats:
+                    if time.monotonic() >= deadline:
+                        break
+                    cur.execute("SELECT pg_try_advisory_lock(hashtextextended(%s, 0)) AS locked", (f'bot_update_inbox:{chat_id}',))
+                    if not cur.fetchone()['locked']:
+                        continue
+                    try:
+                        progressed = process_chat(cur, chat_id, process_update, deadline, stats) or progressed
+                    finally:
+                        cur.execute("SELECT pg_advisory_unlock(hashtextextended(%s, 0))", (f'bot_update_inbox:{chat_id}',))
+
+                if progressed:
+                    continue
+                if not wait_for_inbox(cur, conn, deadline):
+                    break
+
+    return stats
+
+
+def process_chat(cur, chat_id, process_update, deadline: float, stats: dict) -> bool:
+    '''Апдейты одного чата по порядку; остановиться на первом, который надо повторить позже.
+
+    True — хотя бы один апдейт обработан, отложен или помечен failed.
+    '''
+    cur.execute("""
+        SELECT id, payload, attempts, next_attempt_at <= NOW() AS due
+        FROM bot_update_inbox
+        WHERE chat_id IS NOT DISTINCT FROM %s AND status = 'pending'
+        ORDER BY id
+    """, (chat_id,))
+    rows = cur.fetchall()
+    progressed = False
+
+    for row in rows:
+        if not row['due'] or time.monotonic() >= deadline:
+            return progressed
+        progressed = True
+        try:
+            process_update(row['payload'])
+        except Exception as e:
+            attempts = row['attempts'] + 1
+            if attempts >= INBOX_MAX_ATTEMPTS:
+                cur.execute("""
+                    UPDATE bot_update_inbox
+                    SET status = 'failed', attempts = %s, last_error = %s, processed_at = NOW()
+                    WHERE id = %s
+                """, (attempts, str(e)[:1000], row['id']))
+                stats['failed'] += 1
+                continue
+            cur.execute("""
+                UPDATE bot_update_inbox
+                SET attempts = %s, last_error = %s, next_attempt_at = NOW() + make_interval(secs => %s)
+                WHERE id = %s
+            """, (attempts, str(e)[:1000], retry_delay(attempts), row['id']))
+            stats['retried'] += 1
+            return progressed
+
+        cur.execute("""
+            UPDATE bot_update_inbox
+            SET status = 'done', attempts = attempts + 1, last_error = NULL, processed_at = NOW()
+            WHERE id = %s
+        """, (row['id'],))
+        stats['processed'] += 1
+
+    return progressed
+
+
+def wait_for_inbox(cur, conn, deadline: float) -> bool:
+    '''Ждать нового апдейта или ближайшего повтора, не дольше deadline. True — есть что обрабатывать'''
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return False
+
+    try:
+        cur.execute("LISTEN bot_update_inbox")
+        # Апдейт за головой очереди своего чата не станет обрабатываемым раньше головы
+        cur.execute("""
+            SELECT EXTRACT(EPOCH FROM MIN(next_attempt_at) - NOW()) AS due_in
+            FROM (
+                SELECT DISTINCT ON (chat_id) next_attempt_at
+                FROM bot_update_inbox
+                WHERE status = 'pending'
+                ORDER BY chat_id, id
+            ) head
+        """)
+        due_in = cur.fetchone()['due_in']
+        if due_in is not None and due_in <= 0:
+            # Чаты с созревшими апдейтами заняты другим воркером — не крутиться вхолостую
+            time.sleep(min(1.0, remaining))
+            return True
+
+        timeout = remaining if due_in is None else min(remaining, float(due_in))
+        if select.select([conn], [], [], timeout) == ([], [], []):
+            return due_in is not None and float(due_in) <= remaining
+        conn.poll()
+        return True
+    finally:
+        cur.execute("UNLISTEN bot_update_inbox")
+        conn.notifies.clear()
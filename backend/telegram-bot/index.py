@@ -1,14 +1,24 @@
+import hmac
 import json
 import os
-import urllib.request
-import urllib.parse
-import psycopg2
+import threading
+import time
 from psycopg2.extras import RealDictCursor
+from bot_db import get_db, update_connection
+from dedup import claim_update
+from inbox import INBOX_TIME_BUDGET, is_async, process_inbox, purge_inbox, store_update
+from outbox import admin_chat_id, enqueue_request_message, enqueue_telegram
+import telegram_api
+from state_store import begin_update, clear_state, get_state, set_state, update_state
 
-bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
 site_url = os.environ.get('SITE_URL', 'https://proisvodnaya.poehali.dev')
 
-user_states = {}
+USER_CACHE_TTL = float(os.environ.get('BOT_USER_CACHE_TTL', '5'))
+USER_CACHE_SIZE = 1000
+
+# telegram_id -> (истекает, пользователь); только найденные — незарегистрированный может привязаться в любой момент
+_user_cache = {}
+_user_cache_lock = threading.Lock()
 
 def handler(event: dict, context) -> dict:
     '''Telegram бот SmartLine — автоопределение клиента по номеру телефона'''
@@ -27,6 +37,32 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
 
+    query_params = event.get('queryStringParameters') or {}
+
+    if method == 'GET' and query_params.get('action') == 'metrics':
+        return ok_response({'telegram': telegram_api.get_metrics()})
+
+    if method == 'GET' and query_params.get('action') == 'process_updates':
+        if not worker_authorized(event):
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': False, 'message': 'Forbidden'}),
+                'isBase64Encoded': False
+            }
+        budget = INBOX_TIME_BUDGET if query_params.get('wait', '1') != '0' else 0
+        try:
+            stats = process_inbox(process_update, time.monotonic() + budget)
+            stats['purged'] = purge_inbox()
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': False, 'message': str(e)}),
+                'isBase64Encoded': False
+            }
+        return ok_response({**stats, 'telegram': telegram_api.get_metrics()})
+
     if method == 'GET':
         set_bot_commands()
         return ok_response({'status': 'commands set'})
@@ -36,14 +72,18 @@ def handler(event: dict, context) -> dict:
         update = json.loads(body)
         print(f"Update: {json.dumps(update, ensure_ascii=False)[:500]}")
 
-        message = update.get('message', {})
-        callback_query = update.get('callback_query', {})
+        if not claim_update(update.get('update_id')):
+            print(f"Duplicate update {update.get('update_id')} skipped")
+            return ok_response()
 
-        if callback_query:
-            handle_callback(callback_query)
-        elif message:
-            handle_message(message)
+        if is_async():
+            try:
+                store_update(update)
+                return ok_response()
+            except Exception as e:
+                print(f"Inbox unavailable, processing inline: {e}")
 
+        process_update(update)
         return ok_response()
 
     except Exception as e:
@@ -53,6 +93,31 @@ def handler(event: dict, context) -> dict:
         return ok_response()
 
 
+def worker_authorized(event: dict) -> bool:
+    '''Воркер inbox вызывает только планировщик: заголовок X-Worker-Secret должен совпасть с BOT_WORKER_SECRET'''
+    secret = os.environ.get('BOT_WORKER_SECRET')
+    if not secret:
+        return False
+    provided = ''
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == 'x-worker-secret':
+            provided = value or ''
+    return hmac.compare_digest(provided.encode(), secret.encode())
+
+
+def process_update(update: dict):
+    '''Обработать апдейт: сразу из вебхука или воркером из bot_update_inbox'''
+    message = update.get('message', {})
+    callback_query = update.get('callback_query', {})
+
+    begin_update()
+    with update_connection():
+        if callback_query:
+            handle_callback(callback_query)
+        elif message:
+            handle_message(message)
+
+
 def handle_message(message: dict):
     '''Обработка входящих сообщений'''
     chat_id = message['chat']['id']
@@ -62,7 +127,7 @@ def handle_message(message: dict):
     contact = message.get('contact')
 
     if contact:
-        state = user_states.get(user_id, {})
+        state = get_state(user_id)
         if state.get('step') == 'waiting_reg_phone':
             process_reg_phone_contact(chat_id, user_id, contact)
         else:
@@ -84,7 +149,7 @@ def handle_message(message: dict):
     if text.startswith('/'):
         return
 
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     step = state.get('step')
 
     if step == 'waiting_phone_text':
@@ -130,7 +195,7 @@ def handle_callback(callback: dict):
     elif data == 'cancel':
         cancel_operation(chat_id, message_id, user_id)
     elif data == 'enter_phone_text':
-        user_states[user_id] = {'step': 'waiting_phone_text'}
+        set_state(user_id, {'step': 'waiting_phone_text'})
         edit_message(chat_id, message_id,
                      "📱 Введите ваш номер телефона:\n\n(например: +7 999 123-45-67)")
         contact_kb = {
@@ -155,8 +220,7 @@ def handle_callback(callback: dict):
 
 def handle_start(chat_id: int, user_id: int, first_name: str):
     '''Обработка /start — проверяем, привязан ли уже Telegram'''
-    if user_id in user_states:
-        del user_states[user_id]
+    clear_state(user_id)
 
     user_data = get_user_by_telegram(user_id)
 
@@ -225,7 +289,7 @@ def process_shared_contact(chat_id: int, user_id: int, contact: dict, first_name
 
     if len(normalized) != 11:
         send_message(chat_id, "❌ Не удалось определить номер. Попробуйте ввести вручную.")
-        user_states[user_id] = {'step': 'waiting_phone_text'}
+        set_state(user_id, {'step': 'waiting_phone_text'})
         return
 
     check_phone_in_db(chat_id, user_id, normalized, first_name, contact_full_name=full_contact_name)
@@ -244,17 +308,13 @@ def process_phone_input(chat_id: int, user_id: int, phone_text: str, first_name:
 
 def check_phone_in_db(chat_id: int, user_id: int, phone: str, first_name: str, contact_full_name: str = ''):
     '''Ключевая логика: проверяем телефон в базе'''
-    if user_id in user_states:
-        del user_states[user_id]
+    clear_state(user_id)
 
-    user_data = get_user_by_phone(phone)
+    user_data = link_telegram_by_phone(phone, user_id)
 
     remove_reply_keyboard(chat_id)
 
     if user_data:
-        link_telegram(user_data['id'], user_id)
-        user_data['telegram_id'] = user_id
-
         formatted_phone = format_phone(phone)
         text = (
             f"✅ Нашёл вас в базе!\n\n"
@@ -269,7 +329,7 @@ def check_phone_in_db(chat_id: int, user_id: int, phone: str, first_name: str, c
     else:
         formatted_phone = format_phone(phone)
         saved_name = contact_full_name or ''
-        user_states[user_id] = {'phone': phone, 'contact_name': saved_name}
+        set_state(user_id, {'phone': phone, 'contact_name': saved_name})
 
         if saved_name:
             text = (
@@ -324,7 +384,7 @@ def get_registered_menu():
 
 def register_with_contact_name(chat_id: int, message_id: int, user_id: int):
     '''Мгновенная регистрация с именем из контакта'''
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     phone = state.get('phone')
     name = state.get('contact_name', '')
 
@@ -338,10 +398,10 @@ def register_with_contact_name(chat_id: int, message_id: int, user_id: int):
 
 def start_registration(chat_id: int, message_id: int, user_id: int):
     '''Начало регистрации — спрашиваем имя'''
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     phone = state.get('phone')
 
-    user_states[user_id] = {'step': 'waiting_reg_name', 'phone': phone}
+    set_state(user_id, {'step': 'waiting_reg_name', 'phone': phone})
 
     text = "✅ Регистрация\n\n📝 Как вас зовут?"
     edit_message(chat_id, message_id, text, get_cancel_button())
@@ -353,11 +413,11 @@ def process_reg_name(chat_id: int, user_id: int, name: str):
         send_message(chat_id, "❌ Имя слишком короткое. Введите ваше имя:")
         return
 
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     phone = state.get('phone')
 
     if not phone:
-        user_states[user_id] = {'step': 'waiting_reg_phone', 'name': name.strip()}
+        set_state(user_id, {'step': 'waiting_reg_phone', 'name': name.strip()})
         contact_keyboard = {
             'keyboard': [
                 [{'text': '📱 Отправить номер телефона', 'request_contact': True}]
@@ -375,8 +435,7 @@ def process_reg_name(chat_id: int, user_id: int, name: str):
     success = register_user(user_id, name.strip(), phone, password)
 
     if success:
-        if user_id in user_states:
-            del user_states[user_id]
+        clear_state(user_id)
 
         formatted_phone = format_phone(phone)
         text = (
@@ -392,8 +451,7 @@ def process_reg_name(chat_id: int, user_id: int, name: str):
         send_message(chat_id, text, keyboard, parse_mode='HTML')
     else:
         send_message(chat_id, "❌ Ошибка регистрации. Возможно, этот номер уже зарегистрирован.\n\n/start - Попробовать снова")
-        if user_id in user_states:
-            del user_states[user_id]
+        clear_state(user_id)
 
 
 def complete_registration(chat_id: int, user_id: int, name: str, phone: str):
@@ -406,8 +464,7 @@ def complete_registration(chat_id: int, user_id: int, name: str, phone: str):
     success = register_user(user_id, name, phone, password)
 
     if success:
-        if user_id in user_states:
-            del user_states[user_id]
+        clear_state(user_id)
 
         formatted_phone = format_phone(phone)
         text = (
@@ -423,13 +480,12 @@ def complete_registration(chat_id: int, user_id: int, name: str, phone: str):
         send_message(chat_id, text, keyboard, parse_mode='HTML')
     else:
         send_message(chat_id, "❌ Ошибка регистрации. Возможно, этот номер уже зарегистрирован.\n\n/start - Попробовать снова")
-        if user_id in user_states:
-            del user_states[user_id]
+        clear_state(user_id)
 
 
 def process_reg_phone_contact(chat_id: int, user_id: int, contact: dict):
     '''Обработка контакта при регистрации'''
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     name = state.get('name')
 
     if not name:
@@ -441,7 +497,7 @@ def process_reg_phone_contact(chat_id: int, user_id: int, contact: dict):
 
     if len(normalized) != 11:
         send_message(chat_id, "❌ Не удалось определить номер из контакта. Введите номер вручную:")
-        user_states[user_id] = {'step': 'waiting_reg_phone', 'name': name}
+        set_state(user_id, {'step': 'waiting_reg_phone', 'name': name})
         return
 
     complete_registration(chat_id, user_id, name, normalized)
@@ -449,7 +505,7 @@ def process_reg_phone_contact(chat_id: int, user_id: int, contact: dict):
 
 def process_reg_phone_text(chat_id: int, user_id: int, phone_text: str):
     '''Обработка номера вручную при регистрации'''
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     name = state.get('name')
 
     if not name:
@@ -470,27 +526,27 @@ def start_new_request(chat_id: int, message_id: int, user_id: int):
     user_data = get_user_by_telegram(user_id)
 
     if user_data:
-        user_states[user_id] = {
+        set_state(user_id, {
             'step': 'waiting_car',
             'user_data': user_data
-        }
+        })
 
         text = f"🆕 Новая заявка\n\n🚗 Какой у вас автомобиль? (марка и модель)"
         edit_message(chat_id, message_id, text, get_cancel_button())
     else:
-        state = user_states.get(user_id, {})
+        state = get_state(user_id)
         phone = state.get('phone')
 
         if phone:
-            user_states[user_id] = {
+            set_state(user_id, {
                 'step': 'waiting_car',
                 'phone': phone,
                 'name': state.get('name', 'Клиент')
-            }
+            })
             text = "🆕 Новая заявка\n\n🚗 Какой у вас автомобиль? (марка и модель)"
             edit_message(chat_id, message_id, text, get_cancel_button())
         else:
-            user_states[user_id] = {'step': 'waiting_phone_text', 'intent': 'request'}
+            set_state(user_id, {'step': 'waiting_phone_text', 'intent': 'request'})
             edit_message(chat_id, message_id,
                          "📱 Для создания заявки укажите ваш номер телефона:",
                          get_cancel_button())
@@ -502,8 +558,7 @@ def process_car(chat_id: int, user_id: int, car: str):
         send_message(chat_id, "❌ Укажите марку и модель автомобиля:")
         return
 
-    user_states[user_id]['car'] = car.strip()
-    user_states[user_id]['step'] = 'waiting_car_year'
+    update_state(user_id, car=car.strip(), step='waiting_car_year')
 
     send_message(chat_id, "📅 Укажите год выпуска автомобиля:", get_cancel_button())
 
@@ -520,15 +575,14 @@ def process_car_year(chat_id: int, user_id: int, year_text: str):
         send_message(chat_id, "❌ Введите корректный год (1990–2030):")
         return
 
-    user_states[user_id]['car_year'] = year
-    user_states[user_id]['step'] = 'waiting_message'
+    update_state(user_id, car_year=year, step='waiting_message')
 
     send_message(chat_id, "💬 Опишите проблему или нужную услугу:", get_cancel_button())
 
 
 def process_message_text(chat_id: int, user_id: int, message_text: str):
     '''Обработка описания и создание заявки'''
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
 
     if 'user_data' in state:
         user_data = state['user_data']
@@ -548,6 +602,7 @@ def process_message_text(chat_id: int, user_id: int, message_text: str):
 
     request_id = create_request_in_db(
         user_id=user_db_id,
+        telegram_id=user_id,
         name=name,
         phone=phone,
         email=email,
@@ -558,13 +613,7 @@ def process_message_text(chat_id: int, user_id: int, message_text: str):
     )
 
     if request_id:
-        car_full = car
-        if car_year:
-            car_full += f" ({car_year})"
-        notify_admin_new_request(request_id, name, phone, car_full, message_text)
-
-        if user_id in user_states:
-            del user_states[user_id]
+        clear_state(user_id)
 
         buttons = {
             'inline_keyboard': [
@@ -578,8 +627,7 @@ def process_message_text(chat_id: int, user_id: int, message_text: str):
         send_message(chat_id, text, buttons)
     else:
         send_message(chat_id, "❌ Ошибка создания заявки. Попробуйте позже.\n\n/start - Вернуться в меню")
-        if user_id in user_states:
-            del user_states[user_id]
+        clear_state(user_id)
 
 
 def show_my_requests(chat_id: int, message_id: int, user_id: int):
@@ -630,8 +678,7 @@ def show_my_requests(chat_id: int, message_id: int, user_id: int):
 
 def back_to_menu(chat_id: int, message_id: int, user_id: int):
     '''Возврат в главное меню'''
-    if user_id in user_states:
-        del user_states[user_id]
+    clear_state(user_id)
 
     user_data = get_user_by_telegram(user_id)
 
@@ -651,8 +698,7 @@ def back_to_menu(chat_id: int, message_id: int, user_id: int):
 
 def cancel_operation(chat_id: int, message_id: int, user_id: int):
     '''Отмена операции'''
-    if user_id in user_states:
-        del user_states[user_id]
+    clear_state(user_id)
 
     user_data = get_user_by_telegram(user_id)
 
@@ -668,21 +714,21 @@ def cancel_operation(chat_id: int, message_id: int, user_id: int):
 
 def start_reply(chat_id: int, message_id: int, user_id: int, request_id: int):
     '''Клиент начинает отвечать на сообщение по заявке'''
-    user_states[user_id] = {'step': 'waiting_reply', 'request_id': request_id}
+    set_state(user_id, {'step': 'waiting_reply', 'request_id': request_id})
     text = f"💬 Ответ на заявку #{str(request_id).zfill(3)}\n\nНапишите сообщение:"
     edit_message(chat_id, message_id, text, get_cancel_button())
 
 
 def start_admin_reply(chat_id: int, message_id: int, user_id: int, request_id: int):
     '''Админ начинает отвечать на сообщение клиента'''
-    user_states[user_id] = {'step': 'waiting_admin_reply', 'request_id': request_id}
+    set_state(user_id, {'step': 'waiting_admin_reply', 'request_id': request_id})
     text = f"💬 Ответ от компании на заявку #{str(request_id).zfill(3)}\n\nНапишите сообщение:"
     edit_message(chat_id, message_id, text, get_cancel_button())
 
 
 def process_reply_text(chat_id: int, user_id: int, text: str):
     '''Обработка ответа клиента из Telegram'''
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     request_id = state.get('request_id')
 
     if not request_id:
@@ -695,8 +741,7 @@ def process_reply_text(chat_id: int, user_id: int, text: str):
 
     success = save_client_message(user_id, request_id, text.strip())
 
-    if user_id in user_states:
-        del user_states[user_id]
+    clear_state(user_id)
 
     if success:
         buttons = {
@@ -712,7 +757,7 @@ def process_reply_text(chat_id: int, user_id: int, text: str):
 
 def process_admin_reply_text(chat_id: int, user_id: int, text: str):
     '''Обработка ответа админа из Telegram'''
-    state = user_states.get(user_id, {})
+    state = get_state(user_id)
     request_id = state.get('request_id')
 
     if not request_id:
@@ -725,8 +770,7 @@ def process_admin_reply_text(chat_id: int, user_id: int, text: str):
 
     success = save_admin_message(request_id, text.strip())
 
-    if user_id in user_states:
-        del user_states[user_id]
+    clear_state(user_id)
 
     if success:
         buttons = {
@@ -740,68 +784,28 @@ def process_admin_reply_text(chat_id: int, user_id: int, text: str):
 
 
 def save_client_message(telegram_id: int, request_id: int, message_text: str) -> bool:
-    '''Сохранить сообщение клиента в БД и уведомить админа'''
+    '''Сохранить сообщение клиента в БД и поставить уведомление админу в outbox'''
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        cur.execute("""
-            SELECT r.id, r.car_brand, r.car_model, r.car_year, r.client_name,
-                   u.id as user_id, u.name, u.phone
-            FROM russification_requests r
-            JOIN users u ON r.user_id = u.id
-            WHERE r.id = %s AND u.telegram_id = %s
-        """, (request_id, telegram_id))
-
-        req = cur.fetchone()
-        if not req:
-            cur.close()
-            conn.close()
-            return False
-
-        cur.execute("""
-            INSERT INTO request_messages (request_id, user_id, sender_type, message_text)
-            VALUES (%s, %s, 'client', %s)
-        """, (request_id, req['user_id'], message_text))
-        conn.commit()
-
-        bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-        admin_chat_id = os.environ.get('TELEGRAM_CHAT_ID')
-        if bot_token and admin_chat_id:
-            car_info = f"{req['car_brand']} {req['car_model']}"
-            if req.get('car_year'):
-                car_info += f" ({req['car_year']})"
-
-            notification = (
-                f"💬 <b>Новое сообщение от клиента</b>\n\n"
-                f"📝 Заявка #{request_id}\n"
-                f"🚗 {car_info}\n"
-                f"👤 {req['client_name']}\n"
-                f"📞 {req['phone']}\n\n"
-                f"💭 {message_text}"
-            )
-
-            keyboard = json.dumps({
-                'inline_keyboard': [
-                    [{'text': '💬 Ответить', 'callback_data': f'admin_reply_{request_id}'}]
-                ]
-            })
+        with get_db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT r.id, u.id as user_id
+                FROM russification_requests r
+                JOIN users u ON r.user_id = u.id
+                WHERE r.id = %s AND u.telegram_id = %s
+            """, (request_id, telegram_id))
+
+            req = cur.fetchone()
+            if not req:
+                return False
+
+            cur.execute("""
+                INSERT INTO request_messages (request_id, user_id, sender_type, message_text)
+                VALUES (%s, %s, 'client', %s)
+            """, (request_id, req['user_id'], message_text))
+
+            enqueue_request_message(cur, request_id, message_text)
+            conn.commit()
 
-            try:
-                url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-                data = json.dumps({
-                    'chat_id': admin_chat_id,
-                    'text': notification,
-                    'parse_mode': 'HTML',
-                    'reply_markup': keyboard
-                }).encode('utf-8')
-                r = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
-                urllib.request.urlopen(r, timeout=5)
-            except:
-                pass
-
-        cur.close()
-        conn.close()
         return True
     except Exception as e:
         print(f"Save client message error: {e}")
@@ -809,34 +813,26 @@ def save_client_message(telegram_id: int, request_id: int, message_text: str) ->
 
 
 def save_admin_message(request_id: int, message_text: str) -> bool:
-    '''Сохранить ответ админа в БД и уведомить клиента'''
+    '''Сохранить ответ админа в БД и поставить уведомление клиенту в outbox'''
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        cur.execute("""
-            SELECT r.id, r.user_id, r.car_brand, r.car_model, r.car_year,
-                   u.telegram_id
-            FROM russification_requests r
-            LEFT JOIN users u ON r.user_id = u.id
-            WHERE r.id = %s
-        """, (request_id,))
-
-        req = cur.fetchone()
-        if not req:
-            cur.close()
-            conn.close()
-            return False
-
-        cur.execute("""
-            INSERT INTO request_messages (request_id, user_id, sender_type, message_text)
-            VALUES (%s, %s, 'company', %s)
-        """, (request_id, req['user_id'], message_text))
-        conn.commit()
-
-        client_telegram = req.get('telegram_id')
-        bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-        if bot_token and client_telegram:
+        with get_db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT r.id, r.user_id, r.car_brand, r.car_model, r.car_year,
+                       u.telegram_id
+                FROM russification_requests r
+                LEFT JOIN users u ON r.user_id = u.id
+                WHERE r.id = %s
+            """, (request_id,))
+
+            req = cur.fetchone()
+            if not req:
+                return False
+
+            cur.execute("""
+                INSERT INTO request_messages (request_id, user_id, sender_type, message_text)
+                VALUES (%s, %s, 'company', %s)
+            """, (request_id, req['user_id'], message_text))
+
             car_info = f"{req['car_brand']} {req['car_model']}"
             if req.get('car_year'):
                 car_info += f" ({req['car_year']})"
@@ -847,27 +843,15 @@ def save_admin_message(request_id: int, message_text: str) -> bool:
                 f"🏢 SmartLine:\n{message_text}"
             )
 
-            keyboard = json.dumps({
+            keyboard = {
                 'inline_keyboard': [
                     [{'text': '💬 Ответить', 'callback_data': f'reply_{request_id}'}]
                 ]
-            })
+            }
+
+            enqueue_telegram(cur, req.get('telegram_id'), notification, keyboard)
+            conn.commit()
 
-            try:
-                url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-                data = json.dumps({
-                    'chat_id': client_telegram,
-                    'text': notification,
-                    'parse_mode': 'HTML',
-                    'reply_markup': keyboard
-                }).encode('utf-8')
-                r = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
-                urllib.request.urlopen(r, timeout=5)
-            except:
-                pass
-
-        cur.close()
-        conn.close()
         return True
     except Exception as e:
         print(f"Save admin message error: {e}")
@@ -936,7 +920,7 @@ def handle_password_recovery_inline(chat_id: int, message_id: int, user_id: int)
         edit_message(chat_id, message_id, "❌ Вы не привязаны к системе.\n\nНажмите /start чтобы пройти идентификацию.")
         return
 
-    new_password = reset_user_password(user_data['id'])
+    new_password = reset_user_password(user_data['id'], user_id)
 
     if new_password:
         formatted_phone = format_phone(user_data['phone'])
@@ -989,70 +973,111 @@ def format_phone(phone: str) -> str:
     return phone
 
 
-def get_db():
-    '''Подключение к БД'''
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    return conn
+def cache_user(telegram_id: int, user: dict):
+    with _user_cache_lock:
+        if len(_user_cache) >= USER_CACHE_SIZE:
+            now = time.monotonic()
+            for key in [k for k, (expires, _) in _user_cache.items() if expires <= now]:
+                del _user_cache[key]
+            while len(_user_cache) >= USER_CACHE_SIZE:
+                del _user_cache[next(iter(_user_cache))]
+        _user_cache[telegram_id] = (time.monotonic() + USER_CACHE_TTL, user)
+
+
+def invalidate_user(telegram_id: int):
+    with _user_cache_lock:
+        _user_cache.pop(telegram_id, None)
 
 
 def get_user_by_telegram(telegram_id: int):
-    '''Получить пользователя по Telegram ID'''
+    '''Получить пользователя по Telegram ID (кэш тёплого контейнера на USER_CACHE_TTL)'''
+    with _user_cache_lock:
+        cached = _user_cache.get(telegram_id)
+    if cached and cached[0] > time.monotonic():
+        return dict(cached[1])
+
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT id, name, email, phone FROM users WHERE telegram_id = %s", (telegram_id,))
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(user) if user else None
+        with get_db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT id, name, email, phone FROM users WHERE telegram_id = %s", (telegram_id,))
+            user = cur.fetchone()
     except:
         return None
 
-
-def get_user_by_phone(phone: str):
-    '''Получить пользователя по номеру телефона'''
-    try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("SELECT id, name, email, phone, telegram_id FROM users WHERE phone = %s", (phone,))
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
-        return dict(user) if user else None
-    except:
+    if not user:
         return None
+    cache_user(telegram_id, dict(user))
+    return dict(user)
+
 
+def link_telegram_by_phone(phone: str, telegram_id: int):
+    '''Найти пользователя по телефону и привязать Telegram ID; None — номера нет в базе.
 
-def link_telegram(user_db_id: int, telegram_id: int):
-    '''Привязать Telegram ID к существующему пользователю'''
+    Один оператор: прежняя привязка Telegram ID к другому пользователю снимается
+    (released), затем ID пишется найденному — только если он ещё не привязан, чтобы
+    повторная проверка номера не трогала updated_at и версии данных. Условие на
+    released заставляет выполнить его раньше linked: иначе уникальный индекс
+    telegram_id мог бы сработать на промежуточном состоянии.
+    '''
+    invalidate_user(telegram_id)
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("UPDATE users SET telegram_id = %s WHERE id = %s", (telegram_id, user_db_id))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return True
+        with get_db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                WITH target AS (
+                    SELECT id FROM users WHERE phone = %(phone)s ORDER BY id LIMIT 1
+                ),
+                released AS (
+                    UPDATE users SET telegram_id = NULL
+                    WHERE telegram_id = %(telegram_id)s AND id <> (SELECT id FROM target)
+                    RETURNING id
+                ),
+                linked AS (
+                    UPDATE users SET telegram_id = %(telegram_id)s
+                    WHERE id = (SELECT id FROM target)
+                      AND telegram_id IS DISTINCT FROM %(telegram_id)s
+                      AND (SELECT COUNT(*) FROM released) >= 0
+                    RETURNING id
+                )
+                SELECT u.id, u.name, u.email, u.phone, %(telegram_id)s AS telegram_id
+                FROM users u
+                WHERE u.id = (SELECT id FROM target)
+            """, {'phone': phone, 'telegram_id': telegram_id})
+            user = cur.fetchone()
+            conn.commit()
     except Exception as e:
         print(f"Link telegram error: {e}")
-        return False
+        return None
+
+    if not user:
+        return None
+    user = dict(user)
+    cache_user(telegram_id, {k: user[k] for k in ('id', 'name', 'email', 'phone')})
+    return user
 
 
-def reset_user_password(user_db_id: int):
-    '''Сброс пароля пользователя — генерация нового и обновление в БД'''
+def reset_user_password(user_db_id: int, telegram_id: int):
+    '''Сброс пароля пользователя — генерация нового и обновление в БД.
+
+    None, если Telegram ID уже не привязан к user_db_id (перепривязан в другом экземпляре бота).
+    '''
     try:
         import secrets as sec
         import hashlib
         new_password = sec.token_urlsafe(8)
         password_hash = hashlib.sha256(new_password.encode()).hexdigest()
 
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("UPDATE users SET password_hash = %s WHERE id = %s", (password_hash, user_db_id))
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE users SET password_hash = %s WHERE id = %s AND telegram_id = %s",
+                        (password_hash, user_db_id, telegram_id))
+            if cur.rowcount == 0:
+                conn.rollback()
+                invalidate_user(telegram_id)
+                return None
+            cur.execute("DELETE FROM user_sessions WHERE user_id = %s", (user_db_id,))
+            cur.execute("""
+                INSERT INTO session_revocations (user_id, revoked_before, expires_at)
+                VALUES (%s, NOW(), NOW() + INTERVAL '30 days')
+            """, (user_db_id,))
+            conn.commit()
         return new_password
     except Exception as e:
         print(f"Reset password error: {e}")
@@ -1062,49 +1087,50 @@ def reset_user_password(user_db_id: int):
 def register_user(telegram_id: int, name: str, phone: str, password: str):
     '''Регистрация нового пользователя'''
     try:
-        conn = get_db()
-        cur = conn.cursor()
-
         import hashlib
         password_hash = hashlib.sha256(password.encode()).hexdigest()
 
-        cur.execute("""
-            INSERT INTO users (telegram_id, name, email, phone, password_hash, user_type, user_role)
-            VALUES (%s, %s, %s, %s, %s, 'client', 'partner')
-            RETURNING id
-        """, (telegram_id, name, '', phone, password_hash))
-
-        conn.commit()
-        cur.close()
-        conn.close()
+        invalidate_user(telegram_id)
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("UPDATE users SET telegram_id = NULL WHERE telegram_id = %s", (telegram_id,))
+            cur.execute("""
+                INSERT INTO users (telegram_id, name, email, phone, password_hash, user_type, user_role)
+                VALUES (%s, %s, %s, %s, %s, 'client', 'partner')
+                RETURNING id
+            """, (telegram_id, name, '', phone, password_hash))
+            conn.commit()
         return True
     except Exception as e:
         print(f"Registration error: {e}")
         return False
 
 
-def create_request_in_db(user_id, name, phone, email, car, car_year, car_plate, message):
-    '''Создание заявки в БД'''
-    try:
-        conn = get_db()
-        cur = conn.cursor()
+def create_request_in_db(user_id, telegram_id, name, phone, email, car, car_year, car_plate, message):
+    '''Создание заявки в БД; уведомление админу ставится в outbox в той же транзакции.
 
+    user_id взят из кэша или состояния диалога и перепроверяется по telegram_id: если
+    Telegram ID за это время перепривязан к другому аккаунту, заявка создаётся без user_id.
+    '''
+    try:
         car_parts = car.split(' ', 1)
         car_brand = car_parts[0] if len(car_parts) > 0 else 'Не указано'
         car_model = car_parts[1] if len(car_parts) > 1 else ''
 
-        cur.execute("""
-            INSERT INTO russification_requests
-            (user_id, client_name, client_phone, client_email, car_brand, car_model,
-             car_year, car_plate, service_type, description, status, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'multimedia', %s, 'pending', NOW())
-            RETURNING id
-        """, (user_id, name, phone, email, car_brand, car_model, car_year, car_plate, message))
-
-        request_id = cur.fetchone()[0]
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO russification_requests
+                (user_id, client_name, client_phone, client_email, car_brand, car_model,
+                 car_year, car_plate, service_type, description, status, created_at)
+                VALUES ((SELECT id FROM users WHERE id = %s AND telegram_id = %s),
+                        %s, %s, %s, %s, %s, %s, %s, 'multimedia', %s, 'pending', NOW())
+                RETURNING id
+            """, (user_id, telegram_id, name, phone, email, car_brand, car_model, car_year, car_plate, message))
+
+            request_id = cur.fetchone()[0]
+
+            car_full = f"{car} ({car_year})" if car_year else car
+            enqueue_telegram(cur, admin_chat_id(), new_request_text(request_id, name, phone, car_full, message))
+            conn.commit()
         return request_id
     except Exception as e:
         print(f"DB Error: {e}")
@@ -1114,53 +1140,30 @@ def create_request_in_db(user_id, name, phone, email, car, car_year, car_plate,
 def get_user_requests(telegram_id: int):
     '''Получить заявки пользователя по Telegram ID'''
     try:
-        conn = get_db()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            SELECT r.id, r.status, r.car_brand || ' ' || r.car_model as car, r.created_at
-            FROM russification_requests r
-            LEFT JOIN users u ON r.user_id = u.id
-            WHERE u.telegram_id = %s
-            ORDER BY r.created_at DESC
-            LIMIT 10
-        """, (telegram_id,))
-        requests = cur.fetchall()
-        cur.close()
-        conn.close()
+        with get_db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT r.id, r.status, r.car_brand || ' ' || r.car_model as car, r.created_at
+                FROM russification_requests r
+                LEFT JOIN users u ON r.user_id = u.id
+                WHERE u.telegram_id = %s
+                ORDER BY r.created_at DESC
+                LIMIT 10
+            """, (telegram_id,))
+            requests = cur.fetchall()
         return [dict(r) for r in requests]
     except:
         return []
 
 
-def notify_admin_new_request(request_id, name, phone, car, message):
-    '''Уведомление админа о новой заявке'''
-    try:
-        chat_id = os.environ.get('TELEGRAM_CHAT_ID')
-        if not chat_id:
-            return
-
-        text = f"🔔 <b>Новая заявка из Telegram</b>\n\n"
-        text += f"📝 Заявка #{str(request_id).zfill(3)}\n"
-        text += f"👤 Имя: {name}\n"
-        text += f"📱 Телефон: {phone}\n"
-        text += f"🚗 Автомобиль: {car}\n"
-        text += f"💬 Сообщение: {message}"
-
-        url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-        data = {
-            'chat_id': chat_id,
-            'text': text,
-            'parse_mode': 'HTML'
-        }
-
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
-        urllib.request.urlopen(req)
-    except:
-        pass
+def new_request_text(request_id, name, phone, car, message) -> str:
+    '''Уведомление админа о новой заявке (через outbox — не теряется при ошибке Telegram)'''
+    text = f"🔔 <b>Новая заявка из Telegram</b>\n\n"
+    text += f"📝 Заявка #{str(request_id).zfill(3)}\n"
+    text += f"👤 Имя: {name}\n"
+    text += f"📱 Телефон: {phone}\n"
+    text += f"🚗 Автомобиль: {car}\n"
+    text += f"💬 Сообщение: {message}"
+    return text
 
 
 # ====================== TELEGRAM API ======================
@@ -1168,24 +1171,7 @@ def notify_admin_new_request(request_id, name, phone, car, message):
 def send_message(chat_id: int, text: str, keyboard=None, parse_mode=None):
     '''Отправка сообщения'''
     try:
-        url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-        data = {'chat_id': chat_id, 'text': text}
-
-        if parse_mode:
-            data['parse_mode'] = parse_mode
-
-        if keyboard:
-            data['reply_markup'] = keyboard
-
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
-        urllib.request.urlopen(req)
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8', errors='replace')
-        print(f"Send message error: {e} | Response: {error_body}")
+        telegram_api.send_message(chat_id, text, keyboard, parse_mode)
     except Exception as e:
         print(f"Send message error: {e}")
 
@@ -1193,7 +1179,6 @@ def send_message(chat_id: int, text: str, keyboard=None, parse_mode=None):
 def edit_message(chat_id: int, message_id: int, text: str, keyboard=None, parse_mode=None):
     '''Редактирование сообщения'''
     try:
-        url = f'https://api.telegram.org/bot{bot_token}/editMessageText'
         data = {
             'chat_id': chat_id,
             'message_id': message_id,
@@ -1206,12 +1191,7 @@ def edit_message(chat_id: int, message_id: int, text: str, keyboard=None, parse_
         if keyboard:
             data['reply_markup'] = keyboard
 
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
-        urllib.request.urlopen(req)
+        telegram_api.call('editMessageText', data)
     except Exception as e:
         print(f"Edit message error: {e}")
 
@@ -1219,48 +1199,21 @@ def edit_message(chat_id: int, message_id: int, text: str, keyboard=None, parse_
 def remove_reply_keyboard(chat_id: int):
     '''Убрать reply-клавиатуру'''
     try:
-        url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-        data = {
-            'chat_id': chat_id,
-            'text': '⏳ Проверяю...',
-            'reply_markup': {'remove_keyboard': True}
-        }
-
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
-        urllib.request.urlopen(req)
-    except:
-        pass
+        telegram_api.send_message(chat_id, '⏳ Проверяю...', {'remove_keyboard': True})
+    except Exception as e:
+        print(f"Remove keyboard error: {e}")
 
 
 def answer_callback(callback_id: str):
-    '''Ответ на callback query'''
+    '''Ответ на callback query: без повторов, Telegram ждёт его не дольше нескольких секунд'''
     try:
-        url = f'https://api.telegram.org/bot{bot_token}/answerCallbackQuery'
-        data = {'callback_query_id': callback_id}
-
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode('utf-8'),
-            headers={'Content-Type': 'application/json'}
-        )
-        urllib.request.urlopen(req)
-    except:
-        pass
+        telegram_api.call('answerCallbackQuery', {'callback_query_id': callback_id}, retries=0)
+    except Exception as e:
+        print(f"Answer callback error: {e}")
 
 
 def api_call(method: str, data: dict):
-    url = f'https://api.telegram.org/bot{bot_token}/{method}'
-    req = urllib.request.Request(
-        url,
-        data=json.dumps(data).encode('utf-8'),
-        headers={'Content-Type': 'application/json'}
-    )
-    resp = urllib.request.urlopen(req)
-    return json.loads(resp.read().decode('utf-8'))
+    return telegram_api.call(method, data)
 
 
 def set_bot_commands():
@@ -0,0 +1,107 @@
+'''Запуск бота через getUpdates вместо вебхука — для нагрузочных тестов и self-hosted.
+
+    python polling.py --workers 4 --delete-webhook
+
+Та же логика, что в handler (process_update), пул соединений БД и HTTP-сессия
+Telegram общие для всех апдейтов. Апдейты раскладываются по воркерам по chat_id:
+разные чаты обрабатываются параллельно, апдейты одного чата — строго по порядку.
+DB_POOL_MAX_SIZE и TELEGRAM_POOL_SIZE стоит задать не меньше числа воркеров.
+'''
+import argparse
+import os
+import queue
+import signal
+import threading
+import time
+
+import telegram_api
+from inbox import update_chat_id
+from index import process_update
+
+POLLING_WORKERS = int(os.environ.get('POLLING_WORKERS', '4'))
+POLLING_TIMEOUT = int(os.environ.get('POLLING_TIMEOUT', '30'))
+POLLING_QUEUE_SIZE = int(os.environ.get('POLLING_QUEUE_SIZE', '100'))
+POLLING_ERROR_DELAY = 5
+
+
+class ChatWorkers:
+    '''Пул потоков с очередью на каждый поток; чат всегда попадает в одну и ту же очередь'''
+
+    def __init__(self, size: int):
+        self.queues = [queue.Queue(maxsize=POLLING_QUEUE_SIZE) for _ in range(size)]
+        self.threads = [
+            threading.Thread(target=self._run, args=(q,), name=f'bot-worker-{i}', daemon=True)
+            for i, q in enumerate(self.queues)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, update: dict):
+        '''Поставить апдейт в очередь его чата; блокирует, если воркер не успевает'''
+        chat_id = update_chat_id(update)
+        index = hash(chat_id) % len(self.queues)
+        self.queues[index].put(update)
+
+    def _run(self, q: queue.Queue):
+        while True:
+            update = q.get()
+            if update is None:
+                return
+            try:
+                process_update(update)
+            except Exception as e:
+                print(f"Update {update.get('update_id')} failed: {e}")
+
+    def shutdown(self):
+        '''Дообработать уже полученные апдейты и остановить потоки'''
+        for q in self.queues:
+            q.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def poll(workers: ChatWorkers, timeout: int, stop: threading.Event):
+    offset = None
+    while not stop.is_set():
+        payload = {'timeout': timeout, 'allowed_updates': ['message', 'callback_query']}
+        if offset is not None:
+            payload['offset'] = offset
+        try:
+            updates = telegram_api.call('getUpdates', payload, timeout=timeout + 10, retries=0)
+        except telegram_api.TelegramError as e:
+            print(f"getUpdates failed: {e}")
+            stop.wait(e.retry_after or POLLING_ERROR_DELAY)
+            continue
+
+        for update in updates:
+            workers.submit(update)
+            # offset подтверждает апдейт для Telegram: после падения он не придёт снова
+            offset = update['update_id'] + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Telegram bot getUpdates runner')
+    parser.add_argument('--workers', type=int, default=POLLING_WORKERS)
+    parser.add_argument('--timeout', type=int, default=POLLING_TIMEOUT)
+    parser.add_argument('--delete-webhook', action='store_true', help='снять вебхук: getUpdates с ним не работает')
+    args = parser.parse_args()
+
+    if args.delete_webhook:
+        telegram_api.call('deleteWebhook', {'drop_pending_updates': False})
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    workers = ChatWorkers(args.workers)
+    print(f"Polling with {args.workers} workers")
+    started = time.monotonic()
+    try:
+        poll(workers, args.timeout, stop)
+    finally:
+        workers.shutdown()
+        print(f"Stopped after {time.monotonic() - started:.0f}s, telegram: {telegram_api.get_metrics()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from psycopg2.extras import RealDictCursor
+from bot_db import get_db
+
+BOT_STATE_TTL = int(os.environ.get('BOT_STATE_TTL', '86400'))
+BOT_STATE_CACHE_SIZE = int(os.environ.get('BOT_STATE_CACHE_SIZE', '1024'))
+BOT_STATE_SQLITE_PATH = os.environ.get('BOT_STATE_SQLITE_PATH', '/tmp/bot_states.sqlite3')
+BOT_STATE_PURGE_PROBABILITY = 0.01
+
+_cache = OrderedDict()
+_validated = set()
+_lock = threading.Lock()
+
+
+class PostgresBackend:
+    '''Состояния в bot_user_states: общие для всех экземпляров бота'''
+
+    def _db(self):
+        return get_db()
+
+    def load(self, user_id: int, known_version):
+        '''(version, state): state = None, если версия совпала с known_version; (None, None) — состояния нет'''
+        with self._db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT version, CASE WHEN version IS DISTINCT FROM %s THEN state END AS state
+                FROM bot_user_states
+                WHERE telegram_id = %s AND expires_at > NOW()
+            """, (known_version, user_id))
+            row = cur.fetchone()
+        if not row:
+            return None, None
+        return row['version'], row['state']
+
+    def save(self, user_id: int, state: dict) -> int:
+        with self._db() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                INSERT INTO bot_user_states (telegram_id, state, version, expires_at, updated_at)
+                VALUES (%s, %s, 1, NOW() + make_interval(secs => %s), NOW())
+                ON CONFLICT (telegram_id) DO UPDATE
+                SET state = EXCLUDED.state,
+                    version = bot_user_states.version + 1,
+                    expires_at = EXCLUDED.expires_at,
+                    updated_at = NOW()
+                RETURNING version
+            """, (user_id, json.dumps(state, ensure_ascii=False, default=str), BOT_STATE_TTL))
+            version = cur.fetchone()['version']
+            if random.random() < BOT_STATE_PURGE_PROBABILITY:
+                cur.execute("DELETE FROM bot_user_states WHERE expires_at <= NOW()")
+            conn.commit()
+        return version
+
+    def delete(self, user_id: int):
+        with self._db() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM bot_user_states WHERE telegram_id = %s", (user_id,))
+            conn.commit()
+
+
+class SqliteBackend:
+    '''Локальная разработка без Postgres: файл SQLite, одно состояние на процесс'''
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS bot_user_states (
+                    telegram_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self.conn.commit()
+
+    def load(self, user_id: int, known_version):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT version, state FROM bot_user_states WHERE telegram_id = ? AND expires_at > ?",
+                (user_id, time.time())
+            ).fetchone()
+        if not row:
+            return None, None
+        version, state = row
+        return version, None if version == known_version else json.loads(state)
+
+    def save(self, user_id: int, state: dict) -> int:
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO bot_user_states (telegram_id, state, version, expires_at)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT (telegram_id) DO UPDATE
+                SET state = excluded.state, version = version + 1, expires_at = excluded.expires_at
+            """, (user_id, json.dumps(state, ensure_ascii=False, default=str), time.time() + BOT_STATE_TTL))
+            self.conn.execute("DELETE FROM bot_user_states WHERE expires_at <= ?", (time.time(),))
+            self.conn.commit()
+            return self.conn.execute(
+                "SELECT version FROM bot_user_states WHERE telegram_id = ?", (user_id,)
+            ).fetchone()[0]
+
+    def delete(self, user_id: int):
+        with self.lock:
+            self.conn.execute("DELETE FROM bot_user_states WHERE telegram_id = ?", (user_id,))
+            self.conn.commit()
+
+
+def _make_backend():
+    dsn = os.environ.get('DATABASE_URL')
+    if dsn and os.environ.get('BOT_STATE_BACKEND', 'postgres') != 'sqlite':
+        return PostgresBackend()
+    return SqliteBackend(BOT_STATE_SQLITE_PATH)
+
+
+_backend = _make_backend()
+
+
+def _remember(user_id: int, version, state: dict):
+    with _lock:
+        _cache[user_id] = (version, state)
+        _cache.move_to_end(user_id)
+        while len(_cache) > BOT_STATE_CACHE_SIZE:
+            _cache.popitem(last=False)
+        _validated.add(user_id)
+
+
+def begin_update():
+    '''Начало обработки апдейта: кэш снова сверяется с хранилищем.
+
+    В пределах одного апдейта повторные чтения обслуживает LRU без запроса; первое
+    чтение сверяет версию — другой экземпляр мог продвинуть диалог.
+    '''
+    with _lock:
+        _validated.clear()
+
+
+def get_state(user_id: int) -> dict:
+    '''Копия состояния диалога или {}'''
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached is not None and user_id in _validated:
+            _cache.move_to_end(user_id)
+            return dict(cached[1])
+
+    version, state = _backend.load(user_id, cached[0] if cached else None)
+    if version is None:
+        _remember(user_id, None, {})
+        return {}
+    if state is None:
+        state = cached[1]
+    _remember(user_id, version, state)
+    return dict(state)
+
+
+def set_state(user_id: int, state: dict):
+    version = _backend.save(user_id, state)
+    _remember(user_id, version, dict(state))
+
+
+def update_state(user_id: int, **fields):
+    state = get_state(user_id)
+    state.update(fields)
+    set_state(user_id, state)
+
+
+def clear_state(user_id: int):
+    _backend.delete(user_id)
+    _remember(user_id, None, {})
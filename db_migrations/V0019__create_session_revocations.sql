@@ -0,0 +1,14 @@
+-- Список отозванных подписанных токенов (выход из аккаунта и смена пароля)
+CREATE TABLE IF NOT EXISTS session_revocations (
+    id SERIAL PRIMARY KEY,
+    session_id VARCHAR(64),
+    user_id INTEGER REFERENCES users(id),
+    revoked_before TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_session_revocations_created_at ON session_revocations(created_at);
+CREATE INDEX IF NOT EXISTS idx_session_revocations_expires_at ON session_revocations(expires_at);
+
+COMMENT ON TABLE session_revocations IS 'Отозванные подписанные токены: session_id — один токен, revoked_before — все токены пользователя, выданные до этого момента';
@@ -0,0 +1,3 @@
+-- Составные индексы для постраничной выдачи кабинета партнёра по ключу (дата, id)
+CREATE INDEX IF NOT EXISTS idx_requests_user_created_id ON russification_requests(user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_works_user_date_id ON completed_works(user_id, work_date DESC, id DESC);
@@ -0,0 +1,77 @@
+-- Счётчики версий данных для ETag: триггеры увеличивают версию при каждой записи
+CREATE TABLE IF NOT EXISTS data_versions (
+    scope VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE data_versions IS 'Версии данных по областям: user:<id> — кабинет партнёра, admin — админка, content:<тип> — каталог';
+
+CREATE OR REPLACE FUNCTION bump_data_version(scope_name TEXT) RETURNS VOID AS $$
+    INSERT INTO data_versions (scope, version, updated_at)
+    VALUES (scope_name, 1, NOW())
+    ON CONFLICT (scope) DO UPDATE
+    SET version = data_versions.version + 1, updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Версия области, переданной аргументом триггера
+CREATE OR REPLACE FUNCTION bump_scope_version_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_data_version(TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Версия кабинета партнёра-владельца строки (старого и нового при смене владельца)
+CREATE OR REPLACE FUNCTION bump_owner_version_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL THEN
+        PERFORM bump_data_version('user:' || NEW.user_id);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.user_id IS NOT NULL
+       AND (TG_OP = 'DELETE' OR OLD.user_id IS DISTINCT FROM NEW.user_id) THEN
+        PERFORM bump_data_version('user:' || OLD.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_requests_owner_version
+AFTER INSERT OR UPDATE OR DELETE ON russification_requests
+FOR EACH ROW EXECUTE FUNCTION bump_owner_version_trigger();
+
+CREATE TRIGGER trg_works_owner_version
+AFTER INSERT OR UPDATE OR DELETE ON completed_works
+FOR EACH ROW EXECUTE FUNCTION bump_owner_version_trigger();
+
+CREATE TRIGGER trg_bonus_owner_version
+AFTER INSERT OR UPDATE OR DELETE ON bonus_transactions
+FOR EACH ROW EXECUTE FUNCTION bump_owner_version_trigger();
+
+CREATE TRIGGER trg_requests_admin_version
+AFTER INSERT OR UPDATE OR DELETE ON russification_requests
+FOR EACH ROW EXECUTE FUNCTION bump_scope_version_trigger('admin');
+
+CREATE TRIGGER trg_works_admin_version
+AFTER INSERT OR UPDATE OR DELETE ON completed_works
+FOR EACH ROW EXECUTE FUNCTION bump_scope_version_trigger('admin');
+
+CREATE TRIGGER trg_users_admin_version
+AFTER INSERT OR UPDATE OR DELETE ON users
+FOR EACH ROW EXECUTE FUNCTION bump_scope_version_trigger('admin');
+
+CREATE TRIGGER trg_messages_admin_version
+AFTER INSERT OR UPDATE OR DELETE ON request_messages
+FOR EACH ROW EXECUTE FUNCTION bump_scope_version_trigger('admin');
+
+CREATE TRIGGER trg_portfolio_works_version
+AFTER INSERT OR UPDATE OR DELETE ON portfolio_works
+FOR EACH ROW EXECUTE FUNCTION bump_scope_version_trigger('content:works');
+
+CREATE TRIGGER trg_services_version
+AFTER INSERT OR UPDATE OR DELETE ON services
+FOR EACH ROW EXECUTE FUNCTION bump_scope_version_trigger('content:services');
+
+CREATE TRIGGER trg_products_version
+AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH ROW EXECUTE FUNCTION bump_scope_version_trigger('content:products');
@@ -0,0 +1,70 @@
+-- Инкрементальная синхронизация (since=<курсор>): updated_at на всех синхронизируемых таблицах и надгробия удалённых строк
+ALTER TABLE completed_works ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+UPDATE completed_works SET updated_at = work_date WHERE work_date IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION set_updated_at_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_requests_updated_at
+BEFORE UPDATE ON russification_requests
+FOR EACH ROW EXECUTE FUNCTION set_updated_at_trigger();
+
+CREATE TRIGGER trg_works_updated_at
+BEFORE UPDATE ON completed_works
+FOR EACH ROW EXECUTE FUNCTION set_updated_at_trigger();
+
+CREATE TRIGGER trg_users_updated_at
+BEFORE UPDATE ON users
+FOR EACH ROW EXECUTE FUNCTION set_updated_at_trigger();
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id SERIAL PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    record_id INTEGER NOT NULL,
+    owner_user_id INTEGER,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE sync_tombstones IS 'Удалённые строки для инкрементальной синхронизации клиентов';
+
+CREATE OR REPLACE FUNCTION record_tombstone_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'users' THEN
+        INSERT INTO sync_tombstones (table_name, record_id, owner_user_id)
+        VALUES (TG_TABLE_NAME, OLD.id, OLD.id);
+    ELSE
+        INSERT INTO sync_tombstones (table_name, record_id, owner_user_id)
+        VALUES (TG_TABLE_NAME, OLD.id, OLD.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_requests_tombstone
+AFTER DELETE ON russification_requests
+FOR EACH ROW EXECUTE FUNCTION record_tombstone_trigger();
+
+CREATE TRIGGER trg_works_tombstone
+AFTER DELETE ON completed_works
+FOR EACH ROW EXECUTE FUNCTION record_tombstone_trigger();
+
+CREATE TRIGGER trg_bonus_tombstone
+AFTER DELETE ON bonus_transactions
+FOR EACH ROW EXECUTE FUNCTION record_tombstone_trigger();
+
+CREATE TRIGGER trg_users_tombstone
+AFTER DELETE ON users
+FOR EACH ROW EXECUTE FUNCTION record_tombstone_trigger();
+
+CREATE INDEX IF NOT EXISTS idx_requests_updated_at ON russification_requests(updated_at);
+CREATE INDEX IF NOT EXISTS idx_requests_user_updated_at ON russification_requests(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_works_updated_at ON completed_works(updated_at);
+CREATE INDEX IF NOT EXISTS idx_works_user_updated_at ON completed_works(user_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at);
+CREATE INDEX IF NOT EXISTS idx_bonus_user_created_at ON bonus_transactions(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_owner_deleted_at ON sync_tombstones(owner_user_id, deleted_at);
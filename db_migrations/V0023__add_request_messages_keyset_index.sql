@@ -0,0 +1,3 @@
+-- Постраничная загрузка чата по id (after_id / before_id); составной индекс заменяет индекс по одному request_id
+CREATE INDEX IF NOT EXISTS idx_request_messages_request_id_id ON request_messages(request_id, id);
+DROP INDEX IF EXISTS idx_request_messages_request_id;
@@ -0,0 +1,11 @@
+-- Long-poll чата: каждое новое сообщение уведомляет канал request_messages_<id заявки>, payload — id сообщения
+CREATE OR REPLACE FUNCTION notify_request_message_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('request_messages_' || NEW.request_id, NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_request_messages_notify
+AFTER INSERT ON request_messages
+FOR EACH ROW EXECUTE FUNCTION notify_request_message_trigger();
@@ -0,0 +1,17 @@
+CREATE TABLE IF NOT EXISTS file_uploads (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER,
+    object_key VARCHAR(512) NOT NULL UNIQUE,
+    file_name VARCHAR(255),
+    content_type VARCHAR(100),
+    declared_size BIGINT,
+    size BIGINT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'uploaded', 'rejected')),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    confirmed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_file_uploads_status_created_at ON file_uploads(status, created_at);
+
+COMMENT ON TABLE file_uploads IS 'Файлы, загружаемые напрямую в S3 по presigned PUT URL';
+COMMENT ON COLUMN file_uploads.status IS 'pending — URL выдан, uploaded — объект проверен через HEAD, rejected — превышен размер';
@@ -0,0 +1,30 @@
+-- Transactional outbox: уведомления Telegram пишутся в одной транзакции с сообщением, отправляет их notification-dispatcher
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id VARCHAR(64) NOT NULL,
+    method VARCHAR(64) NOT NULL DEFAULT 'sendMessage',
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending ON notification_outbox(next_attempt_at, id) WHERE status = 'pending';
+
+COMMENT ON TABLE notification_outbox IS 'Очередь исходящих сообщений Telegram';
+COMMENT ON COLUMN notification_outbox.next_attempt_at IS 'Не раньше этого момента: время повтора с backoff или аренда взятой в работу строки';
+
+-- Будит диспетчер, ожидающий новых строк через LISTEN
+CREATE OR REPLACE FUNCTION notify_notification_outbox_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('notification_outbox', NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_notification_outbox_notify
+AFTER INSERT ON notification_outbox
+FOR EACH ROW EXECUTE FUNCTION notify_notification_outbox_trigger();
@@ -0,0 +1,5 @@
+-- Приоритет в outbox: 0 — коды восстановления пароля, 10 — уведомления чата; меньше — раньше
+ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 10;
+
+DROP INDEX IF EXISTS idx_notification_outbox_pending;
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending ON notification_outbox(priority, next_attempt_at, id) WHERE status = 'pending';
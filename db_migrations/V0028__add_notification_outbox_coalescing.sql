@@ -0,0 +1,4 @@
+-- Склейка уведомлений: строки с одним coalesce_key диспетчер отправляет одним сообщением
+ALTER TABLE notification_outbox ADD COLUMN IF NOT EXISTS coalesce_key VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_coalesce_key ON notification_outbox(coalesce_key) WHERE status = 'pending';
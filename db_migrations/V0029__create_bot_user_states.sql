@@ -0,0 +1,12 @@
+-- Состояния диалогов Telegram-бота: переживают холодный старт и общие для всех экземпляров
+CREATE TABLE IF NOT EXISTS bot_user_states (
+    telegram_id BIGINT PRIMARY KEY,
+    state JSONB NOT NULL,
+    version BIGINT NOT NULL DEFAULT 1,
+    expires_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_user_states_expires_at ON bot_user_states(expires_at);
+
+COMMENT ON TABLE bot_user_states IS 'Шаг диалога бота по telegram_id; version растёт при каждом изменении, просроченные строки удаляются';
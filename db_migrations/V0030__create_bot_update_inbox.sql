@@ -0,0 +1,29 @@
+-- Входящие апдейты Telegram: вебхук сохраняет их и сразу отвечает 200, обрабатывает воркер (?action=process_updates)
+CREATE TABLE IF NOT EXISTS bot_update_inbox (
+    id BIGSERIAL PRIMARY KEY,
+    update_id BIGINT,
+    chat_id BIGINT,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_update_inbox_pending ON bot_update_inbox(chat_id, id) WHERE status = 'pending';
+
+COMMENT ON TABLE bot_update_inbox IS 'Очередь входящих апдейтов бота; апдейты одного чата обрабатываются строго по id';
+
+-- Будит воркер, ожидающий новых апдейтов через LISTEN
+CREATE OR REPLACE FUNCTION notify_bot_update_inbox_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('bot_update_inbox', NEW.id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_bot_update_inbox_notify
+AFTER INSERT ON bot_update_inbox
+FOR EACH ROW EXECUTE FUNCTION notify_bot_update_inbox_trigger();
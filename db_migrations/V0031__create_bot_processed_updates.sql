@@ -0,0 +1,9 @@
+-- update_id уже принятых апдейтов: повторная доставка Telegram отбрасывается до обработки
+CREATE TABLE IF NOT EXISTS bot_processed_updates (
+    update_id BIGINT PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_bot_processed_updates_created_at ON bot_processed_updates(created_at);
+
+COMMENT ON TABLE bot_processed_updates IS 'Окно дедупликации апдейтов бота; строки старше UPDATE_DEDUP_TTL удаляются';
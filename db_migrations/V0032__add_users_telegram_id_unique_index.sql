@@ -0,0 +1,30 @@
+-- Один пользователь на Telegram ID: при дублях (как в V0015) привязка остаётся у последнего созданного пользователя.
+-- Снятые привязки сохраняются в users_telegram_id_conflicts — оператор может проверить и перепривязать вручную
+CREATE TABLE IF NOT EXISTS users_telegram_id_conflicts AS
+SELECT u.id AS user_id,
+       u.telegram_id,
+       (SELECT MAX(o.id) FROM users o WHERE o.telegram_id = u.telegram_id) AS kept_user_id,
+       CURRENT_TIMESTAMP AS unlinked_at
+FROM users u
+WHERE u.telegram_id IS NOT NULL
+  AND EXISTS (SELECT 1 FROM users o WHERE o.telegram_id = u.telegram_id AND o.id > u.id);
+
+COMMENT ON TABLE users_telegram_id_conflicts IS 'Привязки Telegram, снятые V0032 перед созданием уникального индекса: user_id потерял telegram_id в пользу kept_user_id';
+
+DO $$
+DECLARE
+    conflicts INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO conflicts FROM users_telegram_id_conflicts;
+    IF conflicts > 0 THEN
+        RAISE WARNING 'V0032: % дублирующих привязок telegram_id снято, см. users_telegram_id_conflicts', conflicts;
+    END IF;
+END;
+$$;
+
+UPDATE users u SET telegram_id = NULL
+FROM users_telegram_id_conflicts c
+WHERE c.user_id = u.id AND u.telegram_id = c.telegram_id;
+
+-- Поиск пользователя бота по telegram_id (каждый /start, меню, заявки) без seq scan
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id) WHERE telegram_id IS NOT NULL;
@@ -0,0 +1,16 @@
+-- Постраничные списки админки по ключу (дата, id) с фильтрами: заявки по статусу и типу услуги, пользователи по роли, работы по выплате бонуса
+CREATE INDEX IF NOT EXISTS idx_requests_created_id ON russification_requests(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_status_created_id ON russification_requests(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_requests_service_created_id ON russification_requests(service_type, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_role_created_id ON users(user_role, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_works_date_id ON completed_works(work_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_works_bonus_paid_date_id ON completed_works(is_bonus_paid, work_date DESC, id DESC);
+
+-- Заменены составными индексами выше
+DROP INDEX IF EXISTS idx_requests_created_at;
+DROP INDEX IF EXISTS idx_requests_status;
+DROP INDEX IF EXISTS idx_works_date;
+DROP INDEX IF EXISTS idx_works_bonus_paid;
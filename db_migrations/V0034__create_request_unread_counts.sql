@@ -0,0 +1,86 @@
+-- Счётчик непрочитанных админом сообщений клиента по заявке: ведут триггеры request_messages, списки читают его вместо агрегации чата.
+-- Отдельная таблица, а не колонка заявки: изменение счётчика не трогает updated_at и версии кабинета партнёра
+CREATE TABLE IF NOT EXISTS request_unread_counts (
+    request_id INTEGER PRIMARY KEY REFERENCES russification_requests(id) ON DELETE CASCADE,
+    unread_client_count INTEGER NOT NULL DEFAULT 0
+);
+
+COMMENT ON TABLE request_unread_counts IS 'Непрочитанные сообщения клиента (sender_type = client, is_read = FALSE) по заявке';
+
+INSERT INTO request_unread_counts (request_id, unread_client_count)
+SELECT m.request_id, COUNT(*)
+FROM request_messages m
+JOIN russification_requests r ON r.id = m.request_id
+WHERE m.sender_type = 'client' AND m.is_read = FALSE
+GROUP BY m.request_id
+ON CONFLICT (request_id) DO UPDATE SET unread_client_count = EXCLUDED.unread_client_count;
+
+-- Прибавить к счётчикам заявок разницу непрочитанных (отрицательную — при прочтении или удалении)
+CREATE OR REPLACE FUNCTION apply_request_unread_delta(p_request_ids INTEGER[], p_diffs BIGINT[]) RETURNS VOID AS $$
+    INSERT INTO request_unread_counts (request_id, unread_client_count)
+    SELECT d.request_id, 0
+    FROM unnest(p_request_ids) AS d(request_id)
+    JOIN russification_requests r ON r.id = d.request_id
+    ON CONFLICT (request_id) DO NOTHING;
+
+    UPDATE request_unread_counts c
+    SET unread_client_count = GREATEST(c.unread_client_count + d.diff, 0)
+    FROM unnest(p_request_ids, p_diffs) AS d(request_id, diff)
+    WHERE c.request_id = d.request_id;
+$$ LANGUAGE sql;
+
+-- Триггеры уровня оператора: пометка всего чата прочитанным — одно обновление счётчика, а не по строке
+CREATE OR REPLACE FUNCTION request_unread_counts_trigger() RETURNS TRIGGER AS $$
+DECLARE
+    ids INTEGER[];
+    diffs BIGINT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(request_id), array_agg(diff) INTO ids, diffs
+        FROM (
+            SELECT request_id, COUNT(*) AS diff FROM new_rows
+            WHERE sender_type = 'client' AND is_read = FALSE
+            GROUP BY request_id
+        ) delta;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(request_id), array_agg(diff) INTO ids, diffs
+        FROM (
+            SELECT request_id, SUM(diff) AS diff
+            FROM (
+                SELECT request_id, 1 AS diff FROM new_rows WHERE sender_type = 'client' AND is_read = FALSE
+                UNION ALL
+                SELECT request_id, -1 AS diff FROM old_rows WHERE sender_type = 'client' AND is_read = FALSE
+            ) changes
+            GROUP BY request_id
+            HAVING SUM(diff) <> 0
+        ) delta;
+    ELSE
+        SELECT array_agg(request_id), array_agg(-diff) INTO ids, diffs
+        FROM (
+            SELECT request_id, COUNT(*) AS diff FROM old_rows
+            WHERE sender_type = 'client' AND is_read = FALSE
+            GROUP BY request_id
+        ) delta;
+    END IF;
+
+    IF ids IS NOT NULL THEN
+        PERFORM apply_request_unread_delta(ids, diffs);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_request_messages_unread_insert
+AFTER INSERT ON request_messages
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION request_unread_counts_trigger();
+
+CREATE TRIGGER trg_request_messages_unread_update
+AFTER UPDATE ON request_messages
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION request_unread_counts_trigger();
+
+CREATE TRIGGER trg_request_messages_unread_delete
+AFTER DELETE ON request_messages
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION request_unread_counts_trigger();
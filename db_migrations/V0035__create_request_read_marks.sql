@@ -0,0 +1,137 @@
+-- Отметка прочитанного по заявке для каждой стороны: вместо перезаписи is_read у каждого сообщения — один upsert last_read_message_id.
+-- Непрочитанные — сообщения другой стороны с id больше отметки; request_unread_counts теперь хранит оба счётчика
+CREATE TABLE IF NOT EXISTS request_read_marks (
+    request_id INTEGER NOT NULL REFERENCES russification_requests(id) ON DELETE CASCADE,
+    reader VARCHAR(20) NOT NULL CHECK (reader IN ('admin', 'client')),
+    last_read_message_id INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (request_id, reader)
+);
+
+COMMENT ON TABLE request_read_marks IS 'Последнее прочитанное сообщение заявки: admin читает сообщения клиента, client — ответы компании';
+
+-- Админ: отметка перед первым непрочитанным сообщением клиента (или на последнем сообщении, если всё прочитано)
+INSERT INTO request_read_marks (request_id, reader, last_read_message_id)
+SELECT m.request_id, 'admin',
+       COALESCE(MIN(m.id) FILTER (WHERE m.sender_type = 'client' AND m.is_read = FALSE) - 1, MAX(m.id))
+FROM request_messages m
+JOIN russification_requests r ON r.id = m.request_id
+GROUP BY m.request_id
+ON CONFLICT (request_id, reader) DO NOTHING;
+
+-- Клиент: прочитанной считается вся существующая переписка — счётчики появляются только для новых ответов
+INSERT INTO request_read_marks (request_id, reader, last_read_message_id)
+SELECT m.request_id, 'client', MAX(m.id)
+FROM request_messages m
+JOIN russification_requests r ON r.id = m.request_id
+GROUP BY m.request_id
+ON CONFLICT (request_id, reader) DO NOTHING;
+
+ALTER TABLE request_unread_counts ADD COLUMN IF NOT EXISTS unread_company_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE request_unread_counts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+COMMENT ON COLUMN request_unread_counts.unread_client_count IS 'Сообщения клиента после отметки admin';
+COMMENT ON COLUMN request_unread_counts.unread_company_count IS 'Ответы компании после отметки client';
+
+-- is_read больше не пишется: счётчики меняются при новых сообщениях и при сдвиге отметки
+DROP TRIGGER IF EXISTS trg_request_messages_unread_insert ON request_messages;
+DROP TRIGGER IF EXISTS trg_request_messages_unread_update ON request_messages;
+DROP TRIGGER IF EXISTS trg_request_messages_unread_delete ON request_messages;
+DROP FUNCTION IF EXISTS request_unread_counts_trigger();
+DROP FUNCTION IF EXISTS apply_request_unread_delta(INTEGER[], BIGINT[]);
+
+-- Пересчитать оба счётчика заявок по отметкам: читается только хвост чата после отметки (индекс request_id, id)
+CREATE OR REPLACE FUNCTION refresh_request_unread_counts(p_request_ids INTEGER[]) RETURNS VOID AS $$
+    INSERT INTO request_unread_counts (request_id, unread_client_count, unread_company_count, updated_at)
+    SELECT r.id,
+           (SELECT COUNT(*) FROM request_messages m
+            WHERE m.request_id = r.id AND m.sender_type = 'client'
+              AND m.id > COALESCE((SELECT last_read_message_id FROM request_read_marks WHERE request_id = r.id AND reader = 'admin'), 0)),
+           (SELECT COUNT(*) FROM request_messages m
+            WHERE m.request_id = r.id AND m.sender_type = 'company'
+              AND m.id > COALESCE((SELECT last_read_message_id FROM request_read_marks WHERE request_id = r.id AND reader = 'client'), 0)),
+           NOW()
+    FROM russification_requests r
+    WHERE r.id = ANY(p_request_ids)
+    ON CONFLICT (request_id) DO UPDATE
+    SET unread_client_count = EXCLUDED.unread_client_count,
+        unread_company_count = EXCLUDED.unread_company_count,
+        updated_at = NOW()
+    WHERE (request_unread_counts.unread_client_count, request_unread_counts.unread_company_count)
+          IS DISTINCT FROM (EXCLUDED.unread_client_count, EXCLUDED.unread_company_count);
+$$ LANGUAGE sql;
+
+SELECT refresh_request_unread_counts(ARRAY(SELECT id FROM russification_requests));
+
+-- Новые сообщения: прибавить к счётчику стороны-получателя одним обновлением на оператор
+CREATE OR REPLACE FUNCTION request_messages_unread_insert_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO request_unread_counts (request_id, unread_client_count, unread_company_count, updated_at)
+    SELECT n.request_id,
+           COUNT(*) FILTER (WHERE n.sender_type = 'client'),
+           COUNT(*) FILTER (WHERE n.sender_type = 'company'),
+           NOW()
+    FROM new_rows n
+    JOIN russification_requests r ON r.id = n.request_id
+    GROUP BY n.request_id
+    ON CONFLICT (request_id) DO UPDATE
+    SET unread_client_count = request_unread_counts.unread_client_count + EXCLUDED.unread_client_count,
+        unread_company_count = request_unread_counts.unread_company_count + EXCLUDED.unread_company_count,
+        updated_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_request_messages_unread_insert
+AFTER INSERT ON request_messages
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION request_messages_unread_insert_trigger();
+
+-- Удалённые сообщения: пересчитать затронутые заявки по отметкам
+CREATE OR REPLACE FUNCTION request_messages_unread_delete_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_request_unread_counts(ARRAY(SELECT DISTINCT request_id FROM old_rows));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_request_messages_unread_delete
+AFTER DELETE ON request_messages
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION request_messages_unread_delete_trigger();
+
+-- Сдвиг отметки: пересчитать счётчики заявки
+CREATE OR REPLACE FUNCTION request_read_marks_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_request_unread_counts(ARRAY[NEW.request_id]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_request_read_marks_refresh
+AFTER INSERT OR UPDATE ON request_read_marks
+FOR EACH ROW EXECUTE FUNCTION request_read_marks_trigger();
+
+-- Счётчики видны в списках: админке — непрочитанные клиента, кабинету партнёра — ответы компании
+CREATE OR REPLACE FUNCTION request_unread_counts_version_trigger() RETURNS TRIGGER AS $$
+DECLARE
+    owner_id INTEGER;
+BEGIN
+    IF TG_OP = 'INSERT' OR NEW.unread_client_count IS DISTINCT FROM OLD.unread_client_count THEN
+        PERFORM bump_data_version('admin');
+    END IF;
+    IF TG_OP = 'INSERT' OR NEW.unread_company_count IS DISTINCT FROM OLD.unread_company_count THEN
+        SELECT user_id INTO owner_id FROM russification_requests WHERE id = NEW.request_id;
+        IF owner_id IS NOT NULL THEN
+            PERFORM bump_data_version('user:' || owner_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_request_unread_counts_version
+AFTER INSERT OR UPDATE ON request_unread_counts
+FOR EACH ROW EXECUTE FUNCTION request_unread_counts_version_trigger();
+
+CREATE INDEX IF NOT EXISTS idx_request_unread_counts_updated_at ON request_unread_counts(updated_at);
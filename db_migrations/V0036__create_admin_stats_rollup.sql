@@ -0,0 +1,104 @@
+-- Сводка для KPI админки по дню, статусу и партнёру: триггеры прибавляют разницу при каждой записи заявок и работ,
+-- так что ?action=stats суммирует строки сводки, а не всю историю.
+-- Показатели работ хранятся под статусом 'completed' (работа создаётся при завершении заявки); partner_id = 0 — без партнёра
+CREATE TABLE IF NOT EXISTS admin_stats_rollup (
+    day DATE NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    partner_id INTEGER NOT NULL DEFAULT 0,
+    request_count INTEGER NOT NULL DEFAULT 0,
+    work_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    bonus_earned BIGINT NOT NULL DEFAULT 0,
+    unpaid_work_count INTEGER NOT NULL DEFAULT 0,
+    unpaid_bonus BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status, partner_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_admin_stats_rollup_partner_day ON admin_stats_rollup(partner_id, day);
+
+COMMENT ON TABLE admin_stats_rollup IS 'Инкрементальная сводка заявок и выполненных работ для статистики админки';
+
+CREATE OR REPLACE FUNCTION apply_admin_stats(
+    p_day DATE, p_status VARCHAR, p_partner_id INTEGER,
+    p_requests INTEGER, p_works INTEGER, p_revenue DECIMAL, p_bonus BIGINT, p_unpaid_works INTEGER, p_unpaid_bonus BIGINT
+) RETURNS VOID AS $$
+    INSERT INTO admin_stats_rollup (day, status, partner_id, request_count, work_count, revenue, bonus_earned, unpaid_work_count, unpaid_bonus)
+    VALUES (COALESCE(p_day, DATE '1970-01-01'), COALESCE(p_status, 'pending'), COALESCE(p_partner_id, 0),
+            p_requests, p_works, p_revenue, p_bonus, p_unpaid_works, p_unpaid_bonus)
+    ON CONFLICT (day, status, partner_id) DO UPDATE
+    SET request_count = admin_stats_rollup.request_count + EXCLUDED.request_count,
+        work_count = admin_stats_rollup.work_count + EXCLUDED.work_count,
+        revenue = admin_stats_rollup.revenue + EXCLUDED.revenue,
+        bonus_earned = admin_stats_rollup.bonus_earned + EXCLUDED.bonus_earned,
+        unpaid_work_count = admin_stats_rollup.unpaid_work_count + EXCLUDED.unpaid_work_count,
+        unpaid_bonus = admin_stats_rollup.unpaid_bonus + EXCLUDED.unpaid_bonus;
+$$ LANGUAGE sql;
+
+-- Заявка: -1 в старой ячейке (день создания, статус, партнёр), +1 в новой
+CREATE OR REPLACE FUNCTION admin_stats_requests_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.created_at::date IS NOT DISTINCT FROM NEW.created_at::date
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.user_id IS NOT DISTINCT FROM NEW.user_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_admin_stats(OLD.created_at::date, OLD.status, OLD.user_id, -1, 0, 0, 0, 0, 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_admin_stats(NEW.created_at::date, NEW.status, NEW.user_id, 1, 0, 0, 0, 0, 0);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_requests_admin_stats
+AFTER INSERT OR UPDATE OR DELETE ON russification_requests
+FOR EACH ROW EXECUTE FUNCTION admin_stats_requests_trigger();
+
+-- Работа: вычесть вклад старой версии строки и прибавить вклад новой (стоимость, бонус, невыплаченные)
+CREATE OR REPLACE FUNCTION admin_stats_works_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_admin_stats(
+            OLD.work_date::date, 'completed', OLD.user_id, 0, -1, -OLD.work_cost, -COALESCE(OLD.bonus_earned, 0),
+            CASE WHEN COALESCE(OLD.is_bonus_paid, FALSE) THEN 0 ELSE -1 END,
+            CASE WHEN COALESCE(OLD.is_bonus_paid, FALSE) THEN 0 ELSE -COALESCE(OLD.bonus_earned, 0) END
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_admin_stats(
+            NEW.work_date::date, 'completed', NEW.user_id, 0, 1, NEW.work_cost, COALESCE(NEW.bonus_earned, 0),
+            CASE WHEN COALESCE(NEW.is_bonus_paid, FALSE) THEN 0 ELSE 1 END,
+            CASE WHEN COALESCE(NEW.is_bonus_paid, FALSE) THEN 0 ELSE COALESCE(NEW.bonus_earned, 0) END
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_works_admin_stats
+AFTER INSERT OR UPDATE OF work_date, user_id, work_cost, bonus_earned, is_bonus_paid OR DELETE ON completed_works
+FOR EACH ROW EXECUTE FUNCTION admin_stats_works_trigger();
+
+-- Начальное заполнение из истории
+INSERT INTO admin_stats_rollup (day, status, partner_id, request_count)
+SELECT COALESCE(created_at::date, DATE '1970-01-01'), COALESCE(status, 'pending'), COALESCE(user_id, 0), COUNT(*)
+FROM russification_requests
+GROUP BY 1, 2, 3
+ON CONFLICT (day, status, partner_id) DO UPDATE SET request_count = EXCLUDED.request_count;
+
+INSERT INTO admin_stats_rollup (day, status, partner_id, work_count, revenue, bonus_earned, unpaid_work_count, unpaid_bonus)
+SELECT COALESCE(work_date::date, DATE '1970-01-01'), 'completed', COALESCE(user_id, 0),
+       COUNT(*), SUM(work_cost), SUM(COALESCE(bonus_earned, 0)),
+       COUNT(*) FILTER (WHERE NOT COALESCE(is_bonus_paid, FALSE)),
+       COALESCE(SUM(COALESCE(bonus_earned, 0)) FILTER (WHERE NOT COALESCE(is_bonus_paid, FALSE)), 0)
+FROM completed_works
+GROUP BY 1, 2, 3
+ON CONFLICT (day, status, partner_id) DO UPDATE
+SET work_count = EXCLUDED.work_count,
+    revenue = EXCLUDED.revenue,
+    bonus_earned = EXCLUDED.bonus_earned,
+    unpaid_work_count = EXCLUDED.unpaid_work_count,
+    unpaid_bonus = EXCLUDED.unpaid_bonus;
@@ -0,0 +1,49 @@
+-- Версия области — сумма нескольких строк-шардов: параллельные записи увеличивают разные строки и не ждут
+-- блокировку одной строки 'admin' до коммита. Сумма растёт только вместе с коммитом, поэтому ETag остаётся точным
+ALTER TABLE data_versions ADD COLUMN IF NOT EXISTS shard SMALLINT NOT NULL DEFAULT 0;
+
+ALTER TABLE data_versions DROP CONSTRAINT IF EXISTS data_versions_pkey;
+ALTER TABLE data_versions ADD PRIMARY KEY (scope, shard);
+
+COMMENT ON COLUMN data_versions.shard IS 'Шард счётчика: pg_backend_pid() % 16; версия области — SUM(version) по шардам';
+
+CREATE OR REPLACE FUNCTION bump_data_version(scope_name TEXT) RETURNS VOID AS $$
+    INSERT INTO data_versions (scope, shard, version, updated_at)
+    VALUES (scope_name, pg_backend_pid() % 16, 1, NOW())
+    ON CONFLICT (scope, shard) DO UPDATE
+    SET version = data_versions.version + 1, updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Областям без владельца достаточно одного увеличения на оператор, а не на строку
+DROP TRIGGER IF EXISTS trg_requests_admin_version ON russification_requests;
+CREATE TRIGGER trg_requests_admin_version
+AFTER INSERT OR UPDATE OR DELETE ON russification_requests
+FOR EACH STATEMENT EXECUTE FUNCTION bump_scope_version_trigger('admin');
+
+DROP TRIGGER IF EXISTS trg_works_admin_version ON completed_works;
+CREATE TRIGGER trg_works_admin_version
+AFTER INSERT OR UPDATE OR DELETE ON completed_works
+FOR EACH STATEMENT EXECUTE FUNCTION bump_scope_version_trigger('admin');
+
+DROP TRIGGER IF EXISTS trg_users_admin_version ON users;
+CREATE TRIGGER trg_users_admin_version
+AFTER INSERT OR UPDATE OR DELETE ON users
+FOR EACH STATEMENT EXECUTE FUNCTION bump_scope_version_trigger('admin');
+
+DROP TRIGGER IF EXISTS trg_portfolio_works_version ON portfolio_works;
+CREATE TRIGGER trg_portfolio_works_version
+AFTER INSERT OR UPDATE OR DELETE ON portfolio_works
+FOR EACH STATEMENT EXECUTE FUNCTION bump_scope_version_trigger('content:works');
+
+DROP TRIGGER IF EXISTS trg_services_version ON services;
+CREATE TRIGGER trg_services_version
+AFTER INSERT OR UPDATE OR DELETE ON services
+FOR EACH STATEMENT EXECUTE FUNCTION bump_scope_version_trigger('content:services');
+
+DROP TRIGGER IF EXISTS trg_products_version ON products;
+CREATE TRIGGER trg_products_version
+AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH STATEMENT EXECUTE FUNCTION bump_scope_version_trigger('content:products');
+
+-- Сами сообщения в админке не кэшируются по версии; непрочитанные в списках версию увеличивает request_unread_counts
+DROP TRIGGER IF EXISTS trg_messages_admin_version ON request_messages;
@@ -0,0 +1,3 @@
+-- Очистка outbox: диспетчер удаляет отправленные строки старше OUTBOX_SENT_RETENTION_DAYS и failed старше OUTBOX_FAILED_RETENTION_DAYS
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_sent_at ON notification_outbox(sent_at) WHERE status = 'sent';
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_failed_created_at ON notification_outbox(created_at) WHERE status = 'failed';
@@ -0,0 +1,2 @@
+-- Очистка inbox бота: обработанные апдейты хранятся INBOX_DONE_RETENTION_HOURS, failed — INBOX_FAILED_RETENTION_DAYS
+CREATE INDEX IF NOT EXISTS idx_bot_update_inbox_processed_at ON bot_update_inbox(processed_at) WHERE status IN ('done', 'failed');
@@ -0,0 +1,37 @@
+-- Пересчёт счётчиков сначала блокирует их строки, затем считает: подсчёт отдельным оператором видит все
+-- прибавки уже закоммиченных вставок, а новые вставки ждут блокировку и прибавляют к пересчитанному значению.
+-- Раньше upsert перезаписывал счётчик значением из снимка оператора и терял параллельную прибавку
+CREATE OR REPLACE FUNCTION refresh_request_unread_counts(p_request_ids INTEGER[]) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO request_unread_counts (request_id, unread_client_count, unread_company_count, updated_at)
+    SELECT r.id, 0, 0, NOW()
+    FROM russification_requests r
+    WHERE r.id = ANY(p_request_ids)
+    ON CONFLICT (request_id) DO NOTHING;
+
+    -- Порядок по request_id — параллельные пересчёты нескольких заявок не встают в deadlock
+    PERFORM 1 FROM request_unread_counts
+    WHERE request_id = ANY(p_request_ids)
+    ORDER BY request_id
+    FOR UPDATE;
+
+    UPDATE request_unread_counts c
+    SET unread_client_count = n.unread_client_count,
+        unread_company_count = n.unread_company_count,
+        updated_at = NOW()
+    FROM (
+        SELECT r.id AS request_id,
+               (SELECT COUNT(*) FROM request_messages m
+                WHERE m.request_id = r.id AND m.sender_type = 'client'
+                  AND m.id > COALESCE((SELECT last_read_message_id FROM request_read_marks WHERE request_id = r.id AND reader = 'admin'), 0)) AS unread_client_count,
+               (SELECT COUNT(*) FROM request_messages m
+                WHERE m.request_id = r.id AND m.sender_type = 'company'
+                  AND m.id > COALESCE((SELECT last_read_message_id FROM request_read_marks WHERE request_id = r.id AND reader = 'client'), 0)) AS unread_company_count
+        FROM russification_requests r
+        WHERE r.id = ANY(p_request_ids)
+    ) n
+    WHERE c.request_id = n.request_id
+      AND (c.unread_client_count, c.unread_company_count)
+          IS DISTINCT FROM (n.unread_client_count, n.unread_company_count);
+END;
+$$ LANGUAGE plpgsql;
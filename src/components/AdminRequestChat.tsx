@@ -3,6 +3,11 @@ import { Button } from '@/components/ui/button'
 import { Card, CardContent } from '@/components/ui/card'
 import { useToast } from '@/hooks/use-toast'
 import Icon from '@/components/ui/icon'
+import { uploadFile } from '@/lib/upload'
+
+const MESSAGES_PAGE_SIZE = 50
+const LONG_POLL_WAIT = 20
+const POLL_RETRY_DELAY = 5000
 
 interface Message {
   id: number
@@ -24,18 +29,24 @@ export const AdminRequestChat = ({ requestId }: AdminRequestChatProps) => {
   const [selectedFile, setSelectedFile] = useState<File | null>(null)
   const [isLoading, setIsLoading] = useState(true)
   const [isSending, setIsSending] = useState(false)
+  const [hasMore, setHasMore] = useState(false)
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false)
   const messagesEndRef = useRef<HTMLDivElement>(null)
+  const scrollRef = useRef<HTMLDivElement>(null)
+  const lastIdRef = useRef(0)
   const textareaRef = useRef<HTMLTextAreaElement>(null)
   const fileInputRef = useRef<HTMLInputElement>(null)
   const { toast } = useToast()
 
   useEffect(() => {
-    loadMessages()
+    const controller = new AbortController()
+    loadMessages().then(() => pollNewMessages(controller.signal))
+    return () => controller.abort()
   }, [requestId])
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
-  }, [messages])
+  }, [messages[messages.length - 1]?.id])
 
   useEffect(() => {
     if (textareaRef.current) {
@@ -50,7 +61,7 @@ export const AdminRequestChat = ({ requestId }: AdminRequestChatProps) => {
 
     try {
       const response = await fetch(
-        `https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28?action=messages&request_id=${requestId}`,
+        `https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28?action=messages&request_id=${requestId}&limit=${MESSAGES_PAGE_SIZE}`,
         {
           headers: {
             'Authorization': `Bearer ${token}`,
@@ -60,7 +71,10 @@ export const AdminRequestChat = ({ requestId }: AdminRequestChatProps) => {
 
       if (response.ok) {
         const data = await response.json()
-        setMessages(data.messages || [])
+        const loaded: Message[] = data.messages || []
+        lastIdRef.current = loaded[loaded.length - 1]?.id ?? 0
+        setMessages(loaded)
+        setHasMore(Boolean(data.has_more))
       } else {
         toast({
           title: 'Ошибка',
@@ -79,13 +93,92 @@ export const AdminRequestChat = ({ requestId }: AdminRequestChatProps) => {
     }
   }
 
+  const fetchMessagesPage = async (params: string) => {
+    const token = localStorage.getItem('authToken')
+    const response = await fetch(
+      `https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28?action=messages&request_id=${requestId}&limit=${MESSAGES_PAGE_SIZE}&${params}`,
+      {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        },
+      }
+    )
+    if (!response.ok) throw new Error('Не удалось загрузить сообщения')
+    return response.json()
+  }
+
+  const appendMessages = (fresh: Message[]) => {
+    if (fresh.length === 0) return
+    lastIdRef.current = Math.max(lastIdRef.current, fresh[fresh.length - 1].id)
+    setMessages((prev) => [...prev, ...fresh.filter((m) => m.id > (prev[prev.length - 1]?.id ?? 0))])
+  }
+
+  const pollNewMessages = async (signal: AbortSignal) => {
+    while (!signal.aborted) {
+      const token = localStorage.getItem('authToken')
+      try {
+        const response = await fetch(
+          `https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28?action=messages&request_id=${requestId}&after_id=${lastIdRef.current}&limit=${MESSAGES_PAGE_SIZE}&wait=${LONG_POLL_WAIT}`,
+          {
+            headers: {
+              'Authorization': `Bearer ${token}`,
+            },
+            signal,
+          }
+        )
+        if (!response.ok) throw new Error('Не удалось загрузить сообщения')
+        const data = await response.json()
+        appendMessages(data.messages || [])
+      } catch (error) {
+        if (signal.aborted) return
+        await new Promise((resolve) => setTimeout(resolve, POLL_RETRY_DELAY))
+      }
+    }
+  }
+
+  const loadNewMessages = async () => {
+    if (!lastIdRef.current) return loadMessages()
+
+    try {
+      const data = await fetchMessagesPage(`after_id=${lastIdRef.current}`)
+      appendMessages(data.messages || [])
+      if (data.has_more) await loadMessages()
+    } catch (error) {
+      console.error('Ошибка загрузки сообщений:', error)
+    }
+  }
+
+  const loadOlderMessages = async () => {
+    if (!hasMore || isLoadingOlder || messages.length === 0) return
+    setIsLoadingOlder(true)
+    const container = scrollRef.current
+    const prevHeight = container?.scrollHeight ?? 0
+
+    try {
+      const data = await fetchMessagesPage(`before_id=${messages[0].id}`)
+      setMessages((prev) => [...(data.messages || []), ...prev])
+      setHasMore(Boolean(data.has_more))
+      requestAnimationFrame(() => {
+        if (container) container.scrollTop += container.scrollHeight - prevHeight
+      })
+    } catch (error) {
+      console.error('Ошибка загрузки сообщений:', error)
+    } finally {
+      setIsLoadingOlder(false)
+    }
+  }
+
+  const handleScroll = (e: React.UIEvent<HTMLDivElement>) => {
+    if (e.currentTarget.scrollTop < 40) loadOlderMessages()
+  }
+
   const handleFileSelect = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0]
     if (file) {
-      if (file.size > 10 * 1024 * 1024) {
+      if (file.size > 50 * 1024 * 1024) {
         toast({
           title: 'Ошибка',
-          description: 'Файл слишком большой (максимум 10 МБ)',
+          description: 'Файл слишком большой (максимум 50 МБ)',
           variant: 'destructive',
         })
         return
@@ -106,20 +199,12 @@ export const AdminRequestChat = ({ requestId }: AdminRequestChatProps) => {
       }
 
       if (selectedFile) {
-        const reader = new FileReader()
-        const fileBase64 = await new Promise<string>((resolve) => {
-          reader.onload = () => {
-            const base64 = (reader.result as string).split(',')[1]
-            resolve(base64)
-          }
-          reader.readAsDataURL(selectedFile)
-        })
-
-        messageData.file = {
-          content: fileBase64,
-          name: selectedFile.name,
-          type: selectedFile.type,
-        }
+        const upload = await uploadFile(
+          'https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28',
+          selectedFile,
+          token
+        )
+        messageData.upload_id = upload.upload_id
       }
 
       const response = await fetch(
@@ -139,7 +224,7 @@ export const AdminRequestChat = ({ requestId }: AdminRequestChatProps) => {
         setSelectedFile(null)
         if (fileInputRef.current) fileInputRef.current.value = ''
         if (textareaRef.current) textareaRef.current.style.height = 'auto'
-        loadMessages()
+        loadNewMessages()
       } else {
         const error = await response.json()
         toast({
@@ -168,7 +253,12 @@ export const AdminRequestChat = ({ requestId }: AdminRequestChatProps) => {
 
   return (
     <div className="flex flex-col flex-1 min-h-0">
-      <div className="flex-1 overflow-y-auto p-3 sm:p-4 space-y-3 overscroll-contain">
+      <div ref={scrollRef} onScroll={handleScroll} className="flex-1 overflow-y-auto p-3 sm:p-4 space-y-3 overscroll-contain">
+        {isLoadingOlder && (
+          <div className="flex justify-center">
+            <Icon name="Loader" className="h-5 w-5 animate-spin" />
+          </div>
+        )}
         {isLoading ? (
           <div className="flex items-center justify-center min-h-[200px]">
             <Icon name="Loader" className="h-8 w-8 animate-spin" />
@@ -2,6 +2,11 @@ import { useState, useEffect, useRef } from 'react';
 import { Button } from '@/components/ui/button';
 import { useToast } from '@/hooks/use-toast';
 import Icon from '@/components/ui/icon';
+import { uploadFile } from '@/lib/upload';
+
+const MESSAGES_PAGE_SIZE = 50;
+const LONG_POLL_WAIT = 20;
+const POLL_RETRY_DELAY = 5000;
 
 interface Message {
   id: number;
@@ -25,17 +30,23 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
   const [isLoading, setIsLoading] = useState(false);
   const [isSending, setIsSending] = useState(false);
   const fileInputRef = useRef<HTMLInputElement>(null);
+  const [hasMore, setHasMore] = useState(false);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const scrollRef = useRef<HTMLDivElement>(null);
+  const lastIdRef = useRef(0);
   const textareaRef = useRef<HTMLTextAreaElement>(null);
   const { toast } = useToast();
 
   useEffect(() => {
-    loadMessages();
+    const controller = new AbortController();
+    loadMessages().then(() => pollNewMessages(controller.signal));
+    return () => controller.abort();
   }, [requestId]);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [messages]);
+  }, [messages[messages.length - 1]?.id]);
 
   useEffect(() => {
     if (textareaRef.current) {
@@ -50,7 +61,7 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
 
     try {
       const response = await fetch(
-        `https://functions.poehali.dev/08452dc9-363d-4b0e-b976-d796d2cc8717?action=messages&request_id=${requestId}`,
+        `https://functions.poehali.dev/08452dc9-363d-4b0e-b976-d796d2cc8717?action=messages&request_id=${requestId}&limit=${MESSAGES_PAGE_SIZE}`,
         {
           method: 'GET',
           headers: {
@@ -61,7 +72,10 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
 
       if (response.ok) {
         const data = await response.json();
-        setMessages(data.messages || []);
+        const loaded: Message[] = data.messages || [];
+        lastIdRef.current = loaded[loaded.length - 1]?.id ?? 0;
+        setMessages(loaded);
+        setHasMore(Boolean(data.has_more));
       }
     } catch (error) {
       console.error('Ошибка загрузки сообщений:', error);
@@ -70,13 +84,92 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
     }
   };
 
+  const fetchMessagesPage = async (params: string) => {
+    const token = localStorage.getItem('authToken');
+    const response = await fetch(
+      `https://functions.poehali.dev/08452dc9-363d-4b0e-b976-d796d2cc8717?action=messages&request_id=${requestId}&limit=${MESSAGES_PAGE_SIZE}&${params}`,
+      {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        },
+      }
+    );
+    if (!response.ok) throw new Error('Не удалось загрузить сообщения');
+    return response.json();
+  };
+
+  const appendMessages = (fresh: Message[]) => {
+    if (fresh.length === 0) return;
+    lastIdRef.current = Math.max(lastIdRef.current, fresh[fresh.length - 1].id);
+    setMessages((prev) => [...prev, ...fresh.filter((m) => m.id > (prev[prev.length - 1]?.id ?? 0))]);
+  };
+
+  const pollNewMessages = async (signal: AbortSignal) => {
+    while (!signal.aborted) {
+      const token = localStorage.getItem('authToken');
+      try {
+        const response = await fetch(
+          `https://functions.poehali.dev/08452dc9-363d-4b0e-b976-d796d2cc8717?action=messages&request_id=${requestId}&after_id=${lastIdRef.current}&limit=${MESSAGES_PAGE_SIZE}&wait=${LONG_POLL_WAIT}`,
+          {
+            headers: {
+              'Authorization': `Bearer ${token}`,
+            },
+            signal,
+          }
+        );
+        if (!response.ok) throw new Error('Не удалось загрузить сообщения');
+        const data = await response.json();
+        appendMessages(data.messages || []);
+      } catch (error) {
+        if (signal.aborted) return;
+        await new Promise((resolve) => setTimeout(resolve, POLL_RETRY_DELAY));
+      }
+    }
+  };
+
+  const loadNewMessages = async () => {
+    if (!lastIdRef.current) return loadMessages();
+
+    try {
+      const data = await fetchMessagesPage(`after_id=${lastIdRef.current}`);
+      appendMessages(data.messages || []);
+      if (data.has_more) await loadMessages();
+    } catch (error) {
+      console.error('Ошибка загрузки сообщений:', error);
+    }
+  };
+
+  const loadOlderMessages = async () => {
+    if (!hasMore || isLoadingOlder || messages.length === 0) return;
+    setIsLoadingOlder(true);
+    const container = scrollRef.current;
+    const prevHeight = container?.scrollHeight ?? 0;
+
+    try {
+      const data = await fetchMessagesPage(`before_id=${messages[0].id}`);
+      setMessages((prev) => [...(data.messages || []), ...prev]);
+      setHasMore(Boolean(data.has_more));
+      requestAnimationFrame(() => {
+        if (container) container.scrollTop += container.scrollHeight - prevHeight;
+      });
+    } catch (error) {
+      console.error('Ошибка загрузки сообщений:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
+  const handleScroll = (e: React.UIEvent<HTMLDivElement>) => {
+    if (e.currentTarget.scrollTop < 40) loadOlderMessages();
+  };
+
   const handleFileSelect = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (file) {
-      if (file.size > 10 * 1024 * 1024) {
+      if (file.size > 50 * 1024 * 1024) {
         toast({
           title: 'Ошибка',
-          description: 'Файл слишком большой (максимум 10 МБ)',
+          description: 'Файл слишком большой (максимум 50 МБ)',
           variant: 'destructive',
         });
         return;
@@ -92,23 +185,15 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
     const token = localStorage.getItem('authToken');
 
     try {
-      let fileData = null;
+      let uploadId = null;
 
       if (selectedFile) {
-        const reader = new FileReader();
-        const base64 = await new Promise<string>((resolve) => {
-          reader.onload = () => {
-            const result = reader.result as string;
-            resolve(result.split(',')[1]);
-          };
-          reader.readAsDataURL(selectedFile);
-        });
-
-        fileData = {
-          content: base64,
-          name: selectedFile.name,
-          type: selectedFile.type,
-        };
+        const upload = await uploadFile(
+          'https://functions.poehali.dev/08452dc9-363d-4b0e-b976-d796d2cc8717',
+          selectedFile,
+          token
+        );
+        uploadId = upload.upload_id;
       }
 
       const response = await fetch(
@@ -121,7 +206,7 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
           },
           body: JSON.stringify({
             message_text: newMessage.trim() || null,
-            file: fileData,
+            upload_id: uploadId,
           }),
         }
       );
@@ -131,7 +216,7 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
         setSelectedFile(null);
         if (fileInputRef.current) fileInputRef.current.value = '';
         if (textareaRef.current) textareaRef.current.style.height = 'auto';
-        await loadMessages();
+        await loadNewMessages();
       } else {
         const data = await response.json();
         toast({
@@ -170,7 +255,12 @@ export const RequestChat = ({ requestId }: RequestChatProps) => {
 
   return (
     <div className="flex flex-col flex-1 min-h-0">
-      <div className="flex-1 overflow-y-auto p-3 sm:p-4 space-y-3 overscroll-contain -webkit-overflow-scrolling-touch">
+      <div ref={scrollRef} onScroll={handleScroll} className="flex-1 overflow-y-auto p-3 sm:p-4 space-y-3 overscroll-contain -webkit-overflow-scrolling-touch">
+        {isLoadingOlder && (
+          <div className="flex justify-center">
+            <Icon name="Loader2" className="animate-spin" size={20} />
+          </div>
+        )}
         {isLoading ? (
           <div className="flex items-center justify-center h-full min-h-[200px]">
             <Icon name="Loader2" className="animate-spin" size={32} />
@@ -16,13 +16,13 @@ interface AdminDashboardProps {
 }
 
 export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardProps) => {
-  const [requests, setRequests] = useState<any[]>([])
-  const [users, setUsers] = useState<any[]>([])
-  const [works, setWorks] = useState<any[]>([])
+  const [serverStats, setServerStats] = useState<Record<string, number> | null>(null)
   const [portfolioCount, setPortfolioCount] = useState(0)
   const [productsCount, setProductsCount] = useState(0)
   const [servicesCount, setServicesCount] = useState(0)
   const [isLoading, setIsLoading] = useState(true)
+  // Вкладки заявок, работ и партнёров грузят свои страницы сами; смена ключа перезагружает их после действий
+  const [listingsKey, setListingsKey] = useState(0)
 
   useEffect(() => {
     loadAdminData()
@@ -33,8 +33,8 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
     const token = localStorage.getItem('authToken')
 
     try {
-      const [adminRes, portfolioRes, productsRes, servicesRes] = await Promise.all([
-        fetch('https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28', {
+      const [statsRes, portfolioRes, productsRes, servicesRes] = await Promise.all([
+        fetch('https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28?action=stats', {
           method: 'GET',
           headers: {
             'Content-Type': 'application/json',
@@ -46,11 +46,9 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
         fetch('https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28?action=content&type=services')
       ])
 
-      if (adminRes.ok) {
-        const data = await adminRes.json()
-        setRequests(data.requests || [])
-        setUsers(data.users || [])
-        setWorks(data.works || [])
+      if (statsRes.ok) {
+        const statsData = await statsRes.json()
+        setServerStats(statsData.stats || null)
       }
 
       if (portfolioRes.ok) {
@@ -92,6 +90,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
       })
 
       if (response.ok) {
+        setListingsKey(k => k + 1)
         loadAdminData()
       }
     } catch (error) {
@@ -118,6 +117,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
       })
 
       if (response.ok) {
+        setListingsKey(k => k + 1)
         loadAdminData()
       }
     } catch (error) {
@@ -142,6 +142,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
       })
 
       if (response.ok) {
+        setListingsKey(k => k + 1)
         loadAdminData()
       }
     } catch (error) {
@@ -168,6 +169,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
       })
 
       if (response.ok) {
+        setListingsKey(k => k + 1)
         loadAdminData()
       } else {
         alert('Ошибка при удалении заявки')
@@ -178,15 +180,16 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
     }
   }
 
-  const unreadMessagesCount = requests.reduce((sum, r) => sum + (r.unread_count || 0), 0)
+  const unreadMessagesCount = serverStats?.unreadMessages ?? 0
 
+  // KPI целиком из сводки admin_stats_rollup — полную выгрузку заявок, пользователей и работ страница не грузит
   const stats = {
-    totalRequests: requests.length,
-    pendingRequests: requests.filter(r => r.status === 'pending').length,
-    inProgressRequests: requests.filter(r => r.status === 'in_progress').length,
-    completedWorks: works.length,
-    unpaidBonuses: works.filter(w => !w.is_bonus_paid).length,
-    totalPartners: users.filter(u => u.user_role === 'partner').length,
+    totalRequests: serverStats?.totalRequests ?? 0,
+    pendingRequests: serverStats?.pendingRequests ?? 0,
+    inProgressRequests: serverStats?.inProgressRequests ?? 0,
+    completedWorks: serverStats?.completedWorks ?? 0,
+    unpaidBonuses: serverStats?.unpaidBonuses ?? 0,
+    totalPartners: serverStats?.totalPartners ?? 0,
     portfolioWorks: portfolioCount,
     productsCount: productsCount,
     servicesCount: servicesCount,
@@ -227,7 +230,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
             <TabsTrigger value="requests" className="text-xs md:text-sm relative">
               <span className="hidden sm:inline">Заявки</span>
               <span className="sm:hidden">Заяв.</span>
-              <span className="ml-1">({requests.length})</span>
+              <span className="ml-1">({stats.totalRequests})</span>
               {unreadMessagesCount > 0 && (
                 <span className="absolute -top-1 -right-1 bg-destructive text-destructive-foreground rounded-full w-5 h-5 text-xs flex items-center justify-center">
                   {unreadMessagesCount}
@@ -237,7 +240,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
             <TabsTrigger value="completed-works" className="text-xs md:text-sm">
               <span className="hidden sm:inline">Работы</span>
               <span className="sm:hidden">Раб.</span>
-              <span className="ml-1">({works.length})</span>
+              <span className="ml-1">({stats.completedWorks})</span>
             </TabsTrigger>
             <TabsTrigger value="partners" className="text-xs md:text-sm">
               <span className="hidden sm:inline">Партнёры</span>
@@ -263,10 +266,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
 
           <TabsContent value="requests">
             <AdminRequestsTab
-              requests={requests}
-              users={users}
-              works={works}
-              isLoading={isLoading}
+              refreshKey={listingsKey}
               onUpdateStatus={handleUpdateStatus}
               onCompleteWork={handleCompleteWork}
               onDeleteRequest={handleDeleteRequest}
@@ -275,10 +275,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
 
           <TabsContent value="completed-works">
             <AdminWorksTab
-              works={works}
-              users={users}
-              requests={requests}
-              isLoading={isLoading}
+              refreshKey={listingsKey}
               onPayBonus={handlePayBonus}
             />
           </TabsContent>
@@ -305,12 +302,7 @@ export const AdminDashboard = ({ setActiveSection, onLogout }: AdminDashboardPro
           </TabsContent>
 
           <TabsContent value="partners">
-            <AdminPartnersTab
-              users={users}
-              requests={requests}
-              works={works}
-              isLoading={isLoading}
-            />
+            <AdminPartnersTab refreshKey={listingsKey} />
           </TabsContent>
         </Tabs>
       </div>
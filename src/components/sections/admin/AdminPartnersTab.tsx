@@ -1,13 +1,12 @@
 import { useState } from 'react'
+import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import Icon from '@/components/ui/icon'
+import { useAdminListing } from '@/hooks/use-admin-listing'
 
 interface AdminPartnersTabProps {
-  users: any[]
-  requests: any[]
-  works: any[]
-  isLoading: boolean
+  refreshKey: number
 }
 
 const getStatusBadge = (status: string) => {
@@ -32,13 +31,79 @@ const getServiceTypeName = (type: string) => {
   return types[type] || type
 }
 
+const LoadMoreButton = ({ onClick, isLoading }: { onClick: () => void; isLoading: boolean }) => (
+  <div className="text-center pt-2">
+    <Button variant="outline" size="sm" onClick={onClick} disabled={isLoading}>
+      {isLoading ? 'Загрузка...' : 'Показать ещё'}
+    </Button>
+  </div>
+)
+
+// Заявки партнёра грузятся при раскрытии карточки
+const PartnerRequests = ({ partnerId, refreshKey }: { partnerId: number; refreshKey: number }) => {
+  const { items: userRequests, hasMore, isLoading, isLoadingMore, loadMore } = useAdminListing('requests', {
+    filters: { user_id: String(partnerId) },
+    refreshKey,
+  })
+
+  if (isLoading) {
+    return (
+      <div className="text-center py-6">
+        <Icon name="Loader" className="h-6 w-6 animate-spin mx-auto" />
+      </div>
+    )
+  }
+
+  if (userRequests.length === 0) {
+    return (
+      <div className="text-center py-6 text-sm text-muted-foreground">
+        <Icon name="FileX" className="h-8 w-8 mx-auto mb-2 opacity-50" />
+        У этого партнёра пока нет заявок
+      </div>
+    )
+  }
+
+  return (
+    <div className="space-y-2 pt-3">
+      {userRequests.map((req: any) => (
+        <div
+          key={req.id}
+          className="flex flex-col sm:flex-row sm:items-center gap-2 p-3 rounded-lg bg-muted/50 text-sm"
+        >
+          <div className="flex-1 min-w-0">
+            <div className="flex items-center gap-2 flex-wrap">
+              <span className="font-medium">
+                <span className="text-muted-foreground">#{String(req.id).padStart(3, '0')}</span>{' '}
+                {req.client_name}
+              </span>
+              {getStatusBadge(req.status)}
+            </div>
+            <div className="flex items-center gap-3 text-xs text-muted-foreground mt-1 flex-wrap">
+              <span>{req.car_brand} {req.car_model}{req.car_year ? `, ${req.car_year}` : ''}</span>
+              <span>·</span>
+              <span>{getServiceTypeName(req.service_type)}</span>
+            </div>
+            {req.description && (
+              <p className="text-xs text-muted-foreground mt-1 line-clamp-1">{req.description}</p>
+            )}
+          </div>
+          <div className="text-xs text-muted-foreground whitespace-nowrap">
+            {new Date(req.created_at).toLocaleDateString('ru-RU')}
+          </div>
+        </div>
+      ))}
+      {hasMore && <LoadMoreButton onClick={loadMore} isLoading={isLoadingMore} />}
+    </div>
+  )
+}
+
 export const AdminPartnersTab = ({ 
-  users, 
-  requests, 
-  works, 
-  isLoading 
+  refreshKey 
 }: AdminPartnersTabProps) => {
-  const partners = users.filter(u => u.user_role === 'partner')
+  const { items: partners, hasMore, isLoading, isLoadingMore, loadMore } = useAdminListing('users', {
+    filters: { user_role: 'partner' },
+    refreshKey,
+  })
   const [openPartnerId, setOpenPartnerId] = useState<number | null>(null)
 
   const togglePartner = (id: number) => {
@@ -66,8 +131,6 @@ export const AdminPartnersTab = ({
         ) : (
           <div className="space-y-3">
             {partners.map((user) => {
-              const userRequests = requests.filter((r: any) => r.user_id === user.id)
-              const userWorks = works.filter((w: any) => w.user_id === user.id)
               const isOpen = openPartnerId === user.id
               
               return (
@@ -106,8 +169,8 @@ export const AdminPartnersTab = ({
                           <p className="text-2xl font-bold text-primary">{user.bonus_balance}</p>
                           <p className="text-xs text-muted-foreground">бонусов</p>
                           <div className="flex gap-3 text-xs text-muted-foreground mt-2">
-                            <span>Заявок: {userRequests.length}</span>
-                            <span>Работ: {userWorks.length}</span>
+                            <span>Заявок: {user.request_count}</span>
+                            <span>Работ: {user.work_count}</span>
                           </div>
                         </div>
                       </div>
@@ -116,50 +179,18 @@ export const AdminPartnersTab = ({
 
                   {isOpen && (
                     <div className="border-t mx-4 mb-4">
-                      {userRequests.length === 0 ? (
-                        <div className="text-center py-6 text-sm text-muted-foreground">
-                          <Icon name="FileX" className="h-8 w-8 mx-auto mb-2 opacity-50" />
-                          У этого партнёра пока нет заявок
-                        </div>
-                      ) : (
-                        <div className="space-y-2 pt-3">
-                          <p className="text-xs font-medium text-muted-foreground uppercase tracking-wider mb-2">
-                            Заявки ({userRequests.length})
-                          </p>
-                          {userRequests.map((req: any) => (
-                            <div
-                              key={req.id}
-                              className="flex flex-col sm:flex-row sm:items-center gap-2 p-3 rounded-lg bg-muted/50 text-sm"
-                            >
-                              <div className="flex-1 min-w-0">
-                                <div className="flex items-center gap-2 flex-wrap">
-                                  <span className="font-medium">
-                                    <span className="text-muted-foreground">#{String(req.id).padStart(3, '0')}</span>{' '}
-                                    {req.client_name}
-                                  </span>
-                                  {getStatusBadge(req.status)}
-                                </div>
-                                <div className="flex items-center gap-3 text-xs text-muted-foreground mt-1 flex-wrap">
-                                  <span>{req.car_brand} {req.car_model}{req.car_year ? `, ${req.car_year}` : ''}</span>
-                                  <span>·</span>
-                                  <span>{getServiceTypeName(req.service_type)}</span>
-                                </div>
-                                {req.description && (
-                                  <p className="text-xs text-muted-foreground mt-1 line-clamp-1">{req.description}</p>
-                                )}
-                              </div>
-                              <div className="text-xs text-muted-foreground whitespace-nowrap">
-                                {new Date(req.created_at).toLocaleDateString('ru-RU')}
-                              </div>
-                            </div>
-                          ))}
-                        </div>
+                      {user.request_count > 0 && (
+                        <p className="text-xs font-medium text-muted-foreground uppercase tracking-wider pt-3">
+                          Заявки ({user.request_count})
+                        </p>
                       )}
+                      <PartnerRequests partnerId={user.id} refreshKey={refreshKey} />
                     </div>
                   )}
                 </Card>
               )
             })}
+            {hasMore && <LoadMoreButton onClick={loadMore} isLoading={isLoadingMore} />}
           </div>
         )}
       </CardContent>
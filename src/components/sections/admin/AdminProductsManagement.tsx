@@ -8,6 +8,7 @@ import { Textarea } from '@/components/ui/textarea'
 import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from '@/components/ui/dialog'
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select'
 import Icon from '@/components/ui/icon'
+import { uploadFile } from '@/lib/upload'
 
 interface Product {
   id: number
@@ -31,7 +32,7 @@ export const AdminProductsManagement = ({ isLoading, onRefresh }: AdminProductsM
   const [editingProduct, setEditingProduct] = useState<Product | null>(null)
   const [isDialogOpen, setIsDialogOpen] = useState(false)
   const [imagePreview, setImagePreview] = useState<string>('')
-  const [imageFile, setImageFile] = useState<{ base64: string, name: string } | null>(null)
+  const [imageFile, setImageFile] = useState<{ base64: string, name: string, file: File } | null>(null)
 
   useEffect(() => {
     loadProducts()
@@ -65,7 +66,7 @@ export const AdminProductsManagement = ({ isLoading, onRefresh }: AdminProductsM
     reader.onloadend = () => {
       const base64 = reader.result as string
       setImagePreview(base64)
-      setImageFile({ base64, name: file.name })
+      setImageFile({ base64, name: file.name, file })
     }
     reader.readAsDataURL(file)
   }
@@ -90,15 +91,15 @@ export const AdminProductsManagement = ({ isLoading, onRefresh }: AdminProductsM
       data.image_url = editingProduct.image_url
     }
 
-    if (imageFile) {
-      data.image_base64 = imageFile.base64
-      data.image_name = imageFile.name
-    }
-
     const token = localStorage.getItem('authToken')
     const action = editingProduct ? 'update_content' : 'create_content'
 
     try {
+      if (imageFile) {
+        const upload = await uploadFile('https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28', imageFile.file, token, 'content')
+        data.image_upload_id = upload.upload_id
+      }
+
       const response = await fetch('https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28', {
         method: 'POST',
         headers: {
@@ -1,4 +1,4 @@
-import { useState, useMemo } from 'react'
+import { useState, useEffect } from 'react'
 import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
@@ -8,22 +8,19 @@ import { Label } from '@/components/ui/label'
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog'
 import Icon from '@/components/ui/icon'
 import { AdminRequestChat } from '@/components/AdminRequestChat'
+import { useAdminListing } from '@/hooks/use-admin-listing'
+
+const SEARCH_DEBOUNCE_MS = 300
 
 interface AdminRequestsTabProps {
-  requests: any[]
-  users: any[]
-  works: any[]
-  isLoading: boolean
+  refreshKey: number
   onUpdateStatus: (requestId: number, newStatus: string) => void
   onCompleteWork: (requestId: number, workCost: number, bonusEarned: number) => void
   onDeleteRequest: (requestId: number) => void
 }
 
 export const AdminRequestsTab = ({
-  requests,
-  users,
-  works,
-  isLoading,
+  refreshKey,
   onUpdateStatus,
   onCompleteWork,
   onDeleteRequest
@@ -33,29 +30,19 @@ export const AdminRequestsTab = ({
   const [statusFilter, setStatusFilter] = useState<string>('all')
   const [clientSearch, setClientSearch] = useState('')
 
-  const filteredRequests = useMemo(() => {
-    return requests.filter((r) => {
-      if (statusFilter !== 'all' && r.status !== statusFilter) return false
-      if (clientSearch.trim()) {
-        const q = clientSearch.trim().toLowerCase()
-        const partner = users.find((u: any) => u.id === r.user_id)
-        const searchable = [
-          r.client_name,
-          r.client_phone,
-          r.client_email,
-          r.car_brand,
-          r.car_model,
-          partner?.name,
-          partner?.company_name
-        ]
-          .filter(Boolean)
-          .join(' ')
-          .toLowerCase()
-        if (!searchable.includes(q)) return false
-      }
-      return true
-    })
-  }, [requests, statusFilter, clientSearch, users])
+  const [search, setSearch] = useState('')
+
+  useEffect(() => {
+    const timer = setTimeout(() => setSearch(clientSearch.trim()), SEARCH_DEBOUNCE_MS)
+    return () => clearTimeout(timer)
+  }, [clientSearch])
+
+  // Фильтры и поиск выполняет сервер, вкладка держит только загруженные страницы
+  const { items: requests, hasMore, isLoading, isLoadingMore, loadMore } = useAdminListing('requests', {
+    filters: { status: statusFilter === 'all' ? undefined : statusFilter, q: search || undefined },
+    refreshKey,
+  })
+  const hasFilters = statusFilter !== 'all' || search !== ''
 
   const getStatusBadge = (status: string) => {
     const statusMap: Record<string, { label: string; variant: 'default' | 'secondary' | 'destructive' | 'outline' }> = {
@@ -127,13 +114,13 @@ export const AdminRequestsTab = ({
               <Icon name="Loader" className="h-8 w-8 animate-spin mx-auto mb-2" />
               <p className="text-muted-foreground">Загрузка...</p>
             </div>
-          ) : filteredRequests.length === 0 ? (
+          ) : requests.length === 0 ? (
             <div className="text-center py-8">
               <Icon name="FileText" className="h-12 w-12 mx-auto mb-3 text-muted-foreground" />
               <p className="text-muted-foreground">
-                {requests.length === 0 ? 'Нет заявок' : 'Ничего не найдено'}
+                {hasFilters ? 'Ничего не найдено' : 'Нет заявок'}
               </p>
-              {requests.length > 0 && (
+              {hasFilters && (
                 <Button variant="ghost" size="sm" className="mt-2" onClick={() => { setStatusFilter('all'); setClientSearch('') }}>
                   Сбросить фильтры
                 </Button>
@@ -141,9 +128,7 @@ export const AdminRequestsTab = ({
             </div>
           ) : (
             <div className="space-y-2">
-              {filteredRequests.map((request) => {
-                const partner = users.find((u: any) => u.id === request.user_id)
-
+              {requests.map((request) => {
                 return (
                   <div
                     key={request.id}
@@ -171,7 +156,7 @@ export const AdminRequestsTab = ({
                           <span>·</span>
                           <span>{getServiceTypeName(request.service_type)}</span>
                           <span>·</span>
-                          <span>{partner?.name || '—'}</span>
+                          <span>{request.partner_name || '—'}</span>
                           <span>·</span>
                           <span>{new Date(request.created_at).toLocaleDateString('ru-RU')}</span>
                         </div>
@@ -194,8 +179,7 @@ export const AdminRequestsTab = ({
                         </Select>
 
                         {(() => {
-                          const work = works.find(w => w.request_id === request.id)
-                          if (request.status === 'in_progress' && !work) {
+                          if (request.status === 'in_progress' && !request.work_id) {
                             return (
                               <Button
                                 size="sm"
@@ -206,12 +190,12 @@ export const AdminRequestsTab = ({
                               </Button>
                             )
                           }
-                          if (work) {
+                          if (request.work_id) {
                             return (
                               <Button
                                 size="sm"
                                 disabled
-                                className={`h-7 text-xs px-2 ${work.is_bonus_paid ? 'bg-green-600 text-white opacity-100' : 'bg-black text-white opacity-100'}`}
+                                className={`h-7 text-xs px-2 ${request.work_is_bonus_paid ? 'bg-green-600 text-white opacity-100' : 'bg-black text-white opacity-100'}`}
                               >
                                 <Icon name="CheckCircle" className="h-3 w-3" />
                               </Button>
@@ -242,6 +226,13 @@ export const AdminRequestsTab = ({
                   </div>
                 )
               })}
+              {hasMore && (
+                <div className="text-center pt-2">
+                  <Button variant="outline" size="sm" onClick={loadMore} disabled={isLoadingMore}>
+                    {isLoadingMore ? 'Загрузка...' : 'Показать ещё'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </CardContent>
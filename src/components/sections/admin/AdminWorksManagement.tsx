@@ -9,6 +9,7 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from '
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select'
 import { useToast } from '@/hooks/use-toast'
 import Icon from '@/components/ui/icon'
+import { uploadFile } from '@/lib/upload'
 
 interface Work {
   id: number
@@ -35,7 +36,7 @@ export const AdminWorksManagement = ({ isLoading, onRefresh }: AdminWorksManagem
   const [isDialogOpen, setIsDialogOpen] = useState(false)
   const [isSaving, setIsSaving] = useState(false)
   const [galleryPreviews, setGalleryPreviews] = useState<string[]>([])
-  const [galleryFiles, setGalleryFiles] = useState<Array<{ base64: string, name: string }>>([])
+  const [galleryFiles, setGalleryFiles] = useState<Array<{ base64: string, name: string, file: File }>>([])
   const { toast } = useToast()
 
   useEffect(() => {
@@ -73,7 +74,7 @@ export const AdminWorksManagement = ({ isLoading, onRefresh }: AdminWorksManagem
       reader.onloadend = () => {
         const base64 = reader.result as string
         setGalleryPreviews(prev => [...prev, base64])
-        setGalleryFiles(prev => [...prev, { base64, name: file.name }])
+        setGalleryFiles(prev => [...prev, { base64, name: file.name, file }])
       }
       reader.readAsDataURL(file)
     })
@@ -125,25 +126,8 @@ export const AdminWorksManagement = ({ isLoading, onRefresh }: AdminWorksManagem
 
       for (const file of galleryFiles) {
         try {
-          const uploadRes = await fetch(API_URL, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-              'Authorization': `Bearer ${token}`,
-            },
-            body: JSON.stringify({
-              action: 'upload_image',
-              image_base64: file.base64,
-              image_name: file.name,
-            }),
-          })
-
-          if (uploadRes.ok) {
-            const result = await uploadRes.json()
-            if (result.image_url) {
-              newUrls.push(result.image_url)
-            }
-          }
+          const upload = await uploadFile(API_URL, file.file, token, 'content')
+          newUrls.push(upload.file_url)
         } catch (error) {
           console.error('Ошибка загрузки фото:', error)
         }
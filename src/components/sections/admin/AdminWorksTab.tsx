@@ -2,22 +2,19 @@ import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Badge } from '@/components/ui/badge'
 import Icon from '@/components/ui/icon'
+import { useAdminListing } from '@/hooks/use-admin-listing'
 
 interface AdminWorksTabProps {
-  works: any[]
-  users: any[]
-  requests: any[]
-  isLoading: boolean
+  refreshKey: number
   onPayBonus: (workId: number) => void
 }
 
 export const AdminWorksTab = ({ 
-  works, 
-  users, 
-  requests, 
-  isLoading, 
+  refreshKey, 
   onPayBonus 
 }: AdminWorksTabProps) => {
+  const { items: works, hasMore, isLoading, isLoadingMore, loadMore } = useAdminListing('works', { refreshKey })
+
   return (
     <Card>
       <CardHeader>
@@ -39,9 +36,6 @@ export const AdminWorksTab = ({
         ) : (
           <div className="space-y-3">
             {works.map((work) => {
-              const partner = users.find(u => u.id === work.user_id)
-              const request = requests.find(r => r.id === work.request_id)
-              
               return (
                 <Card key={work.id} className="border">
                   <CardContent className="pt-4">
@@ -50,7 +44,7 @@ export const AdminWorksTab = ({
                         <div className="flex items-center gap-2 mb-1 flex-wrap">
                           <p className="font-semibold">
                             <span className="text-muted-foreground font-normal">#{String(work.request_id).padStart(3, '0')}</span>{' '}
-                            {request?.car_brand} {request?.car_model}
+                            {work.car_brand} {work.car_model}
                           </p>
                           {work.is_bonus_paid ? (
                             <Badge variant="outline" className="bg-green-50">
@@ -63,8 +57,8 @@ export const AdminWorksTab = ({
                           )}
                         </div>
                         <p className="text-sm text-muted-foreground mb-2">
-                          Партнёр: {partner?.name || 'Неизвестно'}
-                          {partner?.company_name && ` (${partner.company_name})`}
+                          Партнёр: {work.partner_name || 'Неизвестно'}
+                          {work.partner_company && ` (${work.partner_company})`}
                         </p>
                         <div className="flex flex-wrap gap-3 text-sm">
                           <span className="text-muted-foreground">
@@ -93,6 +87,13 @@ export const AdminWorksTab = ({
                 </Card>
               )
             })}
+            {hasMore && (
+              <div className="text-center pt-2">
+                <Button variant="outline" size="sm" onClick={loadMore} disabled={isLoadingMore}>
+                  {isLoadingMore ? 'Загрузка...' : 'Показать ещё'}
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </CardContent>
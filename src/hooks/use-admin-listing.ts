@@ -0,0 +1,78 @@
+import { useState, useEffect, useCallback, useRef } from 'react'
+
+const ADMIN_API_URL = 'https://functions.poehali.dev/e06691eb-ff8f-4b28-88e2-e9e033b0dd28'
+const PAGE_SIZE = 50
+
+type ListingAction = 'requests' | 'users' | 'works'
+
+interface ListingOptions {
+  filters?: Record<string, string | undefined>
+  refreshKey?: number
+}
+
+// Постраничный список админки (?action=requests|users|works): первая страница при смене фильтров
+// или refreshKey, следующие — по nextCursor
+export function useAdminListing(action: ListingAction, { filters = {}, refreshKey = 0 }: ListingOptions = {}) {
+  const [items, setItems] = useState<any[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoading, setIsLoading] = useState(true)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
+  const generationRef = useRef(0)
+  const filtersKey = JSON.stringify(filters)
+
+  const fetchPage = useCallback(async (cursor: string | null) => {
+    const params = new URLSearchParams({ action, limit: String(PAGE_SIZE) })
+    Object.entries(JSON.parse(filtersKey) as Record<string, string | undefined>).forEach(([key, value]) => {
+      if (value) params.set(key, value)
+    })
+    if (cursor) params.set('cursor', cursor)
+
+    const token = localStorage.getItem('authToken')
+    const response = await fetch(`${ADMIN_API_URL}?${params}`, {
+      headers: {
+        'Authorization': `Bearer ${token}`,
+      },
+    })
+    if (!response.ok) throw new Error(`HTTP ${response.status}`)
+    const data = await response.json()
+    return { rows: (data[action] || []) as any[], nextCursor: (data.nextCursor || null) as string | null }
+  }, [action, filtersKey])
+
+  const reload = useCallback(async () => {
+    // Ответ на устаревшие фильтры не должен перезаписать свежий
+    const generation = ++generationRef.current
+    setIsLoading(true)
+    try {
+      const page = await fetchPage(null)
+      if (generation !== generationRef.current) return
+      setItems(page.rows)
+      setNextCursor(page.nextCursor)
+    } catch (error) {
+      console.error('Ошибка загрузки списка:', error)
+    } finally {
+      if (generation === generationRef.current) setIsLoading(false)
+    }
+  }, [fetchPage])
+
+  const loadMore = useCallback(async () => {
+    if (!nextCursor || isLoadingMore) return
+    const generation = generationRef.current
+    setIsLoadingMore(true)
+    try {
+      const page = await fetchPage(nextCursor)
+      if (generation !== generationRef.current) return
+      setItems(prev => [...prev, ...page.rows])
+      setNextCursor(page.nextCursor)
+    } catch (error) {
+      console.error('Ошибка загрузки списка:', error)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }, [fetchPage, nextCursor, isLoadingMore])
+
+  useEffect(() => {
+    reload()
+  }, [reload, refreshKey])
+
+  return { items, hasMore: nextCursor !== null, isLoading, isLoadingMore, loadMore, reload }
+}
@@ -0,0 +1,40 @@
+export interface UploadedFile {
+  upload_id: number
+  file_url: string
+  file_name: string
+  file_type: string
+  size: number
+}
+
+async function postAction(apiUrl: string, token: string | null, action: string, body: Record<string, unknown>) {
+  const response = await fetch(`${apiUrl}?action=${action}`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "Authorization": `Bearer ${token}`,
+    },
+    body: JSON.stringify({ action, ...body }),
+  })
+  const data = await response.json()
+  if (!response.ok) throw new Error(data.message || "Не удалось загрузить файл")
+  return data
+}
+
+// Файл уходит в хранилище напрямую по presigned URL, функция только выдаёт URL и проверяет результат
+export async function uploadFile(apiUrl: string, file: File, token: string | null, purpose?: string): Promise<UploadedFile> {
+  const ticket = await postAction(apiUrl, token, "upload_url", {
+    file_name: file.name,
+    content_type: file.type || "application/octet-stream",
+    size: file.size,
+    purpose,
+  })
+
+  const put = await fetch(ticket.upload_url, {
+    method: "PUT",
+    headers: ticket.headers,
+    body: file,
+  })
+  if (!put.ok) throw new Error("Не удалось загрузить файл")
+
+  return postAction(apiUrl, token, "confirm_upload", { upload_id: ticket.upload_id })
+}
@@ -44,6 +44,17 @@ const Index = () => {
   };
 
   const handleLogout = () => {
+    const token = localStorage.getItem('authToken');
+    if (token) {
+      fetch("https://functions.poehali.dev/aa3aea15-0141-490d-aa72-389642c2efc3", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${token}`,
+        },
+        body: JSON.stringify({ action: "logout" }),
+      }).catch(() => {});
+    }
     localStorage.removeItem('authToken');
     localStorage.removeItem('userData');
     setIsAuthenticated(false);